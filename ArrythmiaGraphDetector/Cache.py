@@ -0,0 +1,263 @@
+#%%
+import os
+import time
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+
+from .Functions import crear_grafo_vtk, obtener_velocidades_csv, MatrizDispersa, CampoVelocidades
+
+# Constantes utilizadas
+DIRECTORIO_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "ArrythmiaGraphDetector")
+LIMITE_CACHE = 2 * 1024**3 # 2 GB
+VERSION_CACHE = 1 # Cambiar si cambia lo que se guarda en cada caso para no leer casos antiguos
+ESPERA_TEMPORALES = 3600 # Segundos tras los que un temporal es de un proceso que murió escribiendo y se borra
+
+# Funciones internas
+# ----------------------------------------------------------------------------------
+def hash_archivo(nombre_archivo:str, hash_total = None):
+    """
+    Función interna para calcular el sha256 del contenido de un archivo leyéndolo por trozos
+
+    Args:
+        nombre_archivo (str): Nombre del archivo
+        hash_total (optional): Hash al que añadir el contenido. Defaults to None (uno nuevo).
+
+    Returns:
+        hashlib._Hash: Hash con el contenido del archivo
+    """
+    if hash_total is None: hash_total = hashlib.sha256()
+    with open(nombre_archivo, "rb") as archivo:
+        for trozo in iter(lambda: archivo.read(1 << 20), b""):
+            hash_total.update(trozo)
+    return hash_total
+
+def clave_caso(nombre_archivo_obj:str, nombre_archivo_csv_vtk:str, nombre_archivo_csv_velocidades:str = None, k_vecinos:int = 1)->str:
+    """
+    Función interna para calcular la clave de un caso a partir del contenido de sus archivos y los parámetros que cambian el resultado
+
+    Args:
+        nombre_archivo_obj (str): Nombre del archivo obj
+        nombre_archivo_csv_vtk (str): Nombre del archivo csv con los datos del VTK
+        nombre_archivo_csv_velocidades (str, optional): Nombre del archivo csv con las velocidades. Defaults to None.
+        k_vecinos (int, optional): Número de puntos del VTK usados para interpolar. Defaults to 1.
+
+    Returns:
+        str: Clave del caso (sha256 en hexadecimal)
+    """
+    hash_total = hashlib.sha256(("v%d;k%d;" % (VERSION_CACHE, k_vecinos)).encode())
+    for nombre in (nombre_archivo_obj, nombre_archivo_csv_vtk, nombre_archivo_csv_velocidades):
+        # Se separa cada archivo con su hash para que no se confundan contenidos partidos en otro sitio
+        hash_total.update(b"-" if nombre is None else hash_archivo(nombre).digest())
+    return hash_total.hexdigest()
+
+def columna_guardable(valores:np.ndarray)->np.ndarray:
+    """
+    Función interna para pasar una columna de texto (dtype object, por ejemplo material o model con nombres) a str,
+    porque np.load sin pickle no puede leer arrays de objetos
+
+    Args:
+        valores (np.ndarray): Valores de la columna
+
+    Returns:
+        np.ndarray: Los mismos valores, como str si eran objetos
+    """
+    # Con pandas la columna puede venir como array de strings propio de pandas y no de numpy
+    valores = np.asarray(valores)
+    return valores.astype(str) if valores.dtype == object else valores
+
+# Cache de casos
+# ----------------------------------------------------------------------------------
+class CacheCasos:
+    """
+    Cache en disco de los casos ya preprocesados (obj, datos del VTK y velocidades)
+
+    Cada caso se guarda en un .npz cuyo nombre es el sha256 del contenido de los archivos de entrada, así que si cambia
+    cualquiera de ellos la clave es otra y se vuelve a calcular. Al leer un caso se actualiza su fecha, y al guardar
+    uno nuevo se borran los menos usados hasta que la carpeta quede por debajo del límite. Varios procesos pueden usar
+    la misma carpeta: un caso que otro proceso borra mientras tanto se vuelve a calcular, y uno que no se puede leer se
+    borra avisando con un warning.
+
+    Args:
+        directorio (str, optional): Carpeta de la cache. Defaults to DIRECTORIO_CACHE.
+        limite_bytes (int, optional): Tamaño máximo de la carpeta. Defaults to LIMITE_CACHE.
+    """
+    def __init__(self, directorio:str = DIRECTORIO_CACHE, limite_bytes:int = LIMITE_CACHE):
+        self.directorio = directorio
+        self.limite_bytes = limite_bytes
+        os.makedirs(directorio, exist_ok = True)
+
+    def ruta(self, clave:str)->str:
+        return os.path.join(self.directorio, clave + ".npz")
+
+    def cargar(self, nombre_archivo_obj:str, nombre_archivo_csv_vtk:str, nombre_archivo_csv_velocidades:str = None, penalizador:float = 1, k_vecinos:int = 1)->list:
+        """
+        Función para obtener un caso preprocesado, de la cache si ya está o calculándolo y guardándolo si no
+
+        Args:
+            nombre_archivo_obj (str): Nombre del archivo obj con la estructura del corazón
+            nombre_archivo_csv_vtk (str): Nombre del archivo csv con los datos del VTK
+            nombre_archivo_csv_velocidades (str, optional): Nombre del archivo csv con las velocidades. Defaults to None.
+            penalizador (float, optional): Penalizador para las velocidades (no forma parte de la clave). Defaults to 1.
+            k_vecinos (int, optional): Número de puntos del VTK usados para interpolar. Defaults to 1.
+
+        Returns:
+            list: Lista con los siguientes datos:
+                Puntos: Array de puntos
+                Conexiones: Triángulos del obj (índices desde 1)
+                Normales: Array de normales
+                Matriz de adyacencia: MatrizDispersa
+                Datos de los puntos: Datos de los puntos del VTK (como crear_grafo_vtk)
+                Velocidades: CampoVelocidades o None si no se pasa el csv de velocidades
+        """
+        clave = clave_caso(nombre_archivo_obj, nombre_archivo_csv_vtk, nombre_archivo_csv_velocidades, k_vecinos)
+        ruta = self.ruta(clave)
+        caso = None
+        try:
+            caso = self._leer(ruta, penalizador)
+        except FileNotFoundError:
+            # No está o lo ha borrado otro proceso al liberar espacio
+            pass
+        except (OSError, ValueError, KeyError) as error:
+            # Caso que no se puede leer (por ejemplo de otra versión), se borra para no volver a intentarlo cada vez
+            warnings.warn("No se puede leer el caso %s de la cache (%s), se vuelve a calcular" % (ruta, error))
+            self._borrar(ruta)
+        if caso is not None:
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+            return caso
+        [puntos, conexiones, normales, matriz_adyacencia, datos_puntos] = crear_grafo_vtk(nombre_archivo_obj, nombre_archivo_csv_vtk, True, k_vecinos)
+        arrays = {
+            "puntos": puntos, "conexiones": conexiones, "normales": normales,
+            "indptr": matriz_adyacencia.indptr, "indices": matriz_adyacencia.indices,
+            "punto_mas_cercano": datos_puntos["punto_mas_cercano"].values,
+            "material": columna_guardable(datos_puntos["material"].values), "model": columna_guardable(datos_puntos["model"].values),
+            "fibras": datos_puntos[["f_x", "f_y", "f_z"]].values,
+        }
+        velocidades = None
+        if nombre_archivo_csv_velocidades is not None:
+            velocidades = obtener_velocidades_csv(nombre_archivo_csv_velocidades, datos_puntos, penalizador)
+            arrays["velocidad_base"] = velocidades.velocidad_base
+            arrays["anisotropia"] = velocidades.anisotropia
+        self._escribir(ruta, arrays)
+        self.liberar(ruta)
+        return [puntos, conexiones, normales, matriz_adyacencia, datos_puntos, velocidades]
+
+    def _leer(self, ruta:str, penalizador:float)->list:
+        with np.load(ruta, allow_pickle = False) as datos:
+            arrays = {nombre: datos[nombre] for nombre in datos.files}
+        puntos = arrays["puntos"]
+        matriz_adyacencia = MatrizDispersa(arrays["indptr"], arrays["indices"])
+        datos_puntos = pd.DataFrame(puntos, columns = ["x", "y", "z"])
+        datos_puntos["punto_mas_cercano"] = arrays["punto_mas_cercano"]
+        # Las columnas de texto se guardan como str, se devuelven como objetos igual que las lee pandas
+        for columna in ("material", "model"):
+            valores = arrays[columna]
+            datos_puntos[columna] = valores.astype(object) if valores.dtype.kind == "U" else valores
+        datos_puntos["f_x"] = arrays["fibras"][:, 0]
+        datos_puntos["f_y"] = arrays["fibras"][:, 1]
+        datos_puntos["f_z"] = arrays["fibras"][:, 2]
+        velocidades = None
+        if "velocidad_base" in arrays:
+            velocidades = CampoVelocidades(arrays["fibras"], arrays["velocidad_base"], arrays["anisotropia"], penalizador)
+        return [puntos, arrays["conexiones"], arrays["normales"], matriz_adyacencia, datos_puntos, velocidades]
+
+    def _escribir(self, ruta:str, arrays:dict)->None:
+        # Se escribe en un temporal y se renombra para que otro proceso nunca lea un caso a medias
+        temporal = ruta + ".%d.tmp" % os.getpid()
+        try:
+            with open(temporal, "wb") as archivo:
+                np.savez(archivo, **arrays)
+            os.replace(temporal, ruta)
+        except FileNotFoundError:
+            # Otro proceso ha limpiado la cache mientras tanto, el caso no se guarda
+            pass
+        except BaseException:
+            self._borrar(temporal)
+            raise
+
+    def tamano(self)->int:
+        """
+        Función para obtener lo que ocupan los casos guardados y los temporales que hay a medio escribir
+
+        Returns:
+            int: Bytes ocupados
+        """
+        return sum(tamano for [_, _, tamano] in self._casos() + self._casos(temporales = True))
+
+    def _casos(self, temporales:bool = False)->list:
+        # Otro proceso puede borrar casos mientras tanto, los que ya no están no se cuentan
+        casos = []
+        for nombre in os.listdir(self.directorio):
+            # Los temporales son <clave>.npz.<pid>.tmp
+            es_temporal = nombre.endswith(".tmp") and ".npz." in nombre
+            if not (es_temporal if temporales else nombre.endswith(".npz")): continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            casos.append([ruta, estado.st_mtime, estado.st_size])
+        return casos
+
+    def _borrar(self, ruta:str)->bool:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            # En Windows no se puede borrar un caso que otro proceso está leyendo
+            return False
+        return True
+
+    def liberar(self, conservar:str = None)->None:
+        """
+        Función para borrar los casos menos usados hasta que la cache quede por debajo del límite
+
+        Antes se borran los temporales de más de ESPERA_TEMPORALES segundos, que son de procesos que murieron escribiendo
+        (por ejemplo un caso de agd-lotes que se pasa de tiempo), y los que quedan cuentan para el límite.
+
+        Args:
+            conservar (str, optional): Ruta de un caso que no se borra aunque sea el único. Defaults to None.
+        """
+        total = 0
+        ahora = time.time()
+        for [ruta, fecha, tamano] in self._casos(temporales = True):
+            if ahora - fecha <= ESPERA_TEMPORALES or not self._borrar(ruta): total += tamano
+        casos = sorted(self._casos(), key = lambda caso: caso[1])
+        total += sum(tamano for [_, _, tamano] in casos)
+        for [ruta, _, tamano] in casos:
+            if total <= self.limite_bytes: break
+            if ruta == conservar: continue
+            if self._borrar(ruta): total -= tamano
+
+    def limpiar(self)->None:
+        """
+        Función para borrar todos los casos guardados y los temporales
+        """
+        for [ruta, _, _] in self._casos() + self._casos(temporales = True):
+            self._borrar(ruta)
+
+def cargar_caso(nombre_archivo_obj:str, nombre_archivo_csv_vtk:str, nombre_archivo_csv_velocidades:str = None, penalizador:float = 1, k_vecinos:int = 1, directorio:str = DIRECTORIO_CACHE, limite_bytes:int = LIMITE_CACHE)->list:
+    """
+    Función para leer un caso (obj, datos del VTK y velocidades) usando la cache en disco
+
+    La primera vez hace lo mismo que crear_grafo_vtk(..., disperso = True) y obtener_velocidades_csv y lo guarda, las
+    siguientes lo lee directamente mientras no cambie el contenido de los archivos.
+
+    Args:
+        nombre_archivo_obj (str): Nombre del archivo obj con la estructura del corazón
+        nombre_archivo_csv_vtk (str): Nombre del archivo csv con los datos del VTK
+        nombre_archivo_csv_velocidades (str, optional): Nombre del archivo csv con las velocidades. Defaults to None.
+        penalizador (float, optional): Penalizador para las velocidades. Defaults to 1.
+        k_vecinos (int, optional): Número de puntos del VTK usados para interpolar. Defaults to 1.
+        directorio (str, optional): Carpeta de la cache. Defaults to DIRECTORIO_CACHE.
+        limite_bytes (int, optional): Tamaño máximo de la carpeta. Defaults to LIMITE_CACHE.
+
+    Returns:
+        list: [puntos, conexiones, normales, matriz_adyacencia, datos_puntos, velocidades]
+    """
+    return CacheCasos(directorio, limite_bytes).cargar(nombre_archivo_obj, nombre_archivo_csv_vtk, nombre_archivo_csv_velocidades, penalizador, k_vecinos)
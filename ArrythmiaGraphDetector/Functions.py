@@ -1,13 +1,16 @@
 #%%
-from math import sqrt
+from math import sqrt, inf
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import matplotlib.patches as mpatches
-import plotly.graph_objects as go
-import networkx as nx
 import ast
+import re
+import multiprocessing
+import struct
+import bisect
+import copy
+import heapq
+import time
+from multiprocessing import shared_memory
 
 # Constantes utilizadas
 LIMITE_DIST_INF = 8
@@ -22,6 +25,1002 @@ VALOR_MED_REENTRADA = 120
 DICCIONARIO_MATERIALS = {"1": "RA", "2": "CT", "3": "PVS", "4": "BB", "5": "IST", "6": "SAN", "7": "LFO", "8": "CS", "9":"MV/LAA", "10": "FO"}
 DICCIONARIO_MODELS = {"191": "RA", "192": "BB", "193": "RAA", "194": "TV", "195": "LA", "196": "PVS", "197":"LAA", "198":"MV"}
 
+# Expresiones para leer los obj (vértices, normales y primer índice de los tres primeros vértices de cada cara)
+PATRON_OBJ_VERTICE = re.compile(rb'^v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+PATRON_OBJ_NORMAL = re.compile(rb'^vn[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+PATRON_OBJ_CARA = re.compile(rb'^f[ \t]+(\d+)\S*[ \t]+(\d+)\S*[ \t]+(\d+)', re.MULTILINE)
+
+# Cabecera de los archivos binarios de caminos: magia, versión, opciones (1 distancias, 2 tiempos), caminos, puntos
+MAGIA_CAMINOS = b"AGDC"
+FORMATO_CABECERA_CAMINOS = "<4sIIQQ4x"
+
+# Desplazamientos a las 27 celdas vecinas (incluida la propia) de la rejilla espacial
+DESPLAZAMIENTOS_VECINAS = np.array([[i, j, k] for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)])
+
+# Funciones de pintar, están en Graficos y se importan la primera vez que se usan para no cargar matplotlib ni plotly
+FUNCIONES_GRAFICOS = ("pintar_puntos", "pintar_puntos_rotores", "pintar_puntos_rotores_binario", "crear_figura_malla",
+                      "decimar_malla", "valor_a_color_html", "retorna_color_relacion", "retorna_color_poligono")
+
+def __getattr__(nombre:str):
+    if nombre in FUNCIONES_GRAFICOS:
+        from . import Graficos
+        return getattr(Graficos, nombre)
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(nombre))
+
+
+# Estructuras de datos
+# ----------------------------------------------------------------------------------
+class MatrizDispersa:
+    """
+    Matriz de adyacencia dispersa en formato CSR (indptr/indices)
+
+    Ocupa memoria O(E) en lugar de los O(N²) de la matriz densa y permite obtener los vecinos de un punto en O(grado)
+
+    Args:
+        indptr (np.ndarray): Posición en indices donde empiezan los vecinos de cada punto (N+1 elementos)
+        indices (np.ndarray): Vecinos de cada punto ordenados de menor a mayor
+    """
+    def __init__(self, indptr:np.ndarray, indices:np.ndarray):
+        self.indptr = np.ascontiguousarray(indptr, dtype = np.int64)
+        self.indices = np.ascontiguousarray(indices, dtype = np.int32)
+        self.shape = (len(self.indptr) - 1, len(self.indptr) - 1)
+        self._vecinos = None
+
+    @property
+    def vecinos(self)->list:
+        """
+        Listas de vecinos de cada punto (se crean la primera vez que se piden)
+
+        Returns:
+            list: Lista con la lista de vecinos de cada punto
+        """
+        if self._vecinos is None:
+            indices = self.indices.tolist()
+            indptr = self.indptr.tolist()
+            self._vecinos = [indices[indptr[i]:indptr[i+1]] for i in range(self.shape[0])]
+        return self._vecinos
+
+    @property
+    def nnz(self)->int:
+        """
+        Número de relaciones dirigidas guardadas
+        """
+        return len(self.indices)
+
+    def toarray(self)->np.ndarray:
+        """
+        Función para obtener la matriz de adyacencia densa equivalente
+
+        Returns:
+            np.ndarray: Matriz de adyacencia densa N×N
+        """
+        matriz = np.zeros(self.shape)
+        filas = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        matriz[filas, self.indices] = 1
+        return matriz
+
+class RejillaEspacial:
+    """
+    Índice espacial de rejilla uniforme (hash por celdas) para buscar los puntos más cercanos en bloque
+
+    Los puntos se ordenan por la celda en la que caen y cada consulta solo mira las 27 celdas vecinas. Si con
+    ellas no se puede garantizar que el resultado es exacto (la distancia del k-ésimo vecino es mayor que el
+    tamaño de celda) se repite la consulta en una rejilla con celdas cuatro veces más grandes.
+
+    Args:
+        puntos (np.ndarray): Array (N, 3) de puntos a indexar
+        tamano_celda (float, optional): Lado de las celdas. Defaults to None (se estima para tener pocos puntos por celda).
+    """
+    def __init__(self, puntos:np.ndarray, tamano_celda:float = None):
+        self.puntos = np.ascontiguousarray(puntos, dtype = np.float64).reshape(-1, 3)
+        self.minimo = self.puntos.min(axis = 0)
+        extension = np.maximum(self.puntos.max(axis = 0) - self.minimo, 1e-9)
+        if tamano_celda is None:
+            # Primera estimación como si los puntos llenasen el volumen y corrección con la ocupación real
+            # (los puntos del VTK están en una superficie y hay muchas celdas vacías)
+            tamano_celda = float(np.cbrt(np.prod(extension) / len(self.puntos)))
+            dimensiones = (extension // tamano_celda).astype(np.int64) + 1
+            ocupadas = len(np.unique(self._claves(self._celdas(self.puntos, tamano_celda), dimensiones)))
+            tamano_celda *= sqrt(2 * ocupadas / len(self.puntos))
+        self.tamano_celda = max(float(tamano_celda), 1e-9)
+        self.dimensiones = (extension // self.tamano_celda).astype(np.int64) + 1
+        claves = self._claves(self._celdas(self.puntos, self.tamano_celda), self.dimensiones)
+        self.orden = np.argsort(claves, kind = "stable")
+        [self.celdas, self.inicio, self.cantidad] = np.unique(claves[self.orden], return_index = True, return_counts = True)
+        self._rejilla_gruesa = None
+
+    def _celdas(self, puntos:np.ndarray, tamano_celda:float)->np.ndarray:
+        return np.floor((puntos - self.minimo) / tamano_celda).astype(np.int64)
+
+    def _claves(self, celdas:np.ndarray, dimensiones:np.ndarray)->np.ndarray:
+        return (celdas[:, 0] * dimensiones[1] + celdas[:, 1]) * dimensiones[2] + celdas[:, 2]
+
+    def consultar(self, consultas:np.ndarray, k:int = 1, tamano_bloque:int = 65536)->list:
+        """
+        Función para obtener los k puntos más cercanos de cada consulta
+
+        Args:
+            consultas (np.ndarray): Array (M, 3) de puntos a consultar
+            k (int, optional): Número de vecinos. Defaults to 1.
+            tamano_bloque (int, optional): Consultas procesadas a la vez para limitar la memoria. Defaults to 65536.
+
+        Returns:
+            list: [distancias, indices] arrays (M, k) ordenados de más cercano a más lejano
+        """
+        consultas = np.asarray(consultas, dtype = np.float64).reshape(-1, 3)
+        k = min(k, len(self.puntos))
+        distancias = np.empty((len(consultas), k))
+        indices = np.empty((len(consultas), k), dtype = np.int64)
+        for inicio in range(0, len(consultas), tamano_bloque):
+            bloque = slice(inicio, inicio + tamano_bloque)
+            [distancias[bloque], indices[bloque]] = self._consultar_bloque(consultas[bloque], k)
+        return [distancias, indices]
+
+    def _consultar_bloque(self, consultas:np.ndarray, k:int)->list:
+        [distancias, indices] = self._buscar_celdas(consultas, k)
+        # Los puntos fuera de las 27 celdas están como mínimo a la distancia de la consulta al borde del bloque de
+        # celdas mirado (entre uno y dos tamaños de celda), si el k-ésimo está más lejos no es seguro
+        relativa = (consultas - self.minimo) / self.tamano_celda - self._celdas(consultas, self.tamano_celda)
+        margen = (1 + np.minimum(relativa, 1 - relativa).min(axis = 1)) * self.tamano_celda
+        pendientes = np.flatnonzero(distancias[:, -1] > margen)
+        if len(pendientes) == 0: return [distancias, indices]
+        if self.dimensiones.max() > 2:
+            if self._rejilla_gruesa is None:
+                self._rejilla_gruesa = RejillaEspacial(self.puntos, self.tamano_celda * 4)
+            [distancias[pendientes], indices[pendientes]] = self._rejilla_gruesa._consultar_bloque(consultas[pendientes], k)
+            return [distancias, indices]
+        # Solo llegan aquí las consultas muy alejadas de todos los puntos
+        paso = max(1, 10**7 // len(self.puntos))
+        for inicio in range(0, len(pendientes), paso):
+            bloque = pendientes[inicio:inicio + paso]
+            todas = np.sqrt(np.sum((consultas[bloque, None, :] - self.puntos[None, :, :])**2, axis = 2))
+            cercanos = np.argsort(todas, axis = 1)[:, :k]
+            distancias[bloque] = np.take_along_axis(todas, cercanos, axis = 1)
+            indices[bloque] = cercanos
+        return [distancias, indices]
+
+    def _buscar_celdas(self, consultas:np.ndarray, k:int)->list:
+        celdas = self._celdas(consultas, self.tamano_celda)
+        ids_consulta = []
+        candidatos = []
+        for desplazamiento in DESPLAZAMIENTOS_VECINAS:
+            vecina = celdas + desplazamiento
+            validas = np.all((vecina >= 0) & (vecina < self.dimensiones), axis = 1)
+            claves = self._claves(vecina, self.dimensiones)
+            pos = np.minimum(np.searchsorted(self.celdas, claves), len(self.celdas) - 1)
+            encontradas = validas & (self.celdas[pos] == claves)
+            cantidad = np.where(encontradas, self.cantidad[pos], 0)
+            total = int(cantidad.sum())
+            if total == 0: continue
+            # Rango [inicio, inicio + cantidad) de cada consulta aplanado en un solo array
+            desfase = np.repeat(self.inicio[pos] - (np.cumsum(cantidad) - cantidad), cantidad)
+            ids_consulta.append(np.repeat(np.arange(len(consultas)), cantidad))
+            candidatos.append(self.orden[desfase + np.arange(total)])
+
+        distancias = np.full((len(consultas), k), np.inf)
+        indices = np.full((len(consultas), k), -1, dtype = np.int64)
+        if candidatos:
+            ids_consulta = np.concatenate(ids_consulta)
+            candidatos = np.concatenate(candidatos)
+            distancia = np.sqrt(np.sum((consultas[ids_consulta] - self.puntos[candidatos])**2, axis = 1))
+            orden = np.lexsort((distancia, ids_consulta))
+            ids_consulta = ids_consulta[orden]
+            posicion = np.arange(len(ids_consulta)) - np.searchsorted(ids_consulta, ids_consulta)
+            elegidos = posicion < k
+            distancias[ids_consulta[elegidos], posicion[elegidos]] = distancia[orden][elegidos]
+            indices[ids_consulta[elegidos], posicion[elegidos]] = candidatos[orden][elegidos]
+        return [distancias, indices]
+
+class TablaPesos:
+    """
+    Tabla con la longitud y el tiempo de conducción de cada relación dirigida del grafo
+
+    Se calcula una sola vez por grafo y campo de velocidades y está alineada con los índices de la MatrizDispersa:
+    la relación punto -> indices[e] tiene longitud longitudes[e] y tiempo tiempos[e] para indptr[punto] <= e < indptr[punto+1].
+
+    Args:
+        grafo (MatrizDispersa): Matriz de adyacencia dispersa del grafo
+        longitudes (np.ndarray): Longitud en milímetros de cada relación
+        tiempos (np.ndarray): Tiempo en segundos de cada relación (None si no hay velocidades)
+    """
+    def __init__(self, grafo:MatrizDispersa, longitudes:np.ndarray, tiempos:np.ndarray = None):
+        self.grafo = grafo
+        self.longitudes = longitudes
+        self.tiempos = tiempos
+        self._claves = None
+        self._listas = None
+
+    @property
+    def claves(self)->np.ndarray:
+        """
+        Clave origen * N + destino de cada relación (ordenadas, sirven para buscar relaciones con searchsorted)
+        """
+        if self._claves is None:
+            filas = np.repeat(np.arange(self.grafo.shape[0], dtype = np.int64), np.diff(self.grafo.indptr))
+            self._claves = filas * self.grafo.shape[0] + self.grafo.indices
+        return self._claves
+
+    def listas(self)->list:
+        """
+        Función para obtener la tabla como listas de Python (más rápidas de indexar una a una en la búsqueda)
+
+        Returns:
+            list: [indptr, indices, longitudes, tiempos] como listas (tiempos es None si no hay velocidades)
+        """
+        if self._listas is None:
+            tiempos = None if self.tiempos is None else self.tiempos.tolist()
+            self._listas = [self.grafo.indptr.tolist(), self.grafo.indices.tolist(), self.longitudes.tolist(), tiempos]
+        return self._listas
+
+    def vistas(self)->list:
+        """
+        Función para obtener la tabla como memoryviews de los arrays (sin copiarlos, para memoria compartida entre procesos)
+
+        Returns:
+            list: [indptr, indices, longitudes, tiempos] como memoryviews (tiempos es None si no hay velocidades)
+        """
+        tiempos = None if self.tiempos is None else memoryview(self.tiempos)
+        return [memoryview(self.grafo.indptr), memoryview(self.grafo.indices), memoryview(self.longitudes), tiempos]
+
+    def indices_aristas(self, camino:list)->np.ndarray:
+        """
+        Función para obtener la posición en la tabla de cada relación de un camino
+
+        Args:
+            camino (list): Lista de puntos del camino
+
+        Returns:
+            np.ndarray: Posición de cada relación (len(camino) - 1 elementos)
+        """
+        camino = np.asarray(camino, dtype = np.int64)
+        return self.posiciones(camino[:-1], camino[1:])
+
+    def posiciones(self, origen:np.ndarray, destino:np.ndarray)->np.ndarray:
+        """
+        Función para obtener la posición en la tabla de las relaciones origen -> destino
+
+        Args:
+            origen (np.ndarray): Punto de origen de cada relación
+            destino (np.ndarray): Punto de destino de cada relación
+
+        Returns:
+            np.ndarray: Posición de cada relación en la tabla
+        """
+        claves = np.asarray(origen, dtype = np.int64) * self.grafo.shape[0] + np.asarray(destino, dtype = np.int64)
+        posiciones = np.minimum(np.searchsorted(self.claves, claves), max(len(self.claves) - 1, 0))
+        if len(claves) > 0 and not np.array_equal(self.claves[posiciones], claves):
+            raise ValueError("Hay relaciones que no existen en el grafo")
+        return posiciones
+
+class BuscadorCiclos:
+    """
+    Búsqueda en profundidad iterativa de los ciclos acotados en distancia y tiempo que empiezan en un punto
+
+    Sustituye a la antigua búsqueda recursiva: usa una pila explícita, un único camino que se amplía y recorta, y un
+    bytearray de visitados, así que no depende del límite de recursión ni crea una lista por cada punto visitado.
+    Los buffers se reutilizan entre semillas. Recorre los vecinos en el mismo orden y aplica las mismas podas, por lo
+    que encuentra los mismos caminos y en el mismo orden que la versión recursiva.
+
+    Con cotas_retorno, antes de cada semilla se calcula la distancia mínima de cada punto a la semilla y el tiempo
+    mínimo hasta cerrar el ciclo, y se corta una rama en cuanto lo recorrido más esa cota supera el límite. Las cotas
+    nunca son mayores que lo que falta de verdad, así que solo se quitan ramas sin ciclos válidos.
+
+    Con modo_canonico cada ciclo solo se recorre desde su punto menor (no se entra en puntos menores que la semilla) y
+    en un único sentido (el segundo punto menor que el penúltimo), así que no se recorre cada ciclo una vez por punto
+    y sentido. El tiempo al cerrar no incluye la última relación, así que con velocidades que un ciclo cumpla el límite
+    de tiempo depende del punto desde el que se empieza y del sentido: si no lo cumple desde su punto menor se prueban
+    todos sus puntos y los dos sentidos, y se devuelve el camino que guardaría la búsqueda normal (el del primer punto
+    desde el que vale). Por eso en este modo la poda por tiempo es más floja (una cota del tiempo de cualquier rotación
+    en cada sentido, sin cotas de retorno de tiempo) y los ciclos de cada semilla se devuelven al acabarla, ordenados
+    como en la búsqueda normal; los que empiezan en otro punto los recoloca iterar_rotores.
+
+    Args:
+        tabla_pesos (TablaPesos): Tabla de pesos del grafo
+        puntos (list): Lista de puntos
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
+        sin_copias (bool, optional): Leer la tabla directamente de sus arrays con memoryviews en vez de pasarla a listas (para memoria compartida). Defaults to False.
+        cotas_retorno (bool, optional): Podar con la distancia y el tiempo mínimos para volver a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+        estadisticas (EstadisticasBusqueda, optional): Donde apuntar los contadores y el tiempo de cada semilla. Defaults to None.
+    """
+    def __init__(self, tabla_pesos:TablaPesos, puntos:list, limites_espacio:list, limites_tiempo:list, sin_copias:bool = False, cotas_retorno:bool = True, modo_canonico:bool = False, estadisticas = None):
+        self.tabla_pesos = tabla_pesos
+        self.limites_espacio = limites_espacio
+        self.limites_tiempo = limites_tiempo
+        self.tabla = tabla_pesos.vistas() if sin_copias else tabla_pesos.listas()
+        puntos = np.asarray(puntos, dtype = np.float64)
+        self.x = puntos[:, 0].tolist()
+        self.y = puntos[:, 1].tolist()
+        n_puntos = tabla_pesos.grafo.shape[0]
+        self.visitado = bytearray(n_puntos)
+        # Pila: por cada profundidad la siguiente relación a mirar, la última, la distancia, el tiempo (s) y el tiempo (ms)
+        self.siguiente = [0] * 64
+        self.fin = [0] * 64
+        self.dist = [0.0] * 64
+        self.tiempo = [0.0] * 64
+        self.temp = [0] * 64
+        # En modo canónico con tiempos, el tiempo del ciclo en el otro sentido y la relación más lenta de cada sentido
+        self.inverso = [0.0] * 64
+        self.max_directo = [0.0] * 64
+        self.max_inverso = [0.0] * 64
+        self.cotas_retorno = cotas_retorno
+        self.modo_canonico = modo_canonico
+        self.estadisticas = estadisticas
+        if modo_canonico and tabla_pesos.tiempos is not None:
+            # Posición de la relación contraria de cada relación (-1 si no existe)
+            grafo = tabla_pesos.grafo
+            claves = tabla_pesos.claves
+            origen = np.repeat(np.arange(n_puntos, dtype = np.int64), np.diff(grafo.indptr))
+            contrarias = np.asarray(grafo.indices, dtype = np.int64) * n_puntos + origen
+            posiciones = np.minimum(np.searchsorted(claves, contrarias), max(len(claves) - 1, 0))
+            self.inversa = np.where(claves[posiciones] == contrarias, posiciones, -1).tolist() if len(claves) > 0 else []
+        if cotas_retorno:
+            # Grafo traspuesto: en la fila de cada punto están los puntos desde los que se llega a él y el peso de esa relación
+            grafo = tabla_pesos.grafo
+            origen = np.repeat(np.arange(n_puntos, dtype = np.int32), np.diff(grafo.indptr))
+            orden = np.argsort(grafo.indices, kind = "stable")
+            indptr_t = np.zeros(n_puntos + 1, dtype = np.int64)
+            np.cumsum(np.bincount(grafo.indices, minlength = n_puntos), out = indptr_t[1:])
+            tiempos_t = None if tabla_pesos.tiempos is None else np.asarray(tabla_pesos.tiempos)[orden].tolist()
+            self.traspuesta = [indptr_t.tolist(), origen[orden].tolist(), np.asarray(tabla_pesos.longitudes)[orden].tolist(), tiempos_t]
+            self.cota_dist = [inf] * n_puntos
+            self.cota_tiempo = [inf] * n_puntos
+
+    def _ampliar_pila(self):
+        for pila in (self.siguiente, self.fin, self.dist, self.tiempo, self.temp, self.inverso, self.max_directo, self.max_inverso):
+            pila.extend(pila)
+
+    def _calcular_cotas(self, semilla:int, limite_dist:float, limite_tiempo:float, minimo:int = 0)->list:
+        """
+        Función interna que calcula las cotas de retorno de una semilla con dos Dijkstra acotados sobre el grafo traspuesto
+
+        cota_dist[i] es la distancia mínima de i a la semilla y cota_tiempo[i] el tiempo mínimo de i a algún punto
+        desde el que se cierra el ciclo (el tiempo al cerrar no incluye la última relación). Los puntos que no se
+        alcanzan dentro de los límites se quedan en inf. El tiempo solo se propaga por puntos que pueden estar en un
+        ciclo válido (cota_dist finita), así que el coste es el de la bola de radio limites_espacio[1].
+
+        Args:
+            semilla (int): Punto de inicio de los ciclos
+            limite_dist (float): Distancia máxima a propagar
+            limite_tiempo (float): Tiempo máximo a propagar (s), None para no calcular cotas de tiempo
+            minimo (int, optional): Punto más pequeño por el que se puede pasar. Defaults to 0.
+
+        Returns:
+            list: Puntos con alguna cota calculada (para dejarlas otra vez a inf)
+        """
+        [indptr, indices, longitudes, tiempos] = self.traspuesta
+        cota_dist = self.cota_dist
+        cota_tiempo = self.cota_tiempo
+        tocados = [semilla]
+        cota_dist[semilla] = 0.0
+        heap = [(0.0, semilla)]
+        while heap:
+            [d, v] = heapq.heappop(heap)
+            if d > cota_dist[v]: continue
+            for arista in range(indptr[v], indptr[v+1]):
+                w = indices[arista]
+                if w < minimo: continue
+                d2 = d + longitudes[arista]
+                if d2 < cota_dist[w] and d2 <= limite_dist:
+                    if cota_dist[w] == inf: tocados.append(w)
+                    cota_dist[w] = d2
+                    heapq.heappush(heap, (d2, w))
+        if limite_tiempo is None or tiempos is None: return tocados
+        heap = []
+        for arista in range(indptr[semilla], indptr[semilla+1]):
+            u = indices[arista]
+            if cota_dist[u] < inf and u != semilla:
+                cota_tiempo[u] = 0.0
+                heap.append((0.0, u))
+        while heap:
+            [t, v] = heapq.heappop(heap)
+            if t > cota_tiempo[v]: continue
+            for arista in range(indptr[v], indptr[v+1]):
+                w = indices[arista]
+                t2 = t + tiempos[arista]
+                if t2 < cota_tiempo[w] and t2 <= limite_tiempo and cota_dist[w] < inf:
+                    cota_tiempo[w] = t2
+                    heapq.heappush(heap, (t2, w))
+        return tocados
+
+    def _rotar_ciclo(self, ciclo:list, directas:list)->list:
+        """
+        Función interna que busca desde qué punto y en qué sentido cumple los límites un ciclo del modo canónico
+
+        Se prueban los puntos de menor a mayor y en cada uno los dos sentidos, sumando la distancia y el tiempo en el
+        mismo orden que la búsqueda normal desde ese punto, así que el resultado es el camino que guardaría ella.
+
+        Args:
+            ciclo (list): Puntos del ciclo desde la semilla (sin repetirla al final)
+            directas (list): Posición en la tabla de la relación de cada punto al siguiente (la última cierra el ciclo)
+
+        Returns:
+            list: [camino, distancia (mm), tiempo (s)] desde el primer punto y sentido que cumplen los límites, o None si no hay ninguno
+        """
+        [_, _, longitudes, tiempos] = self.tabla
+        [lim_inf, lim_sup] = self.limites_espacio
+        [tmp_inf, tmp_sup] = self.limites_tiempo
+        n = len(ciclo)
+        inversas = [self.inversa[arista] for arista in directas]
+        sentidos = 1 if -1 in inversas else 2
+        for j in sorted(range(n), key = ciclo.__getitem__):
+            validos = []
+            for sentido in range(sentidos):
+                if sentido == 0:
+                    puntos = ciclo[j:] + ciclo[:j]
+                    aristas = directas[j:] + directas[:j]
+                else:
+                    puntos = [ciclo[(j - k) % n] for k in range(n)]
+                    aristas = [inversas[(j - 1 - k) % n] for k in range(n)]
+                distancia = 0.0
+                tiempo = 0.0
+                for arista in aristas[:-1]:
+                    distancia += longitudes[arista]
+                    tiempo += tiempos[arista]
+                temp = inf if tiempo == inf else int(round(tiempo*1000))
+                distancia += longitudes[aristas[-1]]
+                if (lim_inf <= distancia <= lim_sup) and (tmp_inf <= temp <= tmp_sup):
+                    validos.append([puntos + [puntos[0]], distancia, tiempo + tiempos[aristas[-1]]])
+            if validos: return min(validos, key = lambda rotor: rotor[0])
+        return None
+
+    def buscar(self, semilla:int, unic:set, caminos:list)->None:
+        """
+        Función para buscar los ciclos que empiezan y acaban en una semilla
+
+        Args:
+            semilla (int): Punto de inicio de los ciclos
+            unic (set): Claves (clave_ciclo) de los caminos encontrados, se añaden las nuevas
+            caminos (list): Caminos de rotores encontrados, se añaden los nuevos
+        """
+        caminos.extend(camino for [camino, _, _] in self.iterar(semilla, unic))
+
+    def iterar(self, semilla:int, unic:set):
+        """
+        Función generadora que va devolviendo los ciclos que empiezan y acaban en una semilla según se encuentran
+
+        Args:
+            semilla (int): Punto de inicio de los ciclos
+            unic (set): Claves (clave_ciclo) de los caminos encontrados, se añaden las nuevas
+
+        Yields:
+            list: [camino, distancia (mm), tiempo (s) del ciclo completo o None si no hay velocidades]
+        """
+        [indptr, indices, longitudes, tiempos] = self.tabla
+        [lim_inf, lim_sup] = self.limites_espacio
+        [tmp_inf, tmp_sup] = self.limites_tiempo
+        con_tiempo = tiempos is not None
+        x = self.x
+        y = self.y
+        x0 = x[semilla]
+        y0 = y[semilla]
+        visitado = self.visitado
+        siguiente = self.siguiente
+        fin = self.fin
+        dist = self.dist
+        tiempo = self.tiempo
+        temp = self.temp
+        cotas_retorno = self.cotas_retorno
+        canonico = self.modo_canonico
+        minimo = semilla if canonico else 0
+        # En modo canónico con tiempos cada ciclo se prueba desde todos sus puntos y se guarda el mejor de cada clave
+        rotar = canonico and con_tiempo
+        por_clave = {}
+        if rotar:
+            inversa = self.inversa
+            inverso = self.inverso
+            max_directo = self.max_directo
+            max_inverso = self.max_inverso
+            # Holguras para que una suma en otro orden no deje fuera un ciclo justo en el límite
+            lim_poda = lim_sup + 1e-9 * max(1.0, lim_sup)
+            lim_inf_poda = lim_inf - 1e-9 * max(1.0, lim_inf)
+            tmp_rotar = (tmp_sup + 0.5 + 1e-6) / 1000
+        else:
+            lim_poda = lim_sup
+        estadisticas = self.estadisticas
+        if estadisticas is not None: inicio = time.perf_counter()
+        # Contadores de la semilla (se cuentan siempre, solo se guardan si hay estadísticas)
+        expandidos = poda_distancia = poda_recta = poda_cota_distancia = poda_tiempo = poda_cota_tiempo = cerrados = repetidos = 0
+        profundidad_maxima = 0
+        if cotas_retorno:
+            # Margen para que las sumas en otro orden del Dijkstra no poden por redondeo un ciclo justo en el límite
+            lim_cota = lim_sup + 1e-9 * max(1.0, lim_sup)
+            tmp_cota = (tmp_sup + 0.5 + 1e-6) / 1000 if con_tiempo and not rotar else None
+            tocados = self._calcular_cotas(semilla, lim_cota, tmp_cota, minimo)
+            cota_dist = self.cota_dist
+            cota_tiempo = self.cota_tiempo
+
+        camino = [semilla]
+        visitado[semilla] = 1
+        try:
+            siguiente[0] = indptr[semilla]
+            fin[0] = indptr[semilla+1]
+            dist[0] = 0.0
+            tiempo[0] = 0.0
+            temp[0] = 0 if con_tiempo else tmp_inf
+            if rotar:
+                inverso[0] = 0.0
+                max_directo[0] = 0.0
+                max_inverso[0] = 0.0
+            profundidad = 0
+            while profundidad >= 0:
+                arista = siguiente[profundidad]
+                if arista == fin[profundidad]:
+                    visitado[camino.pop()] = 0
+                    profundidad -= 1
+                    continue
+                siguiente[profundidad] = arista + 1
+                i = indices[arista]
+                if i < minimo: continue
+                if profundidad > 0 and i == camino[profundidad-1]: continue
+                if visitado[i]:
+                    if i != semilla: continue
+                    if canonico and camino[1] > camino[-1]: continue
+                    # Como en calcular_tiempo_camino(camino), el tiempo al cerrar no incluye la última relación
+                    dist2 = dist[profundidad] + longitudes[arista]
+                    if rotar:
+                        if dist2 < lim_inf_poda or dist2 > lim_poda: continue
+                        if (lim_inf <= dist2 <= lim_sup) and (tmp_inf <= temp[profundidad] <= tmp_sup):
+                            rotor = [camino + [i], dist2, tiempo[profundidad] + tiempos[arista]]
+                        else:
+                            rotor = self._rotar_ciclo(camino, [siguiente[p] - 1 for p in range(profundidad)] + [arista])
+                            if rotor is None: continue
+                        cerrados += 1
+                        clave = tuple(sorted(camino))
+                        anterior = por_clave.get(clave)
+                        if anterior is None or rotor[0] < anterior[0]: por_clave[clave] = rotor
+                        if anterior is not None: repetidos += 1
+                        continue
+                    if (lim_inf <= dist2 <= lim_sup) and (tmp_inf <= temp[profundidad] <= tmp_sup):
+                        cerrados += 1
+                        clave = tuple(sorted(camino))
+                        if clave not in unic:
+                            unic.add(clave)
+                            yield [camino + [i], dist2, tiempo[profundidad] + tiempos[arista] if con_tiempo else None]
+                        else:
+                            repetidos += 1
+                    continue
+
+                # Podas al entrar en el punto i
+                dist2 = dist[profundidad] + longitudes[arista]
+                if dist2 > lim_poda:
+                    poda_distancia += 1
+                    continue
+                dx = x[i] - x0
+                dy = y[i] - y0
+                if dist2 + sqrt(dx*dx + dy*dy) > lim_poda:
+                    poda_recta += 1
+                    continue
+                if cotas_retorno and dist2 + cota_dist[i] > lim_cota:
+                    poda_cota_distancia += 1
+                    continue
+                if rotar:
+                    tiempo2 = tiempo[profundidad] + tiempos[arista]
+                    temp2 = inf if tiempo2 == inf else int(round(tiempo2*1000))
+                    contraria = inversa[arista]
+                    tiempo_contrario = tiempos[contraria] if contraria >= 0 else inf
+                    inverso2 = inverso[profundidad] + tiempo_contrario
+                    max_directo2 = max(max_directo[profundidad], tiempos[arista])
+                    max_inverso2 = max(max_inverso[profundidad], tiempo_contrario)
+                    # Cualquier rotación deja fuera una sola relación, así que en cada sentido tarda al menos lo recorrido
+                    # menos la relación más lenta (sin cota si hay alguna infinita)
+                    if max_directo2 < inf and tiempo2 - max_directo2 > tmp_rotar and max_inverso2 < inf and inverso2 - max_inverso2 > tmp_rotar:
+                        poda_tiempo += 1
+                        continue
+                elif con_tiempo:
+                    tiempo2 = tiempo[profundidad] + tiempos[arista]
+                    temp2 = inf if tiempo2 == inf else int(round(tiempo2*1000))
+                    if temp2 > tmp_sup:
+                        poda_tiempo += 1
+                        continue
+                    if cotas_retorno and tiempo2 + cota_tiempo[i] > tmp_cota:
+                        poda_cota_tiempo += 1
+                        continue
+                else:
+                    tiempo2 = 0.0
+                    temp2 = tmp_inf
+
+                expandidos += 1
+                profundidad += 1
+                if profundidad > profundidad_maxima: profundidad_maxima = profundidad
+                if profundidad == len(siguiente): self._ampliar_pila()
+                camino.append(i)
+                visitado[i] = 1
+                siguiente[profundidad] = indptr[i]
+                fin[profundidad] = indptr[i+1]
+                dist[profundidad] = dist2
+                tiempo[profundidad] = tiempo2
+                temp[profundidad] = temp2
+                if rotar:
+                    inverso[profundidad] = inverso2
+                    max_directo[profundidad] = max_directo2
+                    max_inverso[profundidad] = max_inverso2
+            # En modo canónico con tiempos se devuelve el mejor camino de cada clave en el orden de la búsqueda normal
+            for rotor in sorted(por_clave.values(), key = lambda rotor: rotor[0]):
+                clave = clave_ciclo(rotor[0])
+                if clave in unic:
+                    repetidos += 1
+                    continue
+                unic.add(clave)
+                yield rotor
+        finally:
+            # Si se deja de consumir el generador a medias hay que dejar limpio el bytearray para la siguiente semilla
+            for punto in camino:
+                visitado[punto] = 0
+            if cotas_retorno:
+                for punto in tocados:
+                    cota_dist[punto] = inf
+                    cota_tiempo[punto] = inf
+            if estadisticas is not None:
+                estadisticas.anotar_semilla(semilla, [expandidos, poda_distancia, poda_recta, poda_cota_distancia, poda_tiempo, poda_cota_tiempo, cerrados, repetidos], profundidad_maxima, time.perf_counter() - inicio)
+
+class IndiceRotores:
+    """
+    Índice invertido punto -> rotores que pasan por él, construido una sola vez a partir de la lista de caminos
+
+    Guarda en formato CSR, para cada punto, los índices de los caminos que pasan por él (sin repetir el último punto
+    de cada camino, que es el mismo que el primero).
+
+    Args:
+        rotores (list): Lista de caminos (reentradas funcionales o anatómicas)
+        n_puntos (int, optional): Número de puntos del grafo. Defaults to None (el mayor punto de los caminos + 1).
+    """
+    def __init__(self, rotores:list, n_puntos:int = None):
+        if isinstance(rotores, ColeccionCaminos):
+            # Se quita el último punto de cada camino directamente sobre el array plano
+            longitudes = np.maximum(np.diff(rotores.offsets), 1) - 1
+            ultimos = np.zeros(len(rotores.vertices), dtype = bool)
+            ultimos[np.asarray(rotores.offsets[1:])[np.diff(rotores.offsets) > 0] - 1] = True
+            puntos = np.asarray(rotores.vertices, dtype = np.int64)[~ultimos]
+        else:
+            longitudes = np.array([max(len(rotor) - 1, 0) for rotor in rotores], dtype = np.int64)
+            puntos = np.fromiter((p for rotor in rotores for p in rotor[:-1]), dtype = np.int64, count = int(longitudes.sum()))
+        self._crear(puntos, np.repeat(np.arange(len(longitudes)), longitudes), len(longitudes), n_puntos)
+
+    def _crear(self, puntos:np.ndarray, rotores:np.ndarray, n_rotores:int, n_puntos:int = None):
+        if n_puntos is None: n_puntos = int(puntos.max()) + 1 if len(puntos) > 0 else 0
+        self.n_rotores = n_rotores
+        orden = np.lexsort((rotores, puntos))
+        [puntos, rotores] = [puntos[orden], rotores[orden]]
+        # Un camino que pasa dos veces por un punto solo cuenta una vez
+        distintos = np.ones(len(puntos), dtype = bool)
+        distintos[1:] = (puntos[1:] != puntos[:-1]) | (rotores[1:] != rotores[:-1])
+        self.rotores = rotores[distintos]
+        self.indptr = np.zeros(n_puntos + 1, dtype = np.int64)
+        np.cumsum(np.bincount(puntos[distintos], minlength = n_puntos), out = self.indptr[1:])
+
+    def rotores_en_punto(self, punto:int)->np.ndarray:
+        """
+        Función para obtener los rotores que pasan por un punto
+
+        Args:
+            punto (int): Punto a consultar
+
+        Returns:
+            np.ndarray: Índices de los rotores que pasan por el punto
+        """
+        return self.rotores[self.indptr[punto]:self.indptr[punto+1]]
+
+    def contiene(self, punto:int)->bool:
+        """
+        Función para saber si algún rotor pasa por un punto
+
+        Args:
+            punto (int): Punto a consultar
+
+        Returns:
+            bool: Si algún rotor pasa por el punto
+        """
+        return bool(self.indptr[punto+1] > self.indptr[punto])
+
+    def tiempo_maximo(self, tiempos:list)->np.ndarray:
+        """
+        Función para calcular el máximo tiempo de los rotores que pasan por cada punto (0 si no pasa ninguno)
+
+        Args:
+            tiempos (list): Tiempo de cada rotor
+
+        Returns:
+            np.ndarray: Tiempo máximo de cada punto
+        """
+        tiempos = np.asarray(tiempos)
+        maximos = np.zeros(len(self.indptr) - 1, dtype = tiempos.dtype if len(tiempos) > 0 else np.int64)
+        con_rotores = np.flatnonzero(np.diff(self.indptr))
+        if len(con_rotores) > 0:
+            maximos[con_rotores] = np.maximum.reduceat(tiempos[self.rotores], self.indptr[con_rotores])
+            np.maximum(maximos, 0, out = maximos)
+        return maximos
+
+class ColeccionCaminos:
+    """
+    Caminos guardados de forma compacta: todos los puntos en un array plano y dónde empieza cada camino
+
+    Se comporta como una lista de solo lectura (len, índice, iterar) donde cada camino es un array de puntos.
+
+    Args:
+        vertices (np.ndarray): Puntos de todos los caminos uno detrás de otro
+        offsets (np.ndarray): Posición en vertices donde empieza cada camino (n_caminos + 1 elementos)
+        distancias (np.ndarray, optional): Distancia de cada camino. Defaults to None.
+        tiempos (np.ndarray, optional): Tiempo de cada camino. Defaults to None.
+    """
+    def __init__(self, vertices:np.ndarray, offsets:np.ndarray, distancias:np.ndarray = None, tiempos:np.ndarray = None):
+        self.vertices = vertices
+        self.offsets = offsets
+        self.distancias = distancias
+        self.tiempos = tiempos
+
+    @classmethod
+    def desde_lista(cls, caminos:list, distancias:list = None, tiempos:list = None):
+        """
+        Función para crear la colección a partir de una lista de caminos
+
+        Args:
+            caminos (list): Lista de caminos
+            distancias (list, optional): Distancia de cada camino. Defaults to None.
+            tiempos (list, optional): Tiempo de cada camino. Defaults to None.
+
+        Returns:
+            ColeccionCaminos: Colección con los caminos
+        """
+        offsets = np.zeros(len(caminos) + 1, dtype = np.int64)
+        np.cumsum([len(camino) for camino in caminos], out = offsets[1:])
+        vertices = np.fromiter((p for camino in caminos for p in camino), dtype = np.int32, count = int(offsets[-1]))
+        distancias = None if distancias is None else np.asarray(distancias, dtype = np.float64)
+        tiempos = None if tiempos is None else np.asarray(tiempos, dtype = np.float64)
+        return cls(vertices, offsets, distancias, tiempos)
+
+    def __len__(self)->int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i:int)->np.ndarray:
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("Índice de camino fuera de rango")
+        return self.vertices[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.vertices[self.offsets[i]:self.offsets[i+1]]
+
+    def tolist(self)->list:
+        """
+        Función para pasar los caminos a una lista de listas
+
+        Returns:
+            list: Lista de caminos
+        """
+        vertices = np.asarray(self.vertices).tolist()
+        offsets = np.asarray(self.offsets).tolist()
+        return [vertices[offsets[i]:offsets[i+1]] for i in range(len(self))]
+
+class CampoVelocidades:
+    """
+    Velocidades de conducción de todos los puntos guardadas en arrays (fibras, velocidad y anisotropía)
+
+    Se comporta como la lista [[vector], velocidad (mm/s), penalización] de siempre (len, índice, iterar), así que se
+    puede pasar en cualquier sitio que reciba velocidades. La velocidad penalizada es velocidad_base * penalizador y
+    se puede cambiar de penalizador sin volver a leer nada; las tablas de pesos ya creadas no se actualizan solas.
+
+    Args:
+        fibras (np.ndarray): Dirección de las fibras de cada punto (N, 3)
+        velocidad_base (np.ndarray): Velocidad de cada punto sin penalizar (mm/s)
+        anisotropia (np.ndarray): Anisotropía de cada punto
+        penalizador (float, optional): Penalizador de las velocidades. Defaults to 1.
+    """
+    def __init__(self, fibras:np.ndarray, velocidad_base:np.ndarray, anisotropia:np.ndarray, penalizador:float = 1):
+        self.fibras = np.asarray(fibras, dtype = np.float64).reshape(-1, 3)
+        self.velocidad_base = np.asarray(velocidad_base, dtype = np.float64)
+        self.anisotropia = np.asarray(anisotropia, dtype = np.float64)
+        self.velocidad = np.empty_like(self.velocidad_base)
+        self.penalizar(penalizador)
+
+    def penalizar(self, penalizador:float)->None:
+        """
+        Función para cambiar el penalizador, reescribe la velocidad en el mismo array
+
+        Args:
+            penalizador (float): Penalizador de las velocidades (Número entre 0 y 1)
+        """
+        self.penalizador = penalizador
+        np.multiply(self.velocidad_base, penalizador, out = self.velocidad)
+
+    def __len__(self)->int:
+        return len(self.velocidad)
+
+    def __getitem__(self, i:int)->list:
+        return [self.fibras[i], self.velocidad[i], self.anisotropia[i]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self)->list:
+        """
+        Función para pasar las velocidades a la lista [[vector], velocidad (mm/s), penalización]
+
+        Returns:
+            list: Lista de velocidades
+        """
+        return [list(dato) for dato in zip(self.fibras.tolist(), self.velocidad.tolist(), self.anisotropia.tolist())]
+
+class EstadisticasBusqueda:
+    """
+    Contadores de la búsqueda de rotores, en total y por semilla, para ver dónde se va el tiempo y ajustar los límites
+
+    Los contadores son: puntos expandidos, ramas podadas por distancia, por la distancia en línea recta a la semilla,
+    por la cota de distancia de retorno, por tiempo y por la cota de tiempo de retorno, ciclos cerrados dentro de los
+    límites y ciclos repetidos descartados. Por semilla se guarda además el tiempo (incluye lo que tarde quien consume
+    los rotores si se usa iterar_rotores) y la profundidad máxima.
+
+    Args:
+        gancho (function, optional): Función gancho(semilla, contadores) que se llama al acabar cada semilla con un dict
+            de sus contadores, para enganchar un profiler o ir pintando. Defaults to None.
+    """
+    CONTADORES = ["expandidos", "poda_distancia", "poda_recta", "poda_cota_distancia", "poda_tiempo", "poda_cota_tiempo", "ciclos_cerrados", "repetidos"]
+
+    def __init__(self, gancho = None):
+        self.gancho = gancho
+        self.totales = [0] * len(self.CONTADORES)
+        self.profundidad_maxima = 0
+        self.semillas = []
+        self.por_semilla_contadores = []
+        self.profundidades = []
+        self.tiempos = []
+
+    def anotar_semilla(self, semilla:int, contadores:list, profundidad_maxima:int, tiempo:float)->None:
+        """
+        Función para añadir los contadores de una semilla
+
+        Args:
+            semilla (int): Semilla buscada
+            contadores (list): Valor de cada contador de CONTADORES en la semilla
+            profundidad_maxima (int): Profundidad máxima a la que ha llegado la búsqueda
+            tiempo (float): Tiempo de la semilla en segundos
+        """
+        for i, valor in enumerate(contadores):
+            self.totales[i] += valor
+        self.profundidad_maxima = max(self.profundidad_maxima, profundidad_maxima)
+        self.semillas.append(semilla)
+        self.por_semilla_contadores.append(contadores)
+        self.profundidades.append(profundidad_maxima)
+        self.tiempos.append(tiempo)
+        if self.gancho is not None:
+            datos = dict(zip(self.CONTADORES, contadores))
+            datos["profundidad_maxima"] = profundidad_maxima
+            datos["tiempo"] = tiempo
+            self.gancho(semilla, datos)
+
+    def sumar(self, otra)->None:
+        """
+        Función para añadir las semillas de otras estadísticas (por ejemplo las de un bloque de otro proceso)
+
+        Args:
+            otra (EstadisticasBusqueda): Estadísticas a añadir
+        """
+        for datos in zip(otra.semillas, otra.por_semilla_contadores, otra.profundidades, otra.tiempos):
+            self.anotar_semilla(*datos)
+
+    def anotar_repetidos(self, repetidos:int)->None:
+        # Repetidos que se descartan fuera del buscador (al juntar los bloques de varios procesos)
+        self.totales[self.CONTADORES.index("repetidos")] += repetidos
+
+    def resumen(self)->dict:
+        """
+        Función para obtener los contadores totales
+
+        Returns:
+            dict: Contadores totales, profundidad máxima, semillas y tiempo total (s)
+        """
+        resumen = dict(zip(self.CONTADORES, self.totales))
+        resumen["profundidad_maxima"] = self.profundidad_maxima
+        resumen["semillas"] = len(self.semillas)
+        resumen["tiempo"] = sum(self.tiempos)
+        return resumen
+
+    def por_semilla(self)->pd.DataFrame:
+        """
+        Función para obtener los contadores de cada semilla
+
+        Returns:
+            pd.DataFrame: Una fila por semilla con sus contadores, profundidad máxima y tiempo
+        """
+        datos = pd.DataFrame(np.array(self.por_semilla_contadores, dtype = np.int64).reshape(-1, len(self.CONTADORES)), columns = self.CONTADORES)
+        datos.insert(0, "semilla", np.array(self.semillas, dtype = np.int64))
+        datos["profundidad_maxima"] = np.array(self.profundidades, dtype = np.int64)
+        datos["tiempo"] = np.array(self.tiempos, dtype = np.float64)
+        return datos
+
+    def mapa(self, n_puntos:int, campo:str = "tiempo")->np.ndarray:
+        """
+        Función para pasar un campo por semilla a un valor por punto (0 en las semillas no buscadas), para pintarlo sobre la malla
+
+        Args:
+            n_puntos (int): Número de puntos del grafo
+            campo (str, optional): "tiempo", "profundidad_maxima" o uno de CONTADORES. Defaults to "tiempo".
+
+        Returns:
+            np.ndarray: Valor de cada punto
+        """
+        if campo == "tiempo": valores = self.tiempos
+        elif campo == "profundidad_maxima": valores = self.profundidades
+        elif campo in self.CONTADORES: valores = [contadores[self.CONTADORES.index(campo)] for contadores in self.por_semilla_contadores]
+        else: raise ValueError("Campo de estadísticas desconocido: " + str(campo))
+        mapa = np.zeros(n_puntos)
+        mapa[np.array(self.semillas, dtype = np.int64)] = valores
+        return mapa
+
+class ReductorTiempoMaximo:
+    """
+    Reductor que va guardando el tiempo máximo (ms) de los rotores que pasan por cada punto, como calcular_tiempo_maximo_punto
+
+    Args:
+        n_puntos (int): Número de puntos del grafo
+    """
+    def __init__(self, n_puntos:int):
+        self.maximos = [0] * n_puntos
+
+    def actualizar(self, camino:list, distancia:float, tiempo:float)->None:
+        if tiempo is None: return
+        tiempo = tiempo_ms(tiempo)
+        maximos = self.maximos
+        for punto in camino[:-1]:
+            if tiempo > maximos[punto]: maximos[punto] = tiempo
+
+    def resultado(self)->list:
+        return self.maximos
+
+class ReductorConteo:
+    """
+    Reductor que cuenta los rotores y, si se da el número de puntos, cuántos pasan por cada punto
+
+    Args:
+        n_puntos (int, optional): Número de puntos del grafo. Defaults to None (solo el total).
+    """
+    def __init__(self, n_puntos:int = None):
+        self.total = 0
+        self.por_punto = None if n_puntos is None else [0] * n_puntos
+
+    def actualizar(self, camino:list, distancia:float, tiempo:float)->None:
+        self.total += 1
+        if self.por_punto is None: return
+        por_punto = self.por_punto
+        for punto in camino[:-1]:
+            por_punto[punto] += 1
+
+    def resultado(self):
+        return self.total if self.por_punto is None else [self.total, self.por_punto]
+
+class ReductorHistograma:
+    """
+    Reductor que cuenta los rotores por intervalos de tiempo (ms), distancia (mm) o número de puntos, como np.histogram
+
+    Args:
+        bordes (list): Bordes de los intervalos en orden creciente, el último intervalo incluye su borde superior
+        campo (str, optional): "tiempo", "distancia" o "puntos". Defaults to "tiempo".
+    """
+    def __init__(self, bordes:list, campo:str = "tiempo"):
+        if campo not in ("tiempo", "distancia", "puntos"):
+            raise ValueError("El campo del histograma tiene que ser tiempo, distancia o puntos")
+        self.bordes = list(bordes)
+        self.campo = campo
+        self.conteos = [0] * (len(self.bordes) - 1)
+
+    def actualizar(self, camino:list, distancia:float, tiempo:float)->None:
+        if self.campo == "tiempo":
+            if tiempo is None: return
+            valor = tiempo_ms(tiempo)
+        elif self.campo == "distancia":
+            valor = distancia
+        else:
+            valor = len(camino) - 1
+        bordes = self.bordes
+        if not bordes[0] <= valor <= bordes[-1]: return
+        intervalo = min(bisect.bisect_right(bordes, valor) - 1, len(self.conteos) - 1)
+        self.conteos[intervalo] += 1
+
+    def resultado(self)->list:
+        return [self.conteos, self.bordes]
+
 
 # Funciones internas
 # ----------------------------------------------------------------------------------
@@ -39,199 +1038,244 @@ def calcular_distancia(punto1:list, punto2:list)->float:
     return sqrt((punto1[0] - punto2[0])**2+(punto1[1] - punto2[1])**2)
 
 
-def transformar_nombres(puntos:list)->list:
+def tiempo_ms(tiempo:float)->float:
     """
-    Función interna para transformar los nombres de los puntos a strings para crear el grafo
+    Función interna para pasar un tiempo en segundos a milisegundos redondeados
 
     Args:
-        puntos (list): Lista de los puntos
+        tiempo (float): Tiempo en segundos
 
     Returns:
-        list: Lista con los nombre de los indices de los puntos pasados a string
+        float: Tiempo en milisegundos redondeado (infinito si el tiempo no es finito, por ejemplo con velocidad 0)
     """
-    nombres = []
-    for i in range(len(puntos)):
-        nombres.append(str(i))
-    return nombres
+    if tiempo == inf: return inf
+    return int(round(tiempo*1000))
 
-def transformar_relaciones(matriz_adyacencia:list)->list:
+def hay_velocidades(velocidades:list)->bool:
     """
-    Función interna para transformar la matriz de adyacencia en una lista de relaciones
+    Función interna para saber si se han pasado velocidades
 
     Args:
-        matriz_adyacencia (list): Matriz de adyacencia
+        velocidades (list): Velocidades de los puntos o None
 
     Returns:
-        list: Relaciones en formato grafo
+        bool: Si hay velocidades
     """
-    relaciones = []
-    for i in range(matriz_adyacencia.shape[0]):
-        for j in range(matriz_adyacencia.shape[1]):
-            if(matriz_adyacencia[i,j] != 0):
-                relaciones.append((str(i), str(j), matriz_adyacencia[i,j]))
-    return relaciones
+    return velocidades is not None and len(velocidades) > 0
 
-def transformar_coordenadas(puntos:list)->dict:
+def velocidades_a_arrays(velocidades:list)->list:
     """
-    Función interna para transformar las coordenadas de los puntos en un diccionario
-    
+    Función interna para pasar las velocidades [[vector], velocidad (mm/s), penalización] a arrays
+
     Args:
-        puntos (list): Lista de los puntos
-        
+        velocidades (list): Velocidades de los puntos [[vector], velocidad (mm/s), penalización] o CampoVelocidades
+
     Returns:
-        dict: Diccionario con las coordenadas de los puntos
+        list: [fibras (N, 3), velocidad (N,), anisotropia (N,)]
     """
-    coordenadas = dict()
-    for i in range(len(puntos)):
-        coordenadas[str(i)] = (puntos[i][0], puntos[i][1])
-    return coordenadas
-
-def son_perpendiculares(v:list, w:list)->float:
+    if isinstance(velocidades, CampoVelocidades):
+        return [velocidades.fibras, velocidades.velocidad, velocidades.anisotropia]
+    fibras = np.array([v[0] for v in velocidades], dtype = np.float64).reshape(-1, 3)
+    velocidad = np.array([v[1] for v in velocidades], dtype = np.float64)
+    anisotropia = np.array([v[2] for v in velocidades], dtype = np.float64)
+    return [fibras, velocidad, anisotropia]
+
+def matriz_a_dispersa(matriz_adyacencia:list)->MatrizDispersa:
     """
-    Función interna para calcular el grado de perpendicularidad
-    
+    Función interna para obtener la MatrizDispersa de una matriz de adyacencia densa (si ya es dispersa se devuelve tal cual)
+
     Args:
-        v (list): Vector 1
-        w (list): Vector 2
-        
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+
     Returns:
-        float: Grado de perpendicularidad (0, 90)
+        MatrizDispersa: Matriz de adyacencia en formato CSR
     """
-    producto_punto = np.dot(v, w)
-    norma_v = np.linalg.norm(v)
-    norma_w = np.linalg.norm(w)
-    angulo = np.degrees(np.arccos(producto_punto / (norma_v * norma_w)))
-    if angulo > 90: angulo = 180 - angulo
-    return angulo/90
+    if isinstance(matriz_adyacencia, MatrizDispersa): return matriz_adyacencia
+    matriz_adyacencia = np.asarray(matriz_adyacencia)
+    [filas, columnas] = np.nonzero(matriz_adyacencia)
+    indptr = np.zeros(matriz_adyacencia.shape[0] + 1, dtype = np.int64)
+    np.cumsum(np.bincount(filas, minlength = matriz_adyacencia.shape[0]), out = indptr[1:])
+    return MatrizDispersa(indptr, columnas)
+
+def pesos_aristas(origen:np.ndarray, destino:np.ndarray, puntos:np.ndarray, velocidades:list = None)->list:
+    """
+    Función interna para calcular a la vez la longitud y el tiempo de conducción de muchas relaciones dirigidas
 
-def detectar_camino_rotor(matriz_adyacencia:list, puntos:list, punto:int, limites_espacio:list, limites_tiempo:list, camino:list = [], unic:list = [], ant:list = None, caminos:list = [], velocidades:list = [])->None:
+    Hace lo mismo que calcular_distancia y el cálculo de calcular_tiempo_camino (incluido son_perpendiculares) pero vectorizado
+
+    Args:
+        origen (np.ndarray): Punto de origen de cada relación
+        destino (np.ndarray): Punto de destino de cada relación
+        puntos (np.ndarray): Array de puntos
+        velocidades (list, optional): Velocidades de los puntos [[vector], velocidad (mm/s), penalización]. Defaults to None.
+
+    Returns:
+        list: [longitudes (mm), tiempos (s)] de cada relación (tiempos es None si no hay velocidades)
+    """
+    puntos = np.asarray(puntos, dtype = np.float64)
+    vector = puntos[destino] - puntos[origen]
+    longitudes = np.sqrt(vector[:, 0]**2 + vector[:, 1]**2)
+    if not hay_velocidades(velocidades): return [longitudes, None]
+    [fibras, velocidad, anisotropia] = velocidades_a_arrays(velocidades)
+    fibras = fibras[origen]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        coseno = np.sum(vector * fibras, axis = 1) / (np.linalg.norm(vector, axis = 1) * np.linalg.norm(fibras, axis = 1))
+        angulo = np.degrees(np.arccos(np.clip(coseno, -1, 1)))
+        angulo = np.where(angulo > 90, 180 - angulo, angulo)
+        pen = angulo/90*(anisotropia[origen]-1)+1
+        tiempos = longitudes/(pen*velocidad[origen])
+    return [longitudes, tiempos]
+
+def crear_tabla_pesos(matriz_adyacencia:list, puntos:list, velocidades:list = None)->TablaPesos:
     """
-    Función interna para detectar los caminos de los rotores
+    Función para calcular una sola vez la longitud y el tiempo de conducción de todas las relaciones del grafo
 
     Args:
-        matriz_adyacencia (list): Matriz de adyacencia
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
         puntos (list): Lista de puntos
-        punto (int): Punto en el que se encuentra
-        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
-        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
-        camino (list, optional): Camino actual. Defaults to []
-        unic (list, optional): Caminos únicos. Defaults to []
-        ant ([type], optional): Punto anterior. Defaults to None
-        caminos (list, optional): Caminos de rotores encontrados. Defaults to []
-        velocidades: Velocidades de los puntos [[vector], velocidad (mm/s), penalización]
-        
+        velocidades (list, optional): Velocidades de los puntos [[vector], velocidad (mm/s), penalización]. Defaults to None.
+
     Returns:
-        None
+        TablaPesos: Tabla de pesos alineada con la matriz dispersa del grafo
     """
-    if camino == []:
-        camino = [punto]
-    
-    dist = calcular_distancia_camino(camino, puntos)
-    if dist > limites_espacio[1]: return
-    if dist + calcular_distancia(puntos[punto], puntos[camino[0]]) > limites_espacio[1]: return
-    
-    if velocidades != []:
-        temp = calcular_tiempo_camino(camino, velocidades, puntos)
-        temp = int(round(temp*1000))
-        if temp > limites_tiempo[1]: return
-    
-    
-    conexiones = [i for i, x in enumerate(matriz_adyacencia[punto]) if x != 0]
-    for i in conexiones:
-        if i == ant: continue
-        if i in camino:
-            if i != camino[0]: continue
-            camino2 = list(camino)
-            camino2.append(i)
-            dist2 = calcular_distancia_camino(camino2, puntos)
-            if velocidades != []:
-                temp2 = calcular_tiempo_camino(camino, velocidades, puntos)
-                temp2 = int(round(temp2*1000))
-            else: temp2 = limites_tiempo[0]
-            
-            if (limites_espacio[0] <= dist2 <= limites_espacio[1]) and (limites_tiempo[0] <= temp2 <= limites_tiempo[1]):
-                camino2 = camino2[camino2.index(i):]
-                camino2 = camino2[:-1]
-                camino2.sort()
-                if camino2 not in unic:
-                    unic.append(camino2)
-                    caminos.append(camino + [i])
-                continue
-            else: continue
-        camino2 = list(camino)
-        camino2.append(i)
-        detectar_camino_rotor(matriz_adyacencia, puntos, punto = i, limites_espacio = limites_espacio, limites_tiempo = limites_tiempo, camino = camino2, unic = unic, ant = punto, caminos = caminos, velocidades = velocidades)
-     
-def retorna_color_relacion(tiempos:list, valor_max:int, valor_med:int)->str:
+    grafo = matriz_a_dispersa(matriz_adyacencia)
+    origen = np.repeat(np.arange(grafo.shape[0]), np.diff(grafo.indptr))
+    [longitudes, tiempos] = pesos_aristas(origen, grafo.indices, puntos, velocidades)
+    return TablaPesos(grafo, longitudes, tiempos)
+
+def clave_ciclo(camino:list)->tuple:
     """
-    Función interna para retornar el color de una relación en base a los tiempos
+    Función interna para obtener la clave canónica de un ciclo cerrado (el último punto repite el primero)
+
+    Dos ciclos con los mismos puntos tienen la misma clave sin importar el punto de inicio ni el sentido, y al ser
+    una tupla se puede guardar en un set para comprobar repetidos en O(1)
 
     Args:
-        tiempos (list): Tiempos de los nodos implicados
-        valor_max (int): Tiempo (ms) que se considera rojo en el mapa de calor
-        valor_med (int): Tiempo (ms) en el que se considera amarillo en el mapa de calor
+        camino (list): Lista de puntos del ciclo
 
     Returns:
-        str: Color formato HTML
+        tuple: Puntos del ciclo (sin repetir el último) ordenados
     """
-    return valor_a_color_html(max(tiempos), valor_max, valor_med)
+    return tuple(sorted(camino[:-1]))
 
-def retorna_color_poligono(tiempos:list, max_tiempo:int, med_tiempo:int)->str:
+def numero_puntos(matriz_adyacencia:list)->int:
     """
-    Función interna para retornar el color de un polígono en base a los tiempos
-    
+    Función interna para obtener el número de puntos de una matriz de adyacencia densa o dispersa
+
     Args:
-        tiempos (list): Lista de tiempos de los nodos
-        max_tiempo (int): Tiempo (ms) que se considera rojo en el mapa de calor
-        med_tiempo (int): Tiempo (ms) en el que se considera amarillo en el mapa de calor
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+
     Returns:
-        str: Color en formato HTML
+        int: Número de puntos del grafo
+    """
+    if isinstance(matriz_adyacencia, MatrizDispersa): return matriz_adyacencia.shape[0]
+    return len(matriz_adyacencia[0])
+
+def aristas_no_dirigidas(matriz_adyacencia:list)->list:
     """
-    return valor_a_color_html(max(tiempos), max_tiempo, med_tiempo)
+    Función interna para obtener cada relación del grafo una sola vez como (menor, mayor), ordenadas por su clave
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
 
-def valor_a_color_html(valor:int, valor_max:int = VALOR_REENTRADA, valor_med:int = VALOR_MED_REENTRADA):
+    Returns:
+        list: [claves (menor * n_puntos + mayor), menores, mayores]
+    """
+    grafo = matriz_a_dispersa(matriz_adyacencia)
+    n_puntos = grafo.shape[0]
+    origen = np.repeat(np.arange(n_puntos, dtype = np.int64), np.diff(grafo.indptr))
+    destino = np.asarray(grafo.indices, dtype = np.int64)
+    claves = np.unique(np.minimum(origen, destino) * n_puntos + np.maximum(origen, destino))
+    return [claves, claves // max(n_puntos, 1), claves % max(n_puntos, 1)]
+
+def posiciones_aristas_caminos(claves:np.ndarray, caminos:list, n_puntos:int)->list:
     """
-    Función interna para transformar un valor en un color en formato HTML
+    Función interna para saber qué relación de aristas_no_dirigidas es cada paso de los caminos con searchsorted
 
     Args:
-        valor (int): Tiempo a transformar
-        valor_max (int, optional): Tiempo (ms) que se considera rojo. Defaults to VALOR_REENTRADA.
-        valor_med (int, optional): Tiempo (ms) que se considera amarillo. Defaults to VALOR_MED_REENTRADA.
+        claves (np.ndarray): Claves ordenadas de las relaciones (aristas_no_dirigidas)
+        caminos (list): Lista de caminos o ColeccionCaminos
+        n_puntos (int): Número de puntos del grafo
 
     Returns:
-        _type_: _description_
+        list: [posición de la relación de cada paso, camino al que pertenece cada paso]
     """
+    if not isinstance(caminos, ColeccionCaminos):
+        caminos = ColeccionCaminos.desde_lista(caminos)
+    vertices = np.asarray(caminos.vertices, dtype = np.int64)
+    offsets = np.asarray(caminos.offsets, dtype = np.int64)
+    # Un paso por cada par de puntos seguidos que no cruce de un camino al siguiente
+    pasos = np.ones(max(len(vertices) - 1, 0), dtype = bool)
+    pasos[offsets[1:-1][(offsets[1:-1] > 0) & (offsets[1:-1] < len(vertices))] - 1] = False
+    origen = vertices[:-1][pasos]
+    destino = vertices[1:][pasos]
+    ids = np.repeat(np.arange(len(caminos)), np.maximum(np.diff(offsets) - 1, 0))
+    buscadas = np.minimum(origen, destino) * n_puntos + np.maximum(origen, destino)
+    posiciones = np.minimum(np.searchsorted(claves, buscadas), max(len(claves) - 1, 0))
+    if len(buscadas) > 0 and not np.array_equal(claves[posiciones], buscadas):
+        raise ValueError("Hay caminos con relaciones que no existen en el grafo")
+    return [posiciones, ids]
+
+def son_perpendiculares(v:list, w:list)->float:
+    """
+    Función interna para calcular el grado de perpendicularidad
     
-    cmap_dict = {
-        (0, valor_med): ('#0000FF', '#FCFF0E'),           # Azul a amarillo
-        (valor_med, valor_max): ('#FCFF0E', '#FF0000'),   # Amarillo a rojo 
-    }
-    if valor >= valor_max: return '#FF0000'
-    for rango, colores in cmap_dict.items():
-        if rango[0] <= valor < rango[1]:
-            inicio, fin = colores
-            inicio_rgb = mcolors.hex2color(inicio)
-            fin_rgb = mcolors.hex2color(fin)
-            fraccion = (valor - rango[0]) / (rango[1] - rango[0])
-            color_interpolado = tuple((1 - fraccion) * inicio_rgb[i] + fraccion * fin_rgb[i] for i in range(3))
-            return mcolors.rgb2hex(color_interpolado)
+    Args:
+        v (list): Vector 1
+        w (list): Vector 2
         
+    Returns:
+        float: Grado de perpendicularidad (0, 90)
+    """
+    producto_punto = np.dot(v, w)
+    norma_v = np.linalg.norm(v)
+    norma_w = np.linalg.norm(w)
+    angulo = np.degrees(np.arccos(producto_punto / (norma_v * norma_w)))
+    if angulo > 90: angulo = 180 - angulo
+    return angulo/90
+
+def detectar_camino_rotor(matriz_adyacencia:list, puntos:list, punto:int, limites_espacio:list, limites_tiempo:list, unic:set = None, caminos:list = None, velocidades:list = None, tabla_pesos:TablaPesos = None)->list:
+    """
+    Función interna para detectar los caminos de los rotores que empiezan en un punto
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        puntos (list): Lista de puntos
+        punto (int): Punto en el que empiezan los caminos
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
+        unic (set, optional): Claves (clave_ciclo) de los caminos encontrados antes (se actualiza). Defaults to None
+        caminos (list, optional): Caminos de rotores encontrados antes (se actualiza). Defaults to None
+        velocidades (list, optional): Velocidades de los puntos [[vector], velocidad (mm/s), penalización]. Defaults to None
+        tabla_pesos (TablaPesos, optional): Tabla de pesos del grafo (si no se pasa se calcula). Defaults to None
+
+    Returns:
+        list: Caminos de rotores encontrados
+    """
+    if unic is None: unic = set()
+    if caminos is None: caminos = []
+    if tabla_pesos is None:
+        tabla_pesos = crear_tabla_pesos(matriz_adyacencia, puntos, velocidades)
+    BuscadorCiclos(tabla_pesos, puntos, limites_espacio, limites_tiempo).buscar(punto, unic, caminos)
+    return caminos
+
 def punto_in_rotor(punto:int, rotores:list)->bool:
     """
     Función interna para saber si un punto está en algún rotor
 
     Args:
         punto (int): Punto a comprobar
-        rotores (list): Lista de rotores
+        rotores (list): Lista de rotores o IndiceRotores (para no recorrer todos los rotores en cada consulta)
 
     Returns:
         bool: Devuelve si está en algún rotor
     """
+    if isinstance(rotores, IndiceRotores): return rotores.contiene(punto)
     for rotor in rotores:
         if punto in rotor: return True
     return False
 
-def filtrar_rotores(caminos:list, puntos:list, tmp_min:int, tmp_max:int, dist_min:float, dist_max:float, velocidades:list)->list:
+def filtrar_rotores(caminos:list, puntos:list, tmp_min:int, tmp_max:int, dist_min:float, dist_max:float, velocidades:list, tabla_pesos:TablaPesos = None)->list:
     """
     Función interna para filtrar los caminos en base a los tiempos y distancias (solo filtra no encuentra nuevos caminos)
 
@@ -243,205 +1287,73 @@ def filtrar_rotores(caminos:list, puntos:list, tmp_min:int, tmp_max:int, dist_mi
         dist_min (float): Distancia mínima en milímetros para el filtrado
         dist_max (float): Distancia máxima en milímetros para el filtrado
         velocidades (list): Velocidades de los puntos [[vector], velocidad (mm/s), penalización]
+        tabla_pesos (TablaPesos, optional): Tabla de pesos del grafo para no recalcular cada relación. Defaults to None.
 
     Returns:
         list: Lista de rotores filtrados
     """
-    distancias = [calcular_distancia_camino(camino, puntos) for camino in caminos]
-    tiempos = [int(round(calcular_tiempo_camino(camino, velocidades, puntos)*1000)) for camino in caminos]
+    [distancias, tiempos] = pesos_caminos(caminos, puntos, velocidades, tabla_pesos)
     caminos_filtrados = []
     for i in range(len(caminos)):
-        if dist_min <= distancias[i] <= dist_max and tmp_min <= tiempos[i] <= tmp_max:
+        if dist_min <= distancias[i] <= dist_max and tmp_min <= tiempo_ms(tiempos[i]) <= tmp_max:
             caminos_filtrados.append(caminos[i])
             
     return caminos_filtrados
-   
-# Funciones de pintar
-# ----------------------------------------------------------------------------------       
 
-def pintar_puntos(puntos:list, matriz_adyacencia:list, caminos:list = None, show_index:bool = False, tiempos:list = []):
-    """
-    Función para pintar los puntos y las relaciones entre ellos y los caminos si se quiere
-    
-    Args:
-        puntos (list): Lista de los puntos
-        matriz_adyacencia (list): Matriz de adyacencia
-        caminos (list, optional): Lista de caminos. Defaults to None.
-        show_index (bool, optional): Mostrar los indices de los puntos. Defaults to False.
-        tiempos (list, optional): Lista de tiempos de los caminos. Defaults to [].
-        
-    Returns:
-        None
-    """
-    grafo = nx.Graph()
-    nombres = transformar_nombres(puntos)
-    relaciones = transformar_relaciones(matriz_adyacencia)
-    coordenadas = transformar_coordenadas(puntos)
-    
-    grafo.add_nodes_from(nombres)
-    grafo.add_weighted_edges_from(relaciones)
-    
-    colors = ["black" for _ in range(len(relaciones))]
-    edges_widht = [1 for _ in range(len(relaciones))]
-    node_colors = ["blue" for _ in range(len(puntos))]
-    
-    if(caminos != None):
-        for c, camino in enumerate(caminos):
-            rels = list(grafo.edges)
-            for i in range(len(camino)-1):
-                if((str(camino[i]), str(camino[i+1])) in rels):
-                    pos = rels.index((str(camino[i]), str(camino[i+1])))
-                else:
-                    pos = rels.index((str(camino[i+1]), str(camino[i])))
-                edges_widht[pos] = 5
-                if tiempos == []: colors[pos] = "r"
-                else:
-                    if tiempos[c] > VALOR_REENTRADA: colors[pos] = "r"
-                    elif tiempos[c] > VALOR_MED_REENTRADA: colors[pos] = "y"
-                    else: colors[pos] = "g"
-        
-    nx.draw(grafo, pos = coordenadas, node_color = node_colors, with_labels= show_index, edge_color = colors, node_size = 5, font_size = 8, width = edges_widht)
-    
-def pintar_puntos_rotores(puntos:list, tiempos:list, triangulos:list, max_tiempo:int = VALOR_REENTRADA, med_tiempo:int = VALOR_MED_REENTRADA)->None:
+def pesos_caminos(caminos:list, puntos:list, velocidades:list = None, tabla_pesos:TablaPesos = None)->list:
     """
-    Función para pintar un mapa de calor del corazón según lo propenso que se sea a los rotores
+    Función interna para calcular la distancia y el tiempo de muchos caminos a la vez
 
-    Args:
-        puntos (list): Lista de puntos
-        tiempos (list): Lista del máximo tiempo de cada punto
-        triangulos (list): Triangulos del obj
-        max_tiempo (int, optional): Valor (ms) para que sea rojo. Defaults to VALOR_REENTRADA.
-        med_tiempo (int, optional): Valor (ms) para que sea amarillo. Defaults to VALOR_MED_REENTRADA.
+    Las relaciones de todos los caminos se calculan juntas (o se buscan en la tabla de pesos) y luego se suman en orden
+    por camino, igual que calcular_distancia_camino y calcular_tiempo_camino
 
-    Returns:
-        None
-    """
-    fig = go.Figure()
-    x_lim = [min([punto[0] for punto in puntos]), max([punto[0] for punto in puntos])]
-    y_lim = [min([punto[1] for punto in puntos]), max([punto[1] for punto in puntos])]
-    z_lim = [min([punto[2] for punto in puntos]), max([punto[2] for punto in puntos])]
-
-    x = [punto[0] for punto in puntos]
-    y = [punto[1] for punto in puntos]
-    z = [punto[2] for punto in puntos]
-    
-    
-    i2 = []
-    j = []
-    k = []
-    triangle_colors = [
-       [0.0, '#0000ff'],  # Azul
-       [med_tiempo/max_tiempo, '#fcff0e'],  # Amarillo
-       [1.0, '#ff0000']   # Rojo
-        
-    ]
-    intensidades = [min(t/200, 1) for t in tiempos]
-    intensidades.append(1)
-    intensidades.append(0)
-    for i in range(len(triangulos)):
-        i2.append(triangulos[i][0]-1)
-        j.append(triangulos[i][1]-1)
-        k.append(triangulos[i][2]-1)
-        
-        
-    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, i=i2, j=j, k=k, 
-                            colorscale = triangle_colors, opacity=1, 
-                            intensity = intensidades, name="Rotores",
-                            colorbar=dict(
-                                title="Tiempo de rotor",
-                                tickmode="array",
-                                tickvals=[0.001, med_tiempo/max_tiempo, 1],  
-                                ticktext=["0 ms", str(med_tiempo)+" ms", str(max_tiempo)+" ms"] 
-                            )))
-    fig.update_layout(scene=dict(
-        xaxis=dict(range = x_lim, visible=False),
-        yaxis=dict(range = y_lim, visible=False),
-        zaxis=dict(range = z_lim, visible=False),
-    ))
-    fig.show()
-    
-def pintar_puntos_rotores_binario(puntos:list, puntos_in_rotor:list, triangulos:list)->None:
-    """
-    Función para pintar un mapa de calor del corazón según si hay posibles rotores o no
-    
     Args:
+        caminos (list): Lista de caminos
         puntos (list): Lista de puntos
-        puntos_in_rotor (list): Lista de puntos que están en un rotor
-        triangulos (list): Triangulos del obj
-        max_tiempo (int, optional): Valor (ms) para que sea rojo. Defaults to VALOR_REENTRADA.
-        med_tiempo (int, optional): Valor (ms) para que sea amarillo. Defaults to VALOR_MED_REENTRADA.
+        velocidades (list, optional): Velocidades de los puntos [[vector], velocidad (mm/s), penalización]. Defaults to None.
+        tabla_pesos (TablaPesos, optional): Tabla de pesos del grafo. Defaults to None.
 
     Returns:
-        None
+        list: [distancias (mm), tiempos (s)] de cada camino (tiempos es None si no hay velocidades ni tabla con tiempos)
     """
-    fig = go.Figure()
-    x_lim = [min([punto[0] for punto in puntos]), max([punto[0] for punto in puntos])]
-    y_lim = [min([punto[1] for punto in puntos]), max([punto[1] for punto in puntos])]
-    z_lim = [min([punto[2] for punto in puntos]), max([punto[2] for punto in puntos])]
-
-    x = [punto[0] for punto in puntos]
-    y = [punto[1] for punto in puntos]
-    z = [punto[2] for punto in puntos]
-    
-    
-    i2 = []
-    j = []
-    k = []
-    triangle_colors = [
-       [0.0, '#22E103'],  # Verde
-       [1.0, '#ff0000']   # Rojo
-        
-    ]
-    intensidades = [0 for _ in range(len(puntos))]
-    intensidades.append(1)
-    intensidades.append(0)
-    for i in puntos_in_rotor:
-        intensidades[i] = 1
-    for i in range(len(triangulos)):
-        i2.append(triangulos[i][0]-1)
-        j.append(triangulos[i][1]-1)
-        k.append(triangulos[i][2]-1)
-        
-        
-    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, i=i2, j=j, k=k, 
-                            colorscale = triangle_colors, opacity=1, 
-                            intensity = intensidades, name="Rotores",
-                            colorbar=dict(
-                                title="Salud del corazón",
-                                tickmode="array",
-                                tickvals=[0, 0.001, 1],  
-                                ticktext=["", "Sano", "Proarritmico"]  
-                            )))
-    fig.update_layout(scene=dict(
-        xaxis=dict(range = x_lim, visible=False),
-        yaxis=dict(range = y_lim, visible=False),
-        zaxis=dict(range = z_lim, visible=False),
-    ))
-    
-    # fig.add_trace(go.Scatter3d(
-    #     x=[0, 0],  # coordenadas x para la línea
-    #     y=[-20, 20],  # rango de coordenadas y para la línea
-    #     z=[0, 0],  # rango de coordenadas z para la línea
-    #     mode='lines',
-    #     line=dict(color='black', width=8),
-    #     name='Línea vertical en x=0'
-    # ))
-    fig.show()
+    caminos = [list(camino) for camino in caminos]
+    longitudes = [max(len(camino) - 1, 0) for camino in caminos]
+    fin = np.cumsum(longitudes).tolist()
+    origen = np.array([p for camino in caminos for p in camino[:-1]], dtype = np.int64)
+    destino = np.array([p for camino in caminos for p in camino[1:]], dtype = np.int64)
+    if tabla_pesos is not None:
+        posiciones = tabla_pesos.posiciones(origen, destino)
+        distancias_aristas = tabla_pesos.longitudes[posiciones]
+        tiempos_aristas = None if tabla_pesos.tiempos is None else tabla_pesos.tiempos[posiciones]
+    else:
+        [distancias_aristas, tiempos_aristas] = pesos_aristas(origen, destino, puntos, velocidades)
+    distancias_aristas = distancias_aristas.tolist()
+    distancias = [sum(distancias_aristas[f - l:f]) for f, l in zip(fin, longitudes)]
+    if tiempos_aristas is None: return [distancias, None]
+    tiempos_aristas = tiempos_aristas.tolist()
+    tiempos = [sum(tiempos_aristas[f - l:f]) for f, l in zip(fin, longitudes)]
+    return [distancias, tiempos]
 
 # Funciones de calculos de caminos
 # ----------------------------------------------------------------------------------
-def calcular_tiempo_camino(camino:list, velocidades:list, puntos:list)->float:
+def calcular_tiempo_camino(camino:list, velocidades:list, puntos:list, tabla_pesos:TablaPesos = None)->float:
     """
     Función para calcular el tiempo de un camino en base a las velocidades de los puntos
     
     Args:
         camino (list): Lista de puntos del camino
-        velocidades (list): Lista de velocidades de los puntos [[vector], velocidad (mm/s), penalización]
+        velocidades (list): Lista de velocidades de los puntos [[vector], velocidad (mm/s), penalización] o CampoVelocidades
         puntos (list): Lista de puntos
+        tabla_pesos (TablaPesos, optional): Tabla de pesos del grafo para no recalcular cada relación. Defaults to None.
         
     Returns:
         float: Tiempo en segundos del camino
     """
+    if tabla_pesos is not None and tabla_pesos.tiempos is not None:
+        return sum(tabla_pesos.tiempos[tabla_pesos.indices_aristas(camino)].tolist())
+    if isinstance(velocidades, CampoVelocidades):
+        camino = np.asarray(camino, dtype = np.int64)
+        return sum(pesos_aristas(camino[:-1], camino[1:], puntos, velocidades)[1].tolist())
     tiempo = 0
     for i in range(len(camino)-1):
         punto = puntos[camino[i]]
@@ -453,17 +1365,20 @@ def calcular_tiempo_camino(camino:list, velocidades:list, puntos:list)->float:
         tiempo += dist/veloc
     return tiempo
 
-def calcular_distancia_camino(camino:list, puntos:list)->float:
+def calcular_distancia_camino(camino:list, puntos:list, tabla_pesos:TablaPesos = None)->float:
     """
     Función interna para calcular la distancia de un camino
 
     Args:
         camino (list): Lista de puntos del camino
         puntos (list): Lista de puntos
+        tabla_pesos (TablaPesos, optional): Tabla de pesos del grafo para no recalcular cada relación. Defaults to None.
 
     Returns:
         float: Distancia del camino en milímetros
     """
+    if tabla_pesos is not None:
+        return sum(tabla_pesos.longitudes[tabla_pesos.indices_aristas(camino)].tolist())
     distancia = 0
     for i in range(len(camino)-1):
         distancia += calcular_distancia(puntos[camino[i]], puntos[camino[i+1]])
@@ -475,56 +1390,811 @@ def calcular_tiempo_maximo_punto(puntos:list, tiempos:list, rotores:list)->float
 
     Args:
         puntos (list): Lista de puntos
-        tiempos (list): Lista de tiempos de los puntos en milisegundos
-        rotores (list): Lista de reentradas funcionales
+        tiempos (list): Lista de tiempos de los rotores en milisegundos
+        rotores (list): Lista de reentradas funcionales o IndiceRotores ya creado
 
     Returns:
         float: Lista con los tiempos máximod de un punto en milisegundos
     """
-    tiempos_punto = []
-    for i in range(len(puntos)):
-        rotores_in_punto = [i for camino in rotores if i in camino]
-        tiempo_punto = 0
-        for rotor in rotores_in_punto:
-            tiempo_punto = max(tiempo_punto, tiempos[rotor])
-        
-        tiempos_punto.append(tiempo_punto)
-    return tiempos_punto
+    if not isinstance(rotores, IndiceRotores):
+        rotores = IndiceRotores(rotores, len(puntos))
+    return rotores.tiempo_maximo(tiempos).tolist()
 
 
 # Funciones de rotores
 # ----------------------------------------------------------------------------------
-def detectar_rotores(matriz_adyacencia:list, puntos:list, velocidades:list, limites_espacio:list = [LIMITE_DIST_INF, LIMITE_DIST_SUP], limites_tiempo:list = [LIMITE_TMP_INF, LIMITE_TMP_SUP])->list:
+def detectar_rotores(matriz_adyacencia:list, puntos:list, velocidades:list, limites_espacio:list = [LIMITE_DIST_INF, LIMITE_DIST_SUP], limites_tiempo:list = [LIMITE_TMP_INF, LIMITE_TMP_SUP], n_procesos:int = 1, tamano_bloque:int = None, progreso = None, cotas_retorno:bool = True, modo_canonico:bool = False, estadisticas:EstadisticasBusqueda = None, tamano_tesela:float = None)->list:
     """
     Función para detectar los rotores en un grafo con su matriz de adyacencia
+
+    Con n_procesos > 1 las semillas se reparten en bloques consecutivos entre varios procesos que leen el grafo, los
+    puntos y los pesos de memoria compartida. Los resultados se juntan en el orden de las semillas quitando repetidos,
+    así que el resultado es el mismo que en un solo proceso sea cual sea el número de procesos.
+
+    Con tamano_tesela la búsqueda se hace por teselas del plano xy (con un margen de medio límite de espacio), cada
+    una solo con su trozo del grafo, para mallas que no caben enteras en la búsqueda. Salen los mismos rotores pero
+    ordenados por teselas (los que pasan por varias teselas algo después).
     
     Args:
-        matriz_adyacencia (list): Matriz de adyacencia
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
         puntos (list): Lista de puntos
         velocidades (list): Lista de velocidades de los puntos [[vector], velocidad (mm/s), penalización]
         limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to [LIMITE_DIST_INF, LIMITE_DIST_SUP].
         limites_tiempo (list, optional): Límites de tiempo [limite_inferior, limite_superior]. Defaults to [LIMITE_TMP_INF, LIMITE_TMP_SUP].
+        n_procesos (int, optional): Número de procesos que buscan a la vez. Defaults to 1.
+        tamano_bloque (int, optional): Semillas por tarea en modo multiproceso. Defaults to None (unos 16 bloques por proceso).
+        progreso (function, optional): Función progreso(semillas_hechas, total). Defaults to None (progreso_consola).
+        cotas_retorno (bool, optional): Podar con la distancia y el tiempo mínimos para volver a la semilla (mismo resultado, más rápido). Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido (mismo resultado, si con velocidades no cumple el límite de tiempo así se prueban sus otros puntos y el otro sentido). Defaults to False.
+        estadisticas (EstadisticasBusqueda, optional): Donde apuntar los contadores de la búsqueda. Defaults to None (sin contar).
+        tamano_tesela (float, optional): Lado de las teselas (mm) para buscar por teselas, sin estadísticas. Defaults to None (todo el grafo a la vez).
     
     Returns:
         list: Lista de caminos que forman los rotores
     """
-    caminos = []
-    unic = []
+    if progreso is None: progreso = progreso_consola
+    return list(iterar_rotores(matriz_adyacencia, puntos, velocidades, limites_espacio, limites_tiempo, n_procesos = n_procesos, tamano_bloque = tamano_bloque, progreso = progreso, cotas_retorno = cotas_retorno, modo_canonico = modo_canonico, estadisticas = estadisticas, tamano_tesela = tamano_tesela))
+
+def iterar_rotores(matriz_adyacencia:list, puntos:list, velocidades:list, limites_espacio:list = [LIMITE_DIST_INF, LIMITE_DIST_SUP], limites_tiempo:list = [LIMITE_TMP_INF, LIMITE_TMP_SUP], con_pesos:bool = False, progreso = None, n_procesos:int = 1, tamano_bloque:int = None, cotas_retorno:bool = True, modo_canonico:bool = False, estadisticas:EstadisticasBusqueda = None, tamano_tesela:float = None):
+    """
+    Función generadora que devuelve los rotores según se encuentran, en el mismo orden que detectar_rotores
+
+    Solo guarda las claves de los ciclos ya encontrados para no repetirlos, no la lista de caminos, así que se pueden
+    ir procesando (por ejemplo con reducir_rotores) sin tenerlos todos en memoria. En modo canónico dos ciclos con los
+    mismos puntos salen de la misma semilla, así que las claves solo se guardan mientras se busca cada semilla; los
+    que solo cumplen el límite de tiempo empezando en un punto mayor que la semilla se guardan hasta que les toca.
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        puntos (list): Lista de puntos
+        velocidades (list): Lista de velocidades de los puntos [[vector], velocidad (mm/s), penalización]
+        limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to [LIMITE_DIST_INF, LIMITE_DIST_SUP].
+        limites_tiempo (list, optional): Límites de tiempo [limite_inferior, limite_superior]. Defaults to [LIMITE_TMP_INF, LIMITE_TMP_SUP].
+        con_pesos (bool, optional): Devolver [camino, distancia (mm), tiempo (s)] en vez de solo el camino. Defaults to False.
+        progreso (function, optional): Función progreso(semillas_hechas, total), en multiproceso se llama al acabar cada bloque. Defaults to None (sin progreso).
+        n_procesos (int, optional): Número de procesos que buscan a la vez. Defaults to 1.
+        tamano_bloque (int, optional): Semillas por tarea en modo multiproceso. Defaults to None (unos 16 bloques por proceso).
+        cotas_retorno (bool, optional): Podar con la distancia y el tiempo mínimos para volver a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+        estadisticas (EstadisticasBusqueda, optional): Donde apuntar los contadores de la búsqueda, en multiproceso se juntan los de cada bloque. Defaults to None (sin contar).
+        tamano_tesela (float, optional): Lado de las teselas (mm) para buscar por teselas como en detectar_rotores, progreso se llama al acabar cada tesela. Defaults to None.
+
+    Yields:
+        list: Camino del rotor, o [camino, distancia, tiempo] con con_pesos (tiempo None si no hay velocidades)
+    """
+    n_puntos = numero_puntos(matriz_adyacencia)
+    if tamano_tesela is not None:
+        if estadisticas is not None: raise ValueError("La búsqueda por teselas no tiene estadísticas")
+        for [hechos, rotores] in buscar_rotores_teselas(matriz_adyacencia, puntos, velocidades, limites_espacio, limites_tiempo, tamano_tesela, n_procesos, cotas_retorno, modo_canonico):
+            if progreso is not None: progreso(hechos, n_puntos)
+            for rotor in rotores:
+                yield rotor if con_pesos else rotor[0]
+        return
+    unic = set()
     puntos = np.array(puntos)
-    for i in range(len(matriz_adyacencia[0])):
-        print(str(i) + " de " + str(len(matriz_adyacencia[0])) + " => " + str(round(i/len(matriz_adyacencia[0])*100, 2)) + "%")
-        detectar_camino_rotor(matriz_adyacencia, puntos, punto = i, limites_espacio = limites_espacio, limites_tiempo = limites_tiempo, camino = [], unic = unic, caminos = caminos, velocidades = velocidades)
-    return caminos
+    tabla_pesos = crear_tabla_pesos(matriz_adyacencia, puntos, velocidades)
+    # Rotores del modo canónico que empiezan en un punto mayor que su semilla (montículo por camino)
+    pendientes = []
+    if n_procesos > 1:
+        for [fin, caminos_bloque, estadisticas_bloque] in buscar_rotores_procesos(tabla_pesos, puntos, limites_espacio, limites_tiempo, n_procesos, tamano_bloque, cotas_retorno, modo_canonico, estadisticas is not None):
+            if estadisticas is not None: estadisticas.sumar(estadisticas_bloque)
+            if progreso is not None: progreso(fin, n_puntos)
+            if modo_canonico:
+                for rotor in caminos_bloque:
+                    heapq.heappush(pendientes, (rotor[0], rotor))
+                for rotor in sacar_pendientes(pendientes, fin):
+                    yield rotor if con_pesos else rotor[0]
+                continue
+            for rotor in caminos_bloque:
+                if not modo_canonico:
+                    clave = clave_ciclo(rotor[0])
+                    if clave in unic:
+                        # Repetido entre bloques, dentro de cada bloque ya se cuentan en el proceso
+                        if estadisticas is not None: estadisticas.anotar_repetidos(1)
+                        continue
+                    unic.add(clave)
+                yield rotor if con_pesos else rotor[0]
+        return
+    buscador = BuscadorCiclos(tabla_pesos, puntos, limites_espacio, limites_tiempo, cotas_retorno = cotas_retorno, modo_canonico = modo_canonico, estadisticas = estadisticas)
+    for i in range(n_puntos):
+        if progreso is not None: progreso(i, n_puntos)
+        if not modo_canonico:
+            for rotor in buscador.iterar(i, unic):
+                yield rotor if con_pesos else rotor[0]
+            continue
+        for rotor in buscador.iterar(i, set()):
+            # Los de cada semilla salen ordenados, los que empiezan en ella van directos si no hay ninguno guardado antes
+            if rotor[0][0] == i and (not pendientes or rotor[0] < pendientes[0][0]):
+                yield rotor if con_pesos else rotor[0]
+            else:
+                heapq.heappush(pendientes, (rotor[0], rotor))
+        for rotor in sacar_pendientes(pendientes, i + 1):
+            yield rotor if con_pesos else rotor[0]
+
+def sacar_pendientes(pendientes:list, hasta:int):
+    """
+    Función interna generadora que saca en orden los rotores guardados del modo canónico que empiezan antes de un punto
+
+    Args:
+        pendientes (list): Montículo de (camino, rotor)
+        hasta (int): Primer punto cuyos rotores todavía pueden cambiar
+
+    Yields:
+        list: Rotor [camino, distancia, tiempo]
+    """
+    while pendientes and pendientes[0][0][0] < hasta:
+        yield heapq.heappop(pendientes)[1]
+
+def progreso_consola(hechos:int, total:int)->None:
+    """
+    Función de progreso por defecto de detectar_rotores, escribe por consola las semillas hechas
+
+    Args:
+        hechos (int): Semillas hechas
+        total (int): Total de semillas
+    """
+    print(str(hechos) + " de " + str(total) + " => " + str(round(hechos/total*100, 2)) + "%")
+
+def reducir_rotores(rotores, reductores:list)->list:
+    """
+    Función para pasar los rotores de iterar_rotores(..., con_pesos = True) por varios reductores sin guardarlos
+
+    Args:
+        rotores (iterable): Rotores [camino, distancia, tiempo]
+        reductores (list): Reductores (ReductorTiempoMaximo, ReductorConteo, ReductorHistograma...)
+
+    Returns:
+        list: Resultado de cada reductor
+    """
+    for [camino, distancia, tiempo] in rotores:
+        for reductor in reductores:
+            reductor.actualizar(camino, distancia, tiempo)
+    return [reductor.resultado() for reductor in reductores]
+
+class BarridoRotores:
+    """
+    Barrido de parámetros que busca los rotores una sola vez y luego filtra para cada penalizador y límites
+
+    Los rotores se buscan con los límites más amplios (distancia hasta limites_espacio[1] y tiempo hasta tiempo_max con
+    el penalizador de las velocidades) guardando la distancia y el tiempo de cada uno. Como la velocidad es
+    velocidad_base * penalizador, el tiempo con otro penalizador p es tiempo * penalizador / p, así que cada combinación
+    (penalizador, límites de tiempo, límites de espacio) se resuelve filtrando arrays, con el mismo resultado que
+    filtrar_rotores sobre los rotores amplios con las velocidades de ese penalizador (salvo redondeos en el último
+    decimal del tiempo).
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        puntos (list): Lista de puntos
+        velocidades (list): Velocidades de los puntos [[vector], velocidad (mm/s), penalización] o CampoVelocidades
+        limites_espacio (list, optional): Límites de espacio más amplios [limite_inferior, limite_superior]. Defaults to [0, LIMITE_DIST_SUP].
+        tiempo_max (int, optional): Tiempo máximo (ms) con el penalizador de las velocidades. Defaults to LIMITE_TMP_SUP.
+        penalizador (float, optional): Penalizador con el que se han calculado las velocidades. Defaults to None (el del CampoVelocidades o 1).
+        n_procesos (int, optional): Número de procesos para la búsqueda. Defaults to 1.
+        progreso (function, optional): Función progreso(semillas_hechas, total) de la búsqueda. Defaults to None.
+    """
+    def __init__(self, matriz_adyacencia:list, puntos:list, velocidades:list, limites_espacio:list = [0, LIMITE_DIST_SUP], tiempo_max:int = LIMITE_TMP_SUP, penalizador:float = None, n_procesos:int = 1, progreso = None):
+        if penalizador is None:
+            penalizador = velocidades.penalizador if isinstance(velocidades, CampoVelocidades) else 1
+        self.penalizador = penalizador
+        self.limites_espacio = list(limites_espacio)
+        self.tiempo_max = tiempo_max
+        vertices = []
+        offsets = [0]
+        distancias = []
+        tiempos = []
+        for [camino, distancia, tiempo] in iterar_rotores(matriz_adyacencia, puntos, velocidades, [0, limites_espacio[1]], [0, tiempo_max], con_pesos = True, progreso = progreso, n_procesos = n_procesos):
+            vertices.extend(camino)
+            offsets.append(len(vertices))
+            distancias.append(distancia)
+            tiempos.append(inf if tiempo is None else tiempo)
+        self.caminos = ColeccionCaminos(np.array(vertices, dtype = np.int32), np.array(offsets, dtype = np.int64), np.array(distancias, dtype = np.float64), np.array(tiempos, dtype = np.float64))
+        self.indice = IndiceRotores(self.caminos, numero_puntos(matriz_adyacencia))
+
+    def __len__(self)->int:
+        return len(self.caminos)
+
+    def tiempos(self, penalizador:float)->np.ndarray:
+        """
+        Función para obtener el tiempo (ms, redondeado como tiempo_ms) de cada rotor con un penalizador
+
+        Args:
+            penalizador (float): Penalizador de las velocidades
+
+        Returns:
+            np.ndarray: Tiempo de cada rotor en milisegundos
+        """
+        tiempos = self.caminos.tiempos * self.penalizador / penalizador
+        with np.errstate(invalid = "ignore"):
+            return np.where(np.isinf(tiempos), inf, np.rint(tiempos * 1000))
+
+    def seleccionar(self, penalizador:float, limites_tiempo:list, limites_espacio:list = None)->np.ndarray:
+        """
+        Función para saber qué rotores cumplen una combinación de parámetros
+
+        Args:
+            penalizador (float): Penalizador de las velocidades
+            limites_tiempo (list): Límites de tiempo (ms) [limite_inferior, limite_superior]
+            limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to None (los del barrido).
+
+        Returns:
+            np.ndarray: Máscara de los rotores que cumplen los límites
+        """
+        if limites_espacio is None: limites_espacio = self.limites_espacio
+        if limites_espacio[1] > self.limites_espacio[1] or limites_tiempo[1] * penalizador / self.penalizador > self.tiempo_max:
+            raise ValueError("Los límites pedidos son más amplios que los del barrido")
+        tiempos = self.tiempos(penalizador)
+        distancias = self.caminos.distancias
+        return (limites_espacio[0] <= distancias) & (distancias <= limites_espacio[1]) & (limites_tiempo[0] <= tiempos) & (tiempos <= limites_tiempo[1])
+
+    def rotores(self, penalizador:float, limites_tiempo:list, limites_espacio:list = None)->list:
+        """
+        Función para obtener los rotores de una combinación de parámetros (lo mismo que filtrar_rotores)
+
+        Args:
+            penalizador (float): Penalizador de las velocidades
+            limites_tiempo (list): Límites de tiempo (ms) [limite_inferior, limite_superior]
+            limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to None (los del barrido).
+
+        Returns:
+            list: Lista de caminos que cumplen los límites
+        """
+        caminos = self.caminos.tolist()
+        return [caminos[i] for i in np.flatnonzero(self.seleccionar(penalizador, limites_tiempo, limites_espacio))]
+
+    def mapa_calor(self, penalizador:float, limites_tiempo:list, limites_espacio:list = None)->np.ndarray:
+        """
+        Función para obtener el tiempo máximo de cada punto con una combinación de parámetros (como calcular_tiempo_maximo_punto)
+
+        Args:
+            penalizador (float): Penalizador de las velocidades
+            limites_tiempo (list): Límites de tiempo (ms) [limite_inferior, limite_superior]
+            limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to None (los del barrido).
+
+        Returns:
+            np.ndarray: Tiempo máximo (ms) de cada punto, 0 si no pasa ningún rotor
+        """
+        seleccion = self.seleccionar(penalizador, limites_tiempo, limites_espacio)
+        return self.indice.tiempo_maximo(np.where(seleccion, self.tiempos(penalizador), 0))
+
+    def barrer(self, penalizadores:list, ventanas_tiempo:list, ventanas_espacio:list = None)->list:
+        """
+        Función para calcular todas las combinaciones de penalizadores y ventanas de tiempo y espacio
+
+        Args:
+            penalizadores (list): Penalizadores a probar
+            ventanas_tiempo (list): Límites de tiempo (ms) a probar [[limite_inferior, limite_superior], ...]
+            ventanas_espacio (list, optional): Límites de espacio a probar. Defaults to None (solo los del barrido).
+
+        Returns:
+            list: Por cada combinación [penalizador, limites_tiempo, limites_espacio, número de rotores, mapa de calor]
+        """
+        if ventanas_espacio is None: ventanas_espacio = [self.limites_espacio]
+        resultados = []
+        for penalizador in penalizadores:
+            for limites_tiempo in ventanas_tiempo:
+                for limites_espacio in ventanas_espacio:
+                    seleccion = self.seleccionar(penalizador, limites_tiempo, limites_espacio)
+                    mapa = self.indice.tiempo_maximo(np.where(seleccion, self.tiempos(penalizador), 0))
+                    resultados.append([penalizador, limites_tiempo, limites_espacio, int(seleccion.sum()), mapa])
+        return resultados
+
+class RotoresIncrementales:
+    """
+    Rotores de un grafo que, al editar unos puntos (velocidades o relaciones), se vuelven a buscar solo alrededor de ellos
+
+    Las distancias se miden en xy, así que todos los puntos de un ciclo están a menos de la mitad del límite de espacio
+    de cualquiera de ellos. Un ciclo que pasa por un punto editado solo puede salir de semillas a esa mitad de la
+    edición, y los demás ciclos no cambian. Cada edición quita los rotores de esas semillas y las vuelve a buscar con
+    el subgrafo de los puntos al doble de la mitad (todo lo que pueden recorrer sus ciclos), sin contar otra vez los
+    ciclos que ya salen de otras semillas. El resultado es el mismo que volver a llamar a iterar_rotores con el grafo y
+    las velocidades editadas, en el mismo orden, y el tiempo máximo de cada punto (como calcular_tiempo_maximo_punto)
+    se actualiza en la misma lista solo en los puntos de los rotores que cambian.
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        puntos (list): Lista de puntos
+        velocidades (list): Velocidades de los puntos [[vector], velocidad (mm/s), penalización] o CampoVelocidades
+        limites_espacio (list, optional): Límites de espacio [limite_inferior, limite_superior]. Defaults to [LIMITE_DIST_INF, LIMITE_DIST_SUP].
+        limites_tiempo (list, optional): Límites de tiempo [limite_inferior, limite_superior]. Defaults to [LIMITE_TMP_INF, LIMITE_TMP_SUP].
+        rotores (list, optional): Rotores [camino, distancia, tiempo] ya buscados con estos parámetros (iterar_rotores con con_pesos). Defaults to None (se buscan).
+        n_procesos (int, optional): Número de procesos para la primera búsqueda. Defaults to 1.
+        progreso (function, optional): Función progreso(semillas_hechas, total) de la primera búsqueda. Defaults to None.
+        cotas_retorno (bool, optional): Podar con las cotas de retorno a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+    """
+    def __init__(self, matriz_adyacencia:list, puntos:list, velocidades:list, limites_espacio:list = [LIMITE_DIST_INF, LIMITE_DIST_SUP], limites_tiempo:list = [LIMITE_TMP_INF, LIMITE_TMP_SUP], rotores:list = None, n_procesos:int = 1, progreso = None, cotas_retorno:bool = True, modo_canonico:bool = False):
+        self.matriz_adyacencia = matriz_a_dispersa(matriz_adyacencia)
+        self.puntos = np.asarray(puntos, dtype = np.float64)
+        self.limites_espacio = list(limites_espacio)
+        self.limites_tiempo = list(limites_tiempo)
+        self.cotas_retorno = cotas_retorno
+        self.modo_canonico = modo_canonico
+        self.velocidades = None
+        self._velocidades = None
+        self._guardar_velocidades(velocidades)
+        if rotores is None:
+            rotores = iterar_rotores(self.matriz_adyacencia, self.puntos, self.velocidades, self.limites_espacio, self.limites_tiempo, con_pesos = True, progreso = progreso,
+                                     n_procesos = n_procesos, cotas_retorno = cotas_retorno, modo_canonico = modo_canonico)
+        self.rotores = [list(rotor) for rotor in rotores]
+        self.tiempo_puntos = None
+        if self.velocidades is not None:
+            self.tiempo_puntos = calcular_tiempo_maximo_punto(self.puntos, self.tiempos(), self.caminos())
+
+    def __len__(self)->int:
+        return len(self.rotores)
+
+    def _guardar_velocidades(self, velocidades:list)->list:
+        """
+        Función interna para guardar las velocidades (con una copia de sus arrays) y saber qué puntos han cambiado
+
+        Args:
+            velocidades (list): Velocidades de los puntos o CampoVelocidades
+
+        Returns:
+            list: Puntos cuya fibra, velocidad o anisotropía es distinta de la guardada
+        """
+        if not hay_velocidades(velocidades):
+            self.velocidades = None
+            return []
+        if not isinstance(velocidades, CampoVelocidades):
+            velocidades = CampoVelocidades(*velocidades_a_arrays(velocidades))
+        arrays = [np.array(array, dtype = np.float64) for array in velocidades_a_arrays(velocidades)]
+        cambiados = []
+        if self._velocidades is not None:
+            distintos = np.zeros(len(arrays[1]), dtype = bool)
+            for [nuevo, anterior] in zip(arrays, self._velocidades):
+                # Dos NaN en el mismo sitio no son un cambio
+                cambio = (nuevo != anterior) & ~(np.isnan(nuevo) & np.isnan(anterior))
+                distintos |= cambio.reshape(len(distintos), -1).any(axis = 1)
+            cambiados = np.flatnonzero(distintos).tolist()
+        self.velocidades = velocidades
+        self._velocidades = arrays
+        return cambiados
+
+    def caminos(self)->list:
+        """
+        Función para obtener los caminos de los rotores
+
+        Returns:
+            list: Lista de caminos
+        """
+        return [camino for [camino, _, _] in self.rotores]
+
+    def tiempos(self)->list:
+        """
+        Función para obtener el tiempo de cada rotor en milisegundos (como tiempo_ms)
+
+        Returns:
+            list: Lista de tiempos
+        """
+        return [tiempo_ms(tiempo) for [_, _, tiempo] in self.rotores]
+
+    def copia(self):
+        """
+        Función para copiar el estado y probar una edición sin perder el original (los rotores no se copian uno a uno, no se cambian)
+
+        Returns:
+            RotoresIncrementales: Copia con sus propias listas de rotores y de tiempos
+        """
+        otra = copy.copy(self)
+        otra.rotores = list(self.rotores)
+        otra.velocidades = CampoVelocidades(self.velocidades.fibras.copy(), self.velocidades.velocidad_base.copy(), self.velocidades.anisotropia.copy(), self.velocidades.penalizador) if self.velocidades is not None else None
+        otra.tiempo_puntos = list(self.tiempo_puntos) if self.tiempo_puntos is not None else None
+        return otra
+
+    def editar(self, puntos:list = None, velocidades:list = None, eliminar_aristas:list = None, anadir_aristas:list = None)->list:
+        """
+        Función para aplicar una edición y volver a buscar los rotores que puede cambiar
+
+        Los puntos editados son los que se pasan, los que tienen fibra, velocidad o anisotropía distinta de la última
+        vez (también si se ha cambiado el CampoVelocidades directamente) y los extremos de las relaciones editadas.
+
+        Args:
+            puntos (list, optional): Puntos editados que no se deducen de lo demás. Defaults to None.
+            velocidades (list, optional): Nuevas velocidades de los puntos. Defaults to None (las que ya había, por si se han cambiado).
+            eliminar_aristas (list, optional): Relaciones [[punto, punto], ...] a quitar. Defaults to None.
+            anadir_aristas (list, optional): Relaciones [[punto, punto], ...] a añadir. Defaults to None.
+
+        Returns:
+            list: [rotores que ya no están, rotores nuevos], cada uno [camino, distancia, tiempo] (si solo cambia el tiempo de un rotor está en las dos)
+        """
+        editados = set() if puntos is None else set(np.asarray(puntos, dtype = np.int64).ravel().tolist())
+        editados.update(self._guardar_velocidades(self.velocidades if velocidades is None else velocidades))
+        for aristas in (eliminar_aristas, anadir_aristas):
+            if aristas is not None: editados.update(np.asarray(aristas, dtype = np.int64).ravel().tolist())
+        if (eliminar_aristas is not None and len(eliminar_aristas) > 0) or (anadir_aristas is not None and len(anadir_aristas) > 0):
+            self.matriz_adyacencia = modificar_aristas(self.matriz_adyacencia, eliminar_aristas, anadir_aristas)
+        if not editados: return [[], []]
+
+        # Semillas a la mitad del límite de espacio de la edición y puntos que pueden recorrer sus ciclos
+        margen = self.limites_espacio[1] / 2 * (1 + 1e-9) + 1e-9
+        distancias = distancia_xy_puntos(self.puntos, self.puntos[sorted(editados)], 3 * margen)
+        semillas = distancias <= margen
+        ids = np.flatnonzero(distancias <= 2 * margen)
+        en_subgrafo = np.zeros(len(self.puntos), dtype = bool)
+        en_subgrafo[ids] = True
+        local = np.full(len(self.puntos), -1, dtype = np.int64)
+        local[ids] = np.arange(len(ids))
+        [semillas, en_subgrafo, local] = [semillas.tolist(), en_subgrafo.tolist(), local.tolist()]
+
+        anteriores = []
+        conservados = []
+        unic = set()
+        for rotor in self.rotores:
+            camino = rotor[0]
+            # En modo canónico la semilla de un ciclo es su punto menor aunque el camino empiece en otro
+            if semillas[min(camino) if self.modo_canonico else camino[0]]:
+                anteriores.append(rotor)
+                continue
+            conservados.append(rotor)
+            # Los ciclos de otras semillas que se pueden encontrar desde las nuevas no se vuelven a contar
+            if not self.modo_canonico and all(en_subgrafo[punto] for punto in camino):
+                unic.add(tuple(sorted(local[punto] for punto in camino[:-1])))
+
+        [indptr, indices, longitudes, tiempos] = subgrafo(self.matriz_adyacencia, self.puntos, self.velocidades, ids)
+        buscador = BuscadorCiclos(TablaPesos(MatrizDispersa(indptr, indices), longitudes, tiempos), self.puntos[ids], self.limites_espacio, self.limites_tiempo,
+                                  cotas_retorno = self.cotas_retorno, modo_canonico = self.modo_canonico)
+        ids = ids.tolist()
+        nuevos = []
+        for semilla in np.searchsorted(ids, np.flatnonzero(distancias <= margen)).tolist():
+            if self.modo_canonico: unic = set()
+            for [camino, distancia, tiempo] in buscador.iterar(semilla, unic):
+                nuevos.append([[ids[punto] for punto in camino], distancia, tiempo])
+        # iterar_rotores devuelve los rotores ordenados por camino, así quedan como los dejaría
+        self.rotores = sorted(conservados + nuevos, key = lambda rotor: rotor[0])
+
+        clave = lambda rotor: (tuple(rotor[0]), rotor[2])
+        claves_anteriores = set(map(clave, anteriores))
+        claves_nuevas = set(map(clave, nuevos))
+        eliminados = [rotor for rotor in anteriores if clave(rotor) not in claves_nuevas]
+        anadidos = [rotor for rotor in nuevos if clave(rotor) not in claves_anteriores]
+        if self.tiempo_puntos is not None:
+            self._actualizar_tiempos(eliminados + anadidos, distancias <= 3 * margen)
+        return [eliminados, anadidos]
+
+    def _actualizar_tiempos(self, cambiados:list, cerca:np.ndarray)->None:
+        """
+        Función interna para volver a calcular el tiempo máximo de los puntos de los rotores que han cambiado
+
+        Los rotores que pasan por esos puntos salen de semillas a menos de tres veces la mitad del límite de espacio de
+        la edición, solo se miran esos.
+
+        Args:
+            cambiados (list): Rotores quitados y añadidos
+            cerca (np.ndarray): Si cada punto está a menos de tres veces la mitad del límite de espacio de la edición
+        """
+        afectados = np.zeros(len(self.puntos), dtype = bool)
+        for [camino, _, _] in cambiados:
+            afectados[camino] = True
+        if not afectados.any(): return
+        for punto in np.flatnonzero(afectados).tolist():
+            self.tiempo_puntos[punto] = 0
+        afectados = afectados.tolist()
+        cerca = cerca.tolist()
+        for [camino, _, tiempo] in self.rotores:
+            if not cerca[camino[0]]: continue
+            tiempo = tiempo_ms(tiempo)
+            for punto in camino[:-1]:
+                if afectados[punto] and tiempo > self.tiempo_puntos[punto]:
+                    self.tiempo_puntos[punto] = tiempo
+
+def buscar_rotores_procesos(tabla_pesos:TablaPesos, puntos:np.ndarray, limites_espacio:list, limites_tiempo:list, n_procesos:int, tamano_bloque:int = None, cotas_retorno:bool = True, modo_canonico:bool = False, con_estadisticas:bool = False):
+    """
+    Función interna que reparte la búsqueda de rotores por bloques de semillas entre varios procesos
+
+    Los arrays de la tabla de pesos y los puntos se copian una sola vez a memoria compartida y cada proceso los lee
+    sin copiarlos. Cada bloque quita sus repetidos internos y los bloques se devuelven en orden de semillas.
+
+    Args:
+        tabla_pesos (TablaPesos): Tabla de pesos del grafo
+        puntos (np.ndarray): Array de puntos
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
+        n_procesos (int): Número de procesos
+        tamano_bloque (int, optional): Semillas por tarea. Defaults to None (unos 16 bloques por proceso).
+        cotas_retorno (bool, optional): Podar con las cotas de retorno a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+        con_estadisticas (bool, optional): Contar la búsqueda de cada bloque. Defaults to False.
+
+    Yields:
+        list: [última semilla del bloque + 1, rotores [camino, distancia, tiempo] encontrados en el bloque, EstadisticasBusqueda del bloque o None]
+    """
+    n_puntos = tabla_pesos.grafo.shape[0]
+    if tamano_bloque is None:
+        tamano_bloque = max(1, -(-n_puntos // (n_procesos * 16)))
+    arrays = {"indptr": tabla_pesos.grafo.indptr, "indices": tabla_pesos.grafo.indices, "longitudes": tabla_pesos.longitudes, "puntos": np.ascontiguousarray(puntos, dtype = np.float64)}
+    if tabla_pesos.tiempos is not None: arrays["tiempos"] = tabla_pesos.tiempos
+    memorias = []
+    try:
+        descriptores = {}
+        for nombre, array in arrays.items():
+            memoria = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+            memorias.append(memoria)
+            np.ndarray(array.shape, dtype = array.dtype, buffer = memoria.buf)[...] = array
+            descriptores[nombre] = (memoria.name, array.shape, array.dtype.str)
+        bloques = [(inicio, min(inicio + tamano_bloque, n_puntos)) for inicio in range(0, n_puntos, tamano_bloque)]
+        with multiprocessing.Pool(n_procesos, initializer = iniciar_proceso_rotores, initargs = (descriptores, limites_espacio, limites_tiempo, cotas_retorno, modo_canonico, con_estadisticas)) as pool:
+            for [bloque, [caminos_bloque, estadisticas_bloque]] in zip(bloques, pool.imap(buscar_bloque_rotores, bloques)):
+                yield [bloque[1], caminos_bloque, estadisticas_bloque]
+    finally:
+        for memoria in memorias:
+            memoria.close()
+            memoria.unlink()
+
+# Estado de cada proceso de búsqueda (se rellena en iniciar_proceso_rotores)
+_PROCESO_ROTORES = {}
+
+def iniciar_proceso_rotores(descriptores:dict, limites_espacio:list, limites_tiempo:list, cotas_retorno:bool = True, modo_canonico:bool = False, con_estadisticas:bool = False)->None:
+    """
+    Función interna que prepara un proceso de búsqueda enganchándose a la memoria compartida
+
+    Args:
+        descriptores (dict): Nombre del bloque de memoria, forma y tipo de cada array
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
+        cotas_retorno (bool, optional): Podar con las cotas de retorno a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+        con_estadisticas (bool, optional): Contar la búsqueda de cada bloque. Defaults to False.
+    """
+    memorias = {}
+    arrays = {}
+    for nombre, [nombre_memoria, forma, tipo] in descriptores.items():
+        memorias[nombre] = abrir_memoria_compartida(nombre_memoria)
+        arrays[nombre] = np.ndarray(forma, dtype = np.dtype(tipo), buffer = memorias[nombre].buf)
+    grafo = MatrizDispersa(arrays["indptr"], arrays["indices"])
+    tabla_pesos = TablaPesos(grafo, arrays["longitudes"], arrays.get("tiempos"))
+    _PROCESO_ROTORES["memorias"] = memorias
+    _PROCESO_ROTORES["con_estadisticas"] = con_estadisticas
+    _PROCESO_ROTORES["buscador"] = BuscadorCiclos(tabla_pesos, arrays["puntos"], limites_espacio, limites_tiempo, sin_copias = True, cotas_retorno = cotas_retorno, modo_canonico = modo_canonico)
+
+def abrir_memoria_compartida(nombre:str)->shared_memory.SharedMemory:
+    """
+    Función interna para engancharse a un bloque de memoria compartida creado por el proceso padre
+
+    Args:
+        nombre (str): Nombre del bloque de memoria compartida
+
+    Returns:
+        shared_memory.SharedMemory: Bloque de memoria compartida
+    """
+    try:
+        return shared_memory.SharedMemory(name = nombre, track = False)
+    except TypeError:
+        # Python < 3.13 no tiene track, los hijos comparten el resource_tracker del padre y este es quien libera el bloque
+        return shared_memory.SharedMemory(name = nombre)
+
+def buscar_bloque_rotores(bloque:tuple)->list:
+    """
+    Función interna que busca los rotores de un bloque de semillas en un proceso de búsqueda
+
+    Args:
+        bloque (tuple): (primera semilla, última semilla + 1)
+
+    Returns:
+        list: [rotores [camino, distancia, tiempo] encontrados en el bloque sin repetidos, EstadisticasBusqueda del bloque o None]
+    """
+    rotores = []
+    unic = set()
+    buscador = _PROCESO_ROTORES["buscador"]
+    # Las estadísticas son de cada bloque, el gancho se llama en el proceso principal al juntarlas
+    buscador.estadisticas = EstadisticasBusqueda() if _PROCESO_ROTORES["con_estadisticas"] else None
+    for i in range(bloque[0], bloque[1]):
+        if buscador.modo_canonico: unic = set()
+        rotores.extend(buscador.iterar(i, unic))
+    return [rotores, buscador.estadisticas]
+
+def buscar_rotores_teselas(matriz_adyacencia:list, puntos:np.ndarray, velocidades:list, limites_espacio:list, limites_tiempo:list, tamano_tesela:float, n_procesos:int = 1, cotas_retorno:bool = True, modo_canonico:bool = False):
+    """
+    Función interna que busca los rotores por teselas del plano xy sin tener el grafo entero en la búsqueda
+
+    Las distancias se miden en xy, así que un ciclo que pasa por una semilla no se aleja de ella más de la mitad del
+    límite de espacio. Cada tesela busca desde sus puntos (el núcleo) con el subgrafo del núcleo más un margen de esa
+    mitad alrededor, numerado en el mismo orden que el grafo, y encuentra lo mismo que la búsqueda entera desde esas
+    semillas. Solo los ciclos que salen del núcleo se pueden encontrar desde otra tesela: se guardan hasta que ya no
+    los puede encontrar ninguna tesela que falte (las teselas van por columnas) y se queda el de la semilla menor, que
+    es el que guarda la búsqueda entera. Los arrays del grafo, los puntos y las velocidades pueden ser np.memmap: de
+    cada tesela solo se leen sus puntos y relaciones.
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        puntos (np.ndarray): Array de puntos
+        velocidades (list): Velocidades de los puntos [[vector], velocidad (mm/s), penalización] o CampoVelocidades
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        limites_tiempo (list): Límites de tiempo [limite_inferior, limite_superior]
+        tamano_tesela (float): Lado de cada tesela (mm)
+        n_procesos (int, optional): Número de procesos que buscan teselas a la vez. Defaults to 1.
+        cotas_retorno (bool, optional): Podar con las cotas de retorno a la semilla. Defaults to True.
+        modo_canonico (bool, optional): Buscar cada ciclo solo desde su punto menor y en un sentido. Defaults to False.
+
+    Yields:
+        list: [semillas hechas, rotores [camino, distancia, tiempo] que ya no pueden cambiar]
+    """
+    grafo = matriz_a_dispersa(matriz_adyacencia)
+    puntos = np.asarray(puntos)
+    if hay_velocidades(velocidades) and not isinstance(velocidades, CampoVelocidades):
+        velocidades = CampoVelocidades(*velocidades_a_arrays(velocidades))
+    teselas = teselas_grafo(grafo, puntos, velocidades, limites_espacio, tamano_tesela)
+    parametros = [limites_espacio, limites_tiempo, cotas_retorno, modo_canonico]
+    if n_procesos > 1:
+        resultados = buscar_teselas_procesos(teselas, parametros, n_procesos)
+    else:
+        resultados = (buscar_tesela([tesela] + parametros) for tesela in teselas)
+    # Ciclos que salen del núcleo de su tesela: clave -> [semilla, columna de la primera tesela que lo encontró, rotor]
+    pendientes = {}
+    alcance = int(np.ceil((limites_espacio[1] / 2 * (1 + 1e-9) + 1e-9) / tamano_tesela))
+    hechos = 0
+    for [columna, n_semillas, rotores_tesela, semillas, cruzan] in resultados:
+        hechos += n_semillas
+        # Los que encontró una columna a más de alcance ya no los puede encontrar ninguna tesela que falte
+        listos = [clave for clave, [_, primera, _] in pendientes.items() if primera + alcance < columna]
+        nuevos = [pendientes.pop(clave) for clave in listos]
+        nuevos = [rotor for [_, _, rotor] in sorted(nuevos, key = lambda pendiente: pendiente[0])]
+        for rotor, semilla, cruza in zip(rotores_tesela, semillas, cruzan):
+            # En modo canónico cada ciclo solo sale de su punto menor, no hay repetidos entre teselas
+            if not cruza or modo_canonico:
+                nuevos.append(rotor)
+                continue
+            clave = clave_ciclo(rotor[0])
+            pendiente = pendientes.get(clave)
+            if pendiente is None: pendientes[clave] = [semilla, columna, rotor]
+            elif semilla < pendiente[0]: pendientes[clave] = [semilla, pendiente[1], rotor]
+        yield [hechos, nuevos]
+    yield [hechos, [rotor for [_, _, rotor] in sorted(pendientes.values(), key = lambda pendiente: pendiente[0])]]
+
+def teselas_grafo(grafo:MatrizDispersa, puntos:np.ndarray, velocidades:list, limites_espacio:list, tamano_tesela:float):
+    """
+    Función interna generadora que saca el subgrafo de cada tesela (núcleo y margen) con sus pesos
+
+    Args:
+        grafo (MatrizDispersa): Matriz de adyacencia del grafo
+        puntos (np.ndarray): Array de puntos
+        velocidades (list): CampoVelocidades o None
+        limites_espacio (list): Límites de espacio [limite_inferior, limite_superior]
+        tamano_tesela (float): Lado de cada tesela (mm)
+
+    Yields:
+        dict: Tesela con sus puntos (ids en el grafo), semillas (del núcleo, en la numeración de la tesela), relaciones y pesos
+    """
+    xy = np.asarray(puntos[:, :2], dtype = np.float64)
+    minimo = xy.min(axis = 0) if len(xy) > 0 else np.zeros(2)
+    celdas = np.floor((xy - minimo) / tamano_tesela).astype(np.int64)
+    n_y = int(celdas[:, 1].max()) + 1 if len(xy) > 0 else 1
+    clave = celdas[:, 0] * n_y + celdas[:, 1]
+    orden = np.argsort(clave, kind = "stable")
+    claves = np.unique(clave)
+    inicios = np.searchsorted(clave[orden], claves)
+    fines = np.searchsorted(clave[orden], claves, side = "right")
+    # Margen de media distancia máxima (un poco más por redondeo)
+    margen = limites_espacio[1] / 2 * (1 + 1e-9) + 1e-9
+    alcance = int(np.ceil(margen / tamano_tesela))
+    for [tesela, inicio, fin] in zip(claves.tolist(), inicios.tolist(), fines.tolist()):
+        [cx, cy] = divmod(tesela, n_y)
+        vecinas = [(cx + dx) * n_y + cy + dy for dx in range(-alcance, alcance + 1) for dy in range(-alcance, alcance + 1) if 0 <= cy + dy < n_y]
+        posiciones = np.searchsorted(claves, vecinas)
+        candidatos = [orden[inicios[p]:fines[p]] for p, v in zip(posiciones.tolist(), vecinas) if p < len(claves) and claves[p] == v]
+        candidatos = np.concatenate(candidatos)
+        bajo = minimo + np.array([cx, cy]) * tamano_tesela - margen
+        alto = minimo + np.array([cx + 1, cy + 1]) * tamano_tesela + margen
+        dentro = np.all((xy[candidatos] >= bajo) & (xy[candidatos] <= alto), axis = 1)
+        ids = np.sort(candidatos[dentro])
+        semillas = np.searchsorted(ids, np.sort(orden[inicio:fin]))
+        [indptr, indices, longitudes, tiempos] = subgrafo(grafo, puntos, velocidades, ids)
+        nucleo = np.zeros(len(ids), dtype = bool)
+        nucleo[semillas] = True
+        yield {"columna": cx, "ids": ids, "semillas": semillas, "nucleo": nucleo, "indptr": indptr, "indices": indices,
+               "longitudes": longitudes, "tiempos": tiempos, "puntos": np.asarray(puntos[ids], dtype = np.float64)}
+
+def subgrafo(grafo:MatrizDispersa, puntos:np.ndarray, velocidades:list, ids:np.ndarray)->list:
+    """
+    Función interna para sacar las relaciones del grafo entre unos puntos, renumeradas en su orden, con sus pesos
+
+    Args:
+        grafo (MatrizDispersa): Matriz de adyacencia del grafo
+        puntos (np.ndarray): Array de puntos
+        velocidades (list): CampoVelocidades o None
+        ids (np.ndarray): Puntos del subgrafo ordenados
+
+    Returns:
+        list: [indptr, indices, longitudes, tiempos] del subgrafo (tiempos es None si no hay velocidades)
+    """
+    inicios_filas = grafo.indptr[ids]
+    longitudes_filas = grafo.indptr[ids + 1] - inicios_filas
+    total = int(longitudes_filas.sum())
+    aristas = np.repeat(inicios_filas - np.cumsum(longitudes_filas) + longitudes_filas, longitudes_filas) + np.arange(total)
+    destino = np.asarray(grafo.indices[aristas], dtype = np.int64)
+    origen = np.repeat(np.arange(len(ids)), longitudes_filas)
+    local = np.minimum(np.searchsorted(ids, destino), len(ids) - 1)
+    valida = ids[local] == destino
+    indptr = np.zeros(len(ids) + 1, dtype = np.int64)
+    np.cumsum(np.bincount(origen[valida], minlength = len(ids)), out = indptr[1:])
+    [longitudes, tiempos] = pesos_aristas(ids[origen[valida]], destino[valida], puntos, velocidades)
+    return [indptr, local[valida], longitudes, tiempos]
+
+def distancia_xy_puntos(puntos:np.ndarray, centros:np.ndarray, radio:float)->np.ndarray:
+    """
+    Función interna para calcular la distancia en xy de cada punto al centro más cercano, solo hasta un radio
+
+    Args:
+        puntos (np.ndarray): Array de puntos
+        centros (np.ndarray): Array de centros
+        radio (float): Distancia máxima que interesa
+
+    Returns:
+        np.ndarray: Distancia de cada punto a su centro más cercano (infinito si está a más del radio)
+    """
+    xy = np.asarray(puntos[:, :2], dtype = np.float64)
+    centros = np.asarray(centros[:, :2], dtype = np.float64)
+    distancias = np.full(len(xy), inf)
+    if len(centros) == 0: return distancias
+    # Solo se consultan los puntos de la caja de los centros más el radio
+    candidatos = np.flatnonzero(np.all((xy >= centros.min(axis = 0) - radio) & (xy <= centros.max(axis = 0) + radio), axis = 1))
+    if len(candidatos) == 0: return distancias
+    plano = lambda xy: np.column_stack([xy, np.zeros(len(xy))])
+    [distancia, _] = RejillaEspacial(plano(centros), radio).consultar(plano(xy[candidatos]))
+    distancias[candidatos] = np.where(distancia[:, 0] <= radio, distancia[:, 0], inf)
+    return distancias
+
+def buscar_tesela(tarea:list)->list:
+    """
+    Función interna que busca los rotores desde las semillas del núcleo de una tesela
+
+    Args:
+        tarea (list): [tesela (teselas_grafo), limites_espacio, limites_tiempo, cotas_retorno, modo_canonico]
+
+    Returns:
+        list: [columna de la tesela, número de semillas, rotores [camino, distancia, tiempo] con los puntos del grafo, semilla de cada rotor, si cada rotor sale del núcleo]
+    """
+    [tesela, limites_espacio, limites_tiempo, cotas_retorno, modo_canonico] = tarea
+    tabla_pesos = TablaPesos(MatrizDispersa(tesela["indptr"], tesela["indices"]), tesela["longitudes"], tesela["tiempos"])
+    buscador = BuscadorCiclos(tabla_pesos, tesela["puntos"], limites_espacio, limites_tiempo, cotas_retorno = cotas_retorno, modo_canonico = modo_canonico)
+    ids = tesela["ids"].tolist()
+    nucleo = tesela["nucleo"].tolist()
+    rotores = []
+    semillas = []
+    cruzan = []
+    unic = set()
+    for semilla in tesela["semillas"].tolist():
+        if modo_canonico: unic = set()
+        for [camino, distancia, tiempo] in buscador.iterar(semilla, unic):
+            rotores.append([[ids[punto] for punto in camino], distancia, tiempo])
+            semillas.append(ids[semilla])
+            cruzan.append(not all(nucleo[punto] for punto in camino))
+    return [tesela["columna"], len(tesela["semillas"]), rotores, semillas, cruzan]
+
+def buscar_teselas_procesos(teselas, parametros:list, n_procesos:int):
+    """
+    Función interna que reparte las teselas entre varios procesos con como mucho dos teselas por proceso pendientes
+
+    Las teselas se van sacando según se necesitan (no se preparan todas de golpe) y los resultados se devuelven en el
+    orden de las teselas.
+
+    Args:
+        teselas (iterable): Teselas de teselas_grafo
+        parametros (list): [limites_espacio, limites_tiempo, cotas_retorno, modo_canonico]
+        n_procesos (int): Número de procesos
+
+    Yields:
+        list: Resultado de buscar_tesela de cada tesela
+    """
+    with multiprocessing.Pool(n_procesos) as pool:
+        pendientes = []
+        for tesela in teselas:
+            pendientes.append(pool.apply_async(buscar_tesela, ([tesela] + parametros,)))
+            if len(pendientes) >= 2 * n_procesos:
+                yield pendientes.pop(0).get()
+        while pendientes:
+            yield pendientes.pop(0).get()
 
 
 # Funciones de lectura de objetos
 # ----------------------------------------------------------------------------------
-def crear_grafo(nombre_archivo:str)->list:
+def crear_grafo(nombre_archivo:str, disperso:bool = False)->list:
     """
     Función de lectura de un archivo obj para obtener los datos necesarios
 
     Args:
         nombre_archivo (str): Nombre del archivo obj
+        disperso (bool, optional): Crear la matriz de adyacencia como MatrizDispersa (recomendable en mallas grandes). Defaults to False.
 
     Returns:
         list: Te de devuelve una lista con los siguientes datos:
@@ -534,26 +2204,56 @@ def crear_grafo(nombre_archivo:str)->list:
             Matriz de adyacencia: Matriz de adyacencia creada a partir de las relaciones
             Caminos: Reentradas anatómicas encontradas 
     """
-    [puntos, conexiones, normales, matriz_adyacencia, triangulos] = leer_obj(nombre_archivo)
+    [puntos, conexiones, normales, matriz_adyacencia, triangulos] = leer_obj(nombre_archivo, disperso)
     caminos = busca_caminos(matriz_adyacencia, triangulos)
-    caminos = filtrar_caminos(caminos)
     return [puntos, conexiones, normales, matriz_adyacencia, caminos]
 
 def busca_caminos(matriz_adyacencia:list, triangulos:list)->list:
     """
     Función para buscar las reentradas anatómicas
 
+    Las relaciones de borde (las que están en menos de dos triangulos, es decir, alrededor de algún agujero) se sacan
+    de una sola pasada contando los triangulos de cada relación. Los bordes que son un ciclo simple (todos sus puntos
+    tienen dos relaciones de borde) se recorren directamente una vez desde su punto menor; el resto se recorren con
+    obtener_camino desde cada uno de sus puntos.
+
+    Antes devolvía los caminos de todos los puntos con repetidos y había que pasarlos por filtrar_caminos; ahora los
+    devuelve ya filtrados y ordenados por el punto desde el que se encuentran, los mismos que daba filtrar_caminos con
+    la lista antigua (volver a filtrarlos no cambia nada).
+
     Args:
-        matriz_adyacencia (list): Matriz de adyacencia del grafo
+        matriz_adyacencia (list): Matriz de adyacencia del grafo (densa o MatrizDispersa)
         triangulos (list): Triangulos del obj
 
     Returns:
-        list: Lista de caminos que forman las reentradas anatómicas
+        list: Lista de caminos únicos que forman las reentradas anatómicas
     """
-    caminos = []
-    for i in range(len(matriz_adyacencia[0])):
-        obtener_camino(matriz_adyacencia, triangulos, i, caminos = caminos)
-    return caminos
+    borde = crear_matriz_borde(triangulos, numero_puntos(matriz_adyacencia))
+    vecinos = borde.vecinos
+    grados = np.diff(borde.indptr).tolist()
+    visitado = bytearray(borde.shape[0])
+    encontrados = []
+    for i in np.flatnonzero(np.diff(borde.indptr)).tolist():
+        if visitado[i]: continue
+        # Al ir en orden, i es el punto menor de su componente de borde
+        componente = [i]
+        visitado[i] = 1
+        for punto in componente:
+            for j in vecinos[punto]:
+                if not visitado[j]:
+                    visitado[j] = 1
+                    componente.append(j)
+        if all(grados[punto] == 2 for punto in componente):
+            camino = [i, vecinos[i][0]]
+            while camino[-1] != i:
+                [vecino1, vecino2] = vecinos[camino[-1]]
+                camino.append(vecino2 if vecino1 == camino[-2] else vecino1)
+            encontrados.append((i, camino))
+        else:
+            for semilla in sorted(componente):
+                encontrados.extend((semilla, camino) for camino in obtener_camino(borde, semilla))
+    encontrados.sort(key = lambda encontrado: encontrado[0])
+    return filtrar_caminos([camino for _, camino in encontrados])
 
 def filtrar_caminos(caminos:list)->list:
     """
@@ -566,92 +2266,123 @@ def filtrar_caminos(caminos:list)->list:
         list: Lista de reentradas anatómicas únicas
     """
     caminos_filtrados = []
-    unic = []
+    unic = set()
     for camino in caminos:
-        camino2 = list(camino)
-        camino2 = camino2[:-1]
-        camino2.sort()
-        if camino2 not in unic:
-            unic.append(camino2)
+        clave = clave_ciclo(camino)
+        if clave not in unic:
+            unic.add(clave)
             caminos_filtrados.append(camino)
     return caminos_filtrados
 
-def obtener_camino(matriz_adyacencia:list, triangulos:list, punto:int, anterior:int = -1, camino:list = [], caminos:list = [])->None:
+def obtener_camino(borde:MatrizDispersa, punto:int)->list:
     """
-    Función para obtener los caminos de las reentradas anatómicas mirando la cantidad de triangulos que lo conectan (si es menor que dos significa que hay algún agujero)
+    Función para obtener los caminos de las reentradas anatómicas que empiezan en un punto siguiendo las relaciones de borde (las que están en menos de dos triangulos, lo que significa que hay algún agujero)
+
+    Cada vez que se vuelve a un punto del camino se guarda el camino y se deja de seguir desde el último punto.
+
+    Antes recibía la matriz de adyacencia y los triangulos y añadía los caminos a la lista caminos de forma recursiva;
+    ahora recibe las relaciones de borde ya calculadas y devuelve los caminos de ese punto (los mismos y en el mismo
+    orden), sin límite de recursión en bordes largos.
 
     Args:
-        matriz_adyacencia (list): Matriz de adyacencia del grafo
-        triangulos (list): Lista de triangulos del obj
-        punto (int): Punto en el que se encuentra
-        anterior (int, optional): Punto del que viene (-1 si empieza el camino). Defaults to -1.
-        camino (list, optional): Camino actual. Defaults to [].
-        caminos (list, optional): Lista de caminos. Defaults to [].
+        borde (MatrizDispersa): Relaciones de borde del grafo (crear_matriz_borde)
+        punto (int): Punto en el que empiezan los caminos
 
     Returns:
-        None
+        list: Lista de caminos encontrados
     """
-    if camino == []:
-        camino = [punto]
-    conexiones = [i for i, x in enumerate(matriz_adyacencia[punto]) if x == 1]
-    triangulos_punto = [x for x in triangulos if punto in x]
-
-    for i in conexiones:
-        if i == anterior: continue
-        triangulos_punto_conexion = [x for x in triangulos_punto if i in x]
-        if len(triangulos_punto_conexion) < 2:
-            if i in camino:
-                camino2 = list(camino)
-                camino2.append(i)
-                return caminos.append(camino2)
-            else:
-                camino2 = list(camino)
-                camino2.append(i)
-                obtener_camino(matriz_adyacencia, triangulos, i, punto, camino2, caminos)
+    caminos = []
+    vecinos = borde.vecinos
+    camino = [punto]
+    en_camino = {punto}
+    siguiente = [0]
+    while camino:
+        actual = camino[-1]
+        if siguiente[-1] == len(vecinos[actual]):
+            en_camino.discard(camino.pop())
+            siguiente.pop()
+            continue
+        i = vecinos[actual][siguiente[-1]]
+        siguiente[-1] += 1
+        if len(camino) > 1 and i == camino[-2]: continue
+        if i in en_camino:
+            caminos.append(camino + [i])
+            en_camino.discard(camino.pop())
+            siguiente.pop()
+            continue
+        camino.append(i)
+        en_camino.add(i)
+        siguiente.append(0)
+    return caminos
 
-def leer_obj(nombre_archivo:str)->list:
+def leer_obj(nombre_archivo:str, disperso:bool = False)->list:
     """
     Función para leer un archivo obj y obtener los datos necesarios
 
     Args:
         nombre_archivo (str): Nombre del archivo obj
+        disperso (bool, optional): Crear la matriz de adyacencia como MatrizDispersa en vez de una matriz densa N×N. Defaults to False.
 
     Returns:
         list: Lista con los siguientes datos:
-            Puntos: Lista de puntos
-            Conexiones: Lista de conexiones
-            Normales: Lista de normales
+            Puntos: Array (N, 3) de puntos
+            Conexiones: Array (F, 3) de conexiones (índices empezando en 1)
+            Normales: Array (M, 3) de normales
             Matriz de adyacencia: Matriz de adyacencia creada a partir de las relaciones
-            Triangulos: Lista de triangulos del obj 
-    """
-    puntos = []
-    conexiones = []
-    normales = []
-    triangulos = []
-    matriz_adyacencia = None
-    with open(nombre_archivo, 'r') as archivo:
-        for linea in archivo:
-            if linea.startswith('v '):
-                puntos.append([float(x) for x in linea.split()[1:]])
-            elif linea.startswith('vn '):
-                normales.append([float(x) for x in linea.split()[1:]])
-            elif linea.startswith('f '):
-                if matriz_adyacencia is None:
-                    matriz_adyacencia = np.zeros((len(puntos), len(puntos)))
-                conects = [int(x.split('/')[0]) for x in linea.split()[1:]]
-                conexiones.append(conects)
-                matriz_adyacencia[conects[0]-1, conects[1]-1] = 1
-                matriz_adyacencia[conects[1]-1, conects[0]-1] = 1
-                matriz_adyacencia[conects[1]-1, conects[2]-1] = 1
-                matriz_adyacencia[conects[2]-1, conects[1]-1] = 1
-                matriz_adyacencia[conects[0]-1, conects[2]-1] = 1
-                matriz_adyacencia[conects[2]-1, conects[0]-1] = 1
-                
-                # if conects[0] == 383 or conects[1] == 383 or conects[2] == 383:
-                #     print(conects)
-                triangulos.append([x -1 for x in conects])
+            Triangulos: Array (F, 3) de triangulos del obj (índices empezando en 0)
+    """
+    [puntos, normales, triangulos] = cargar_obj(nombre_archivo)
+    conexiones = triangulos + 1
+    if disperso:
+        matriz_adyacencia = crear_matriz_dispersa(triangulos, len(puntos))
+    elif len(triangulos) > 0:
+        [origen, destino] = aristas_triangulos(triangulos)
+        matriz_adyacencia = np.zeros((len(puntos), len(puntos)))
+        matriz_adyacencia[origen, destino] = 1
+    else:
+        matriz_adyacencia = None
     return [puntos, conexiones, normales, matriz_adyacencia, triangulos]
 
+def cargar_obj(nombre_archivo:str, dtype:type = np.float64)->list:
+    """
+    Función para leer un archivo obj de golpe y obtener sus datos como arrays contiguos
+
+    Se lee el archivo entero y se extraen los vértices, normales y caras con expresiones regulares, convirtiendo
+    todos los números a la vez con numpy en vez de línea a línea. Solo se tienen en cuenta los tres primeros
+    vértices de cada cara (la malla tiene que estar triangulada).
+
+    Args:
+        nombre_archivo (str): Nombre del archivo obj
+        dtype (type, optional): Tipo de los arrays de puntos y normales (np.float32 o np.float64). Defaults to np.float64.
+
+    Returns:
+        list: Lista con los siguientes datos:
+            Puntos: Array (N, 3) de puntos
+            Normales: Array (M, 3) de normales
+            Triangulos: Array (F, 3) int32 de triangulos (índices empezando en 0)
+    """
+    with open(nombre_archivo, 'rb') as archivo:
+        contenido = archivo.read()
+    puntos = np.array(PATRON_OBJ_VERTICE.findall(contenido), dtype = bytes).astype(dtype).reshape(-1, 3)
+    normales = np.array(PATRON_OBJ_NORMAL.findall(contenido), dtype = bytes).astype(dtype).reshape(-1, 3)
+    triangulos = np.array(PATRON_OBJ_CARA.findall(contenido), dtype = bytes).astype(np.int32).reshape(-1, 3) - 1
+    return [np.ascontiguousarray(puntos), np.ascontiguousarray(normales), np.ascontiguousarray(triangulos)]
+
+def aristas_triangulos(triangulos:np.ndarray)->list:
+    """
+    Función para obtener las relaciones dirigidas (en ambos sentidos) de todos los triangulos
+
+    Args:
+        triangulos (np.ndarray): Array (F, 3) de triangulos (índices empezando en 0)
+
+    Returns:
+        list: [origen, destino] arrays con los extremos de cada relación (6 por triangulo)
+    """
+    caras = np.asarray(triangulos, dtype = np.int64).reshape(-1, 3)
+    origen = caras[:, [0, 1, 1, 2, 2, 0]].ravel()
+    destino = caras[:, [1, 0, 2, 1, 0, 2]].ravel()
+    return [origen, destino]
+
 def crear_matriz(puntos:list, conexiones:list)->list:
     """
     Función para crear una matriz de adyacencia a partir de los puntos y las conexiones
@@ -675,6 +2406,341 @@ def crear_matriz(puntos:list, conexiones:list)->list:
         matriz[conexion[2]-1][conexion[0]-1] = 1
     return matriz
 
+def crear_matriz_dispersa(triangulos:list, n_puntos:int)->MatrizDispersa:
+    """
+    Función para crear una matriz de adyacencia dispersa directamente a partir de los triangulos
+
+    Args:
+        triangulos (list): Lista de triangulos del obj (índices empezando en 0)
+        n_puntos (int): Número de puntos del grafo
+
+    Returns:
+        MatrizDispersa: Matriz de adyacencia en formato CSR
+    """
+    [origen, destino] = aristas_triangulos(triangulos)
+    claves = np.unique(origen * n_puntos + destino)
+    filas = claves // n_puntos
+    indptr = np.zeros(n_puntos + 1, dtype = np.int64)
+    np.cumsum(np.bincount(filas, minlength = n_puntos), out = indptr[1:])
+    return MatrizDispersa(indptr, claves % n_puntos)
+
+def crear_matriz_borde(triangulos:list, n_puntos:int)->MatrizDispersa:
+    """
+    Función para obtener las relaciones de borde de la malla (las que están en menos de dos triangulos)
+
+    Args:
+        triangulos (list): Lista de triangulos del obj (índices empezando en 0)
+        n_puntos (int): Número de puntos del grafo
+
+    Returns:
+        MatrizDispersa: Matriz de adyacencia con solo las relaciones de borde
+    """
+    caras = np.asarray(triangulos, dtype = np.int64).reshape(-1, 3)
+    origen = caras.ravel()
+    destino = caras[:, [1, 2, 0]].ravel()
+    [claves, cantidad] = np.unique(np.minimum(origen, destino) * n_puntos + np.maximum(origen, destino), return_counts = True)
+    claves = claves[cantidad < 2]
+    [origen, destino] = [claves // n_puntos, claves % n_puntos]
+    claves = np.sort(np.concatenate([origen * n_puntos + destino, destino * n_puntos + origen]))
+    indptr = np.zeros(n_puntos + 1, dtype = np.int64)
+    np.cumsum(np.bincount(claves // n_puntos, minlength = n_puntos), out = indptr[1:])
+    return MatrizDispersa(indptr, claves % n_puntos)
+
+def modificar_aristas(matriz_adyacencia:list, eliminar:list = None, anadir:list = None)->MatrizDispersa:
+    """
+    Función para quitar y añadir relaciones a una matriz de adyacencia (en los dos sentidos), por ejemplo para probar una ablación
+
+    Args:
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        eliminar (list, optional): Relaciones [[punto, punto], ...] a quitar. Defaults to None.
+        anadir (list, optional): Relaciones [[punto, punto], ...] a añadir. Defaults to None.
+
+    Returns:
+        MatrizDispersa: Nueva matriz de adyacencia (la original no se cambia)
+    """
+    grafo = matriz_a_dispersa(matriz_adyacencia)
+    n_puntos = grafo.shape[0]
+    origen = np.repeat(np.arange(n_puntos, dtype = np.int64), np.diff(grafo.indptr))
+    claves = origen * n_puntos + np.asarray(grafo.indices, dtype = np.int64)
+    dos_sentidos = lambda aristas: np.concatenate([aristas[:, 0] * n_puntos + aristas[:, 1], aristas[:, 1] * n_puntos + aristas[:, 0]])
+    if eliminar is not None and len(eliminar) > 0:
+        claves = claves[~np.isin(claves, dos_sentidos(np.asarray(eliminar, dtype = np.int64).reshape(-1, 2)))]
+    if anadir is not None and len(anadir) > 0:
+        claves = np.concatenate([claves, dos_sentidos(np.asarray(anadir, dtype = np.int64).reshape(-1, 2))])
+    claves = np.unique(claves)
+    indptr = np.zeros(n_puntos + 1, dtype = np.int64)
+    np.cumsum(np.bincount(claves // n_puntos, minlength = n_puntos), out = indptr[1:])
+    return MatrizDispersa(indptr, claves % n_puntos)
+
+
+# Funciones de simplificación de mallas
+# ----------------------------------------------------------------------------------
+def simplificar_malla(puntos:np.ndarray, triangulos:np.ndarray, longitud_arista:float, datos_puntos:pd.DataFrame = None, disperso:bool = True)->list:
+    """
+    Función para simplificar una malla fina hasta una longitud de arista aproximada antes de buscar reentradas funcionales
+
+    Los puntos de borde (alrededor de los agujeros) se agrupan por tramos de cada borde según su longitud, con al menos
+    tres tramos por borde para que ningún agujero se cierre. Para el resto se elige una semilla por celda de una rejilla
+    de lado longitud_arista y cada punto va con la semilla más cercana siguiendo la malla (así no se juntan las dos caras
+    de una pared fina y no salen agujeros nuevos). Cada grupo es un punto de la malla simplificada en la media de sus
+    puntos, con el material y model más repetidos y la media de las fibras, y cada triangulo fino con sus tres puntos en
+    grupos distintos es un triangulo de la simplificada (con el mismo sentido).
+
+    Args:
+        puntos (np.ndarray): Array (N, 3) de puntos de la malla fina
+        triangulos (np.ndarray): Array (F, 3) de triangulos de la malla fina (índices empezando en 0, como devuelve leer_obj)
+        longitud_arista (float): Longitud de arista aproximada de la malla simplificada (mm)
+        datos_puntos (pd.DataFrame, optional): Datos de los puntos de la malla fina (crear_grafo_vtk). Defaults to None.
+        disperso (bool, optional): Crear la matriz de adyacencia como MatrizDispersa. Defaults to True.
+
+    Returns:
+        list: Lista con los siguientes datos:
+            Puntos: Array (M, 3) de puntos de la malla simplificada
+            Conexiones: Array (G, 3) de conexiones (índices empezando en 1)
+            Matriz de adyacencia: Matriz de adyacencia de la malla simplificada
+            Triangulos: Array (G, 3) de triangulos (índices empezando en 0)
+            Datos de los puntos: Datos de los puntos de la malla simplificada (None si no se pasan los de la fina)
+            Mapa: Array (N,) con el punto de la malla simplificada de cada punto de la fina (valores_finos = valores[mapa])
+    """
+    puntos = np.asarray(puntos, dtype = np.float64)
+    triangulos = np.asarray(triangulos, dtype = np.int64).reshape(-1, 3)
+    n_puntos = len(puntos)
+    [grupo, n_grupos] = agrupar_bordes(puntos, triangulos, longitud_arista)
+    interior = grupo < 0
+    # Semilla de cada celda: el punto interior más cercano a su centro
+    celdas = np.floor((puntos - puntos.min(axis = 0)) / longitud_arista).astype(np.int64)
+    distancia = np.sum((puntos - puntos.min(axis = 0) - (celdas + 0.5) * longitud_arista)**2, axis = 1)
+    celdas = np.unique(celdas, axis = 0, return_inverse = True)[1].reshape(-1)
+    candidatos = np.flatnonzero(interior)
+    candidatos = candidatos[np.lexsort((distancia[candidatos], celdas[candidatos]))]
+    semillas = candidatos[np.unique(celdas[candidatos], return_index = True)[1]]
+    region = regiones_geodesicas(puntos, crear_matriz_dispersa(triangulos, n_puntos), semillas, interior)
+    grupo[interior] = n_grupos + region[interior]
+    # Trozos de malla sin semilla (los que cortan una celda cuya semilla está en otro trozo), un grupo por trozo
+    [origen, destino] = aristas_triangulos(triangulos)
+    sin_region = interior & (region < 0)
+    if sin_region.any():
+        unir = sin_region[origen] & sin_region[destino]
+        etiqueta = componentes_conexas(origen[unir], destino[unir], n_puntos)
+        grupo[sin_region] = n_grupos + len(semillas) + np.unique(etiqueta[sin_region], return_inverse = True)[1].reshape(-1)
+    # Los grupos que se quedan sin triangulos se juntan con un grupo vecino que sí tenga
+    while True:
+        caras = caras_grupos(grupo, triangulos)
+        usado = np.zeros(int(grupo.max()) + 1, dtype = bool)
+        usado[caras.ravel()] = True
+        sueltos = ~usado[grupo[origen]] & usado[grupo[destino]]
+        if not sueltos.any(): break
+        destino_grupo = np.full(len(usado), -1, dtype = np.int64)
+        destino_grupo[grupo[origen[sueltos]]] = grupo[destino[sueltos]]
+        cambiar = destino_grupo[grupo] >= 0
+        grupo[cambiar] = destino_grupo[grupo[cambiar]]
+    # Los puntos de la malla simplificada se numeran en el orden del primer punto fino de cada grupo
+    [_, primeros, mapa] = np.unique(grupo, return_index = True, return_inverse = True)
+    orden = np.argsort(np.argsort(primeros))
+    mapa = orden[mapa.reshape(-1)]
+    caras = caras_grupos(mapa, triangulos)
+    n_grupos = len(primeros)
+    cuenta = np.bincount(mapa, minlength = n_grupos)[:, None]
+    puntos_gruesos = np.stack([np.bincount(mapa, weights = puntos[:, eje], minlength = n_grupos) for eje in range(3)], axis = 1) / cuenta
+    conexiones = caras + 1
+    if disperso:
+        matriz_adyacencia = crear_matriz_dispersa(caras, n_grupos)
+    elif len(caras) > 0:
+        [origen, destino] = aristas_triangulos(caras)
+        matriz_adyacencia = np.zeros((n_grupos, n_grupos))
+        matriz_adyacencia[origen, destino] = 1
+    else:
+        matriz_adyacencia = None
+    datos_gruesos = None
+    if datos_puntos is not None:
+        datos_gruesos = pd.DataFrame(puntos_gruesos, columns = ["x", "y", "z"])
+        # Cada punto se queda con el punto del VTK del punto fino más cercano a él
+        distancia = np.sum((puntos - puntos_gruesos[mapa])**2, axis = 1)
+        cercano = np.lexsort((distancia, mapa))[np.searchsorted(np.sort(mapa), np.arange(n_grupos))]
+        datos_gruesos["punto_mas_cercano"] = datos_puntos["punto_mas_cercano"].values[cercano]
+        datos_gruesos["material"] = voto_grupos(datos_puntos["material"].values, mapa, n_grupos)
+        datos_gruesos["model"] = voto_grupos(datos_puntos["model"].values, mapa, n_grupos)
+        fibras = media_fibras_grupos(datos_puntos[["f_x", "f_y", "f_z"]].values, mapa, n_grupos)
+        datos_gruesos["f_x"] = fibras[:, 0]
+        datos_gruesos["f_y"] = fibras[:, 1]
+        datos_gruesos["f_z"] = fibras[:, 2]
+    return [puntos_gruesos, conexiones, matriz_adyacencia, caras, datos_gruesos, mapa]
+
+def agrupar_bordes(puntos:np.ndarray, triangulos:np.ndarray, longitud_arista:float)->list:
+    """
+    Función interna para agrupar los puntos de borde en tramos de unos longitud_arista mm a lo largo de cada borde
+
+    Los puntos donde se juntan varios bordes se quedan solos en su grupo y los tramos entre ellos se parten por
+    longitud. Un borde cerrado se parte en al menos tres tramos para que siga siendo un ciclo.
+
+    Args:
+        puntos (np.ndarray): Array (N, 3) de puntos
+        triangulos (np.ndarray): Array (F, 3) de triangulos (índices empezando en 0)
+        longitud_arista (float): Longitud aproximada de cada tramo (mm)
+
+    Returns:
+        list: [grupo de cada punto (-1 si no es de borde), número de grupos]
+    """
+    borde = crear_matriz_borde(triangulos, len(puntos))
+    vecinos = borde.vecinos
+    grados = np.diff(borde.indptr)
+    grupo = np.full(len(puntos), -1, dtype = np.int64)
+    n_grupos = 0
+    cruces = np.flatnonzero((grados > 0) & (grados != 2)).tolist()
+    for punto in cruces:
+        grupo[punto] = n_grupos
+        n_grupos += 1
+
+    def tramos(cadena:list, cerrada:bool, minimo:int)->None:
+        nonlocal n_grupos
+        # cadena incluye los extremos (cruces o el primer punto repetido si es cerrada), que no se agrupan aquí
+        tramo = puntos[cadena]
+        acumulada = np.concatenate([[0], np.cumsum(np.linalg.norm(tramo[1:] - tramo[:-1], axis = 1))])
+        internos = cadena[:-1] if cerrada else cadena[1:-1]
+        posiciones = acumulada[:-1] if cerrada else acumulada[1:-1]
+        if len(internos) == 0: return
+        n_tramos = min(len(internos), max(minimo, int(round(acumulada[-1] / longitud_arista))))
+        indices = np.minimum((posiciones / max(acumulada[-1], 1e-12) * n_tramos).astype(np.int64), n_tramos - 1)
+        if len(np.unique(indices)) < n_tramos:
+            # Puntos muy mal repartidos a lo largo del borde, se reparten por número de puntos
+            indices = np.arange(len(internos)) * n_tramos // len(internos)
+        grupo[internos] = n_grupos + indices
+        n_grupos += n_tramos
+
+    for punto in cruces:
+        for siguiente in vecinos[punto]:
+            if grupo[siguiente] >= 0: continue
+            cadena = [punto, siguiente]
+            while grados[cadena[-1]] == 2:
+                [vecino1, vecino2] = vecinos[cadena[-1]]
+                cadena.append(vecino2 if vecino1 == cadena[-2] else vecino1)
+            # Una cadena que vuelve al mismo cruce necesita dos tramos para seguir siendo un ciclo con él
+            tramos(cadena, False, 2 if cadena[-1] == punto else 1)
+    for punto in np.flatnonzero(grados == 2).tolist():
+        if grupo[punto] >= 0: continue
+        cadena = [punto, vecinos[punto][0]]
+        while cadena[-1] != punto:
+            [vecino1, vecino2] = vecinos[cadena[-1]]
+            cadena.append(vecino2 if vecino1 == cadena[-2] else vecino1)
+        tramos(cadena, True, 3)
+    return [grupo, n_grupos]
+
+def regiones_geodesicas(puntos:np.ndarray, matriz_adyacencia:MatrizDispersa, semillas:np.ndarray, permitidos:np.ndarray)->np.ndarray:
+    """
+    Función interna para asignar cada punto a la semilla más cercana siguiendo las relaciones de la malla (Dijkstra desde todas las semillas a la vez)
+
+    Args:
+        puntos (np.ndarray): Array (N, 3) de puntos
+        matriz_adyacencia (MatrizDispersa): Matriz de adyacencia de la malla
+        semillas (np.ndarray): Puntos semilla
+        permitidos (np.ndarray): Array (N,) bool de los puntos por los que se puede pasar
+
+    Returns:
+        np.ndarray: Array (N,) con la posición en semillas de la semilla de cada punto (-1 si no se llega a ninguna)
+    """
+    indptr = matriz_adyacencia.indptr.tolist()
+    indices = matriz_adyacencia.indices.tolist()
+    [x, y, z] = np.asarray(puntos, dtype = np.float64).T.tolist()
+    permitidos = np.asarray(permitidos, dtype = bool).tolist()
+    distancia = [inf] * len(x)
+    region = [-1] * len(x)
+    cola = [(0.0, semilla, k) for k, semilla in enumerate(semillas.tolist())]
+    heapq.heapify(cola)
+    while cola:
+        [d, punto, k] = heapq.heappop(cola)
+        if region[punto] >= 0: continue
+        region[punto] = k
+        for j in range(indptr[punto], indptr[punto + 1]):
+            vecino = indices[j]
+            if region[vecino] >= 0 or not permitidos[vecino]: continue
+            dx = x[vecino] - x[punto]
+            dy = y[vecino] - y[punto]
+            dz = z[vecino] - z[punto]
+            d2 = d + sqrt(dx*dx + dy*dy + dz*dz)
+            if d2 < distancia[vecino]:
+                distancia[vecino] = d2
+                heapq.heappush(cola, (d2, vecino, k))
+    return np.array(region, dtype = np.int64)
+
+def componentes_conexas(origen:np.ndarray, destino:np.ndarray, n_puntos:int)->np.ndarray:
+    """
+    Función interna para etiquetar las componentes conexas de un grafo dado por sus relaciones
+
+    Cada punto se queda con el menor punto de su componente, propagando el mínimo por las relaciones y saltando
+    de etiqueta en etiqueta hasta que no cambia ninguna.
+
+    Args:
+        origen (np.ndarray): Primer punto de cada relación
+        destino (np.ndarray): Segundo punto de cada relación
+        n_puntos (int): Número de puntos del grafo
+
+    Returns:
+        np.ndarray: Array (N,) con el menor punto de la componente de cada punto
+    """
+    etiqueta = np.arange(n_puntos)
+    while True:
+        minimo = np.minimum(etiqueta[origen], etiqueta[destino])
+        nueva = etiqueta.copy()
+        np.minimum.at(nueva, origen, minimo)
+        np.minimum.at(nueva, destino, minimo)
+        nueva = nueva[nueva]
+        if np.array_equal(nueva, etiqueta): return etiqueta
+        etiqueta = nueva
+
+def caras_grupos(grupo:np.ndarray, triangulos:np.ndarray)->np.ndarray:
+    """
+    Función interna para pasar los triangulos a los grupos de sus puntos quitando los que se quedan sin área y los repetidos
+
+    Args:
+        grupo (np.ndarray): Grupo de cada punto
+        triangulos (np.ndarray): Array (F, 3) de triangulos (índices empezando en 0)
+
+    Returns:
+        np.ndarray: Array (G, 3) de triangulos entre grupos en el orden de los originales
+    """
+    caras = grupo[triangulos]
+    caras = caras[(caras[:, 0] != caras[:, 1]) & (caras[:, 1] != caras[:, 2]) & (caras[:, 0] != caras[:, 2])]
+    # Dos triángulos con los mismos puntos en otro orden son el mismo
+    [_, primeras] = np.unique(np.sort(caras, axis = 1), axis = 0, return_index = True)
+    return caras[np.sort(primeras)]
+
+def voto_grupos(etiquetas:np.ndarray, grupo:np.ndarray, n_grupos:int)->np.ndarray:
+    """
+    Función interna para elegir en cada grupo la etiqueta más repetida (en caso de empate la menor)
+
+    Args:
+        etiquetas (np.ndarray): Etiqueta de cada punto (material, model...)
+        grupo (np.ndarray): Grupo de cada punto
+        n_grupos (int): Número de grupos
+
+    Returns:
+        np.ndarray: Array (n_grupos,) con la etiqueta elegida de cada grupo
+    """
+    [valores, indices] = np.unique(etiquetas, return_inverse = True)
+    cuenta = np.bincount(grupo * len(valores) + indices.reshape(-1), minlength = n_grupos * len(valores)).reshape(n_grupos, len(valores))
+    return valores[np.argmax(cuenta, axis = 1)]
+
+def media_fibras_grupos(fibras:np.ndarray, grupo:np.ndarray, n_grupos:int)->np.ndarray:
+    """
+    Función interna para hacer la media de las direcciones de fibras de cada grupo (como media_fibras con grupos de distinto tamaño)
+
+    Args:
+        fibras (np.ndarray): Array (N, 3) de fibras
+        grupo (np.ndarray): Grupo de cada punto
+        n_grupos (int): Número de grupos
+
+    Returns:
+        np.ndarray: Array (n_grupos, 3) de fibras medias normalizadas
+    """
+    fibras = np.asarray(fibras, dtype = np.float64)
+    # Se orientan todas como la primera fibra de su grupo
+    primeras = fibras[np.unique(grupo, return_index = True)[1]]
+    signo = np.sign(np.sum(fibras * primeras[grupo], axis = 1))
+    signo[signo == 0] = 1
+    media = np.stack([np.bincount(grupo, weights = signo * fibras[:, eje], minlength = n_grupos) for eje in range(3)], axis = 1)
+    norma = np.linalg.norm(media, axis = 1, keepdims = True)
+    return np.divide(media, norma, out = media, where = norma > 0)
+
 
 # Funciones para reentradas funcionales
 # ----------------------------------------------------------------------------------
@@ -693,14 +2759,51 @@ def punto_mas_cercano(punto:int, puntos:list)->int:
     distancias = [np.linalg.norm(punto - p) for p in puntos]
     return np.argmin(distancias)
 
-def crear_grafo_vtk(nombre_archivo_obj:str, nombre_archivo_csv_vtk:str)->list:
+def voto_ponderado(etiquetas:np.ndarray, pesos:np.ndarray)->np.ndarray:
+    """
+    Función interna para elegir en cada fila la etiqueta con más peso (en caso de empate la primera)
+
+    Args:
+        etiquetas (np.ndarray): Array (M, k) de etiquetas (material, model...)
+        pesos (np.ndarray): Array (M, k) de pesos de cada etiqueta
+
+    Returns:
+        np.ndarray: Array (M,) con la etiqueta elegida de cada fila
+    """
+    puntuacion = np.sum(pesos[:, None, :] * (etiquetas[:, :, None] == etiquetas[:, None, :]), axis = 2)
+    return etiquetas[np.arange(len(etiquetas)), np.argmax(puntuacion, axis = 1)]
+
+def media_fibras(fibras:np.ndarray, pesos:np.ndarray)->np.ndarray:
+    """
+    Función interna para hacer la media ponderada de direcciones de fibras
+
+    Las fibras no tienen sentido (f y -f son la misma dirección), por eso se orientan todas como la primera antes de sumar
+
+    Args:
+        fibras (np.ndarray): Array (M, k, 3) de fibras
+        pesos (np.ndarray): Array (M, k) de pesos de cada fibra
+
+    Returns:
+        np.ndarray: Array (M, 3) de fibras medias normalizadas
+    """
+    signo = np.sign(np.sum(fibras * fibras[:, :1, :], axis = 2))
+    signo[signo == 0] = 1
+    media = np.sum((pesos * signo)[:, :, None] * fibras, axis = 1)
+    norma = np.linalg.norm(media, axis = 1, keepdims = True)
+    return np.divide(media, norma, out = media, where = norma > 0)
+
+def crear_grafo_vtk(nombre_archivo_obj:str, nombre_archivo_csv_vtk:str, disperso:bool = False, k_vecinos:int = 1)->list:
     """
     Función para crear un grafo a partir de un archivo obj y un archivo csv del VTK con los datos de cada punto
 
-    Tarda tiempo en ejecutar, recomendable guardar en csv el datos_puntos
+    Cada punto del obj se asocia a sus puntos más cercanos del VTK con una RejillaEspacial en una sola consulta. Con
+    k_vecinos > 1 las fibras se interpolan por inverso de la distancia y material/model se eligen por voto ponderado.
+
     Args:
         nombre_archivo_obj (str): Nombre del archivo obj con la estructura del corazón
         nombre_archivo_csv_vtk (str): Nombre del archivo csv con los datos del VTK
+        disperso (bool, optional): Crear la matriz de adyacencia como MatrizDispersa. Defaults to False.
+        k_vecinos (int, optional): Número de puntos del VTK usados para interpolar los datos de cada punto. Defaults to 1.
 
     Returns:
         list: Lista con los siguientes datos:
@@ -708,46 +2811,92 @@ def crear_grafo_vtk(nombre_archivo_obj:str, nombre_archivo_csv_vtk:str)->list:
             Conexiones: Lista de conexiones
             Normales: Lista de normales
             Matriz de adyacencia: Matriz de adyacencia creada a partir de las relaciones
-            Triangulos: Lista de triangulos del obj
             Datos de los puntos: Datos de los puntos del VTK
     """
-    [puntos, conexiones, normales, matriz_adyacencia, triangulos] = leer_obj(nombre_archivo_obj)
+    [puntos, conexiones, normales, matriz_adyacencia, triangulos] = leer_obj(nombre_archivo_obj, disperso)
     datos_vtk = pd.read_csv(nombre_archivo_csv_vtk)
     puntos_vtk = np.array(datos_vtk[["Points:0",  "Points:1",  "Points:2"]].values)
+    [distancias, cercanos] = RejillaEspacial(puntos_vtk).consultar(puntos, k_vecinos)
     datos_puntos = pd.DataFrame(puntos, columns = ["x", "y", "z"])
-    datos_puntos["punto_mas_cercano"] = [punto_mas_cercano(p, puntos_vtk) for p in puntos]
-    datos_puntos["material"] = datos_vtk["material"].values[datos_puntos["punto_mas_cercano"]]
-    datos_puntos["model"] = datos_vtk["model"].values[datos_puntos["punto_mas_cercano"]]
-    datos_puntos["f_x"] = datos_vtk["fibers:0"].values[datos_puntos["punto_mas_cercano"]]
-    datos_puntos["f_y"] = datos_vtk["fibers:1"].values[datos_puntos["punto_mas_cercano"]]
-    datos_puntos["f_z"] = datos_vtk["fibers:2"].values[datos_puntos["punto_mas_cercano"]]
+    datos_puntos["punto_mas_cercano"] = cercanos[:, 0]
+    fibras = datos_vtk[["fibers:0", "fibers:1", "fibers:2"]].values[cercanos]
+    if cercanos.shape[1] == 1:
+        datos_puntos["material"] = datos_vtk["material"].values[cercanos[:, 0]]
+        datos_puntos["model"] = datos_vtk["model"].values[cercanos[:, 0]]
+        fibras = fibras[:, 0]
+    else:
+        pesos = 1 / np.maximum(distancias, 1e-9)
+        datos_puntos["material"] = voto_ponderado(datos_vtk["material"].values[cercanos], pesos)
+        datos_puntos["model"] = voto_ponderado(datos_vtk["model"].values[cercanos], pesos)
+        fibras = media_fibras(fibras, pesos)
+    datos_puntos["f_x"] = fibras[:, 0]
+    datos_puntos["f_y"] = fibras[:, 1]
+    datos_puntos["f_z"] = fibras[:, 2]
     return [puntos, conexiones, normales, matriz_adyacencia, datos_puntos]
 
 
 # Funciones de lectura guardadas de anteriores ejecuciones
 # ----------------------------------------------------------------------------------
-def guardar_caminos(caminos:list, nombre_archivo:str)->None:
+def guardar_caminos(caminos:list, nombre_archivo:str, distancias:list = None, tiempos:list = None)->None:
     """
-    Función para guardar los caminos en un archivo csv
+    Función para guardar los caminos en un archivo
+
+    Si el nombre acaba en .csv se guarda en csv (una fila por camino), si no se guarda en formato binario: un array
+    plano int32 con todos los puntos y otro con dónde empieza cada camino, más opcionalmente la distancia y el tiempo de
+    cada camino. El binario ocupa mucho menos y cargar_caminos lo abre con memory-map sin leerlo entero.
 
     Args:
-        caminos (list): Lista de caminos a guardar (Tanto reentradas anatómicas, como funcionales)
-        nombre_archivo (str): Nombre del archivo csv donde se guardará
+        caminos (list): Lista de caminos a guardar (Tanto reentradas anatómicas, como funcionales) o ColeccionCaminos
+        nombre_archivo (str): Nombre del archivo donde se guardará
+        distancias (list, optional): Distancia de cada camino (solo en binario). Defaults to None.
+        tiempos (list, optional): Tiempo de cada camino (solo en binario). Defaults to None.
     """
-    pd.DataFrame(np.array(caminos)).to_csv(nombre_archivo, index = False)
+    if str(nombre_archivo).lower().endswith(".csv"):
+        pd.DataFrame({"0": [str([int(p) for p in camino]) for camino in caminos]}).to_csv(nombre_archivo, index = False)
+        return
+    if not isinstance(caminos, ColeccionCaminos):
+        caminos = ColeccionCaminos.desde_lista(caminos)
+    if distancias is None: distancias = caminos.distancias
+    if tiempos is None: tiempos = caminos.tiempos
+    columnas = [np.asarray(columna, dtype = np.float64) for columna in (distancias, tiempos) if columna is not None]
+    opciones = (distancias is not None) * 1 + (tiempos is not None) * 2
+    with open(nombre_archivo, "wb") as archivo:
+        archivo.write(struct.pack(FORMATO_CABECERA_CAMINOS, MAGIA_CAMINOS, 1, opciones, len(caminos), len(caminos.vertices)))
+        np.ascontiguousarray(caminos.offsets, dtype = np.int64).tofile(archivo)
+        np.ascontiguousarray(caminos.vertices, dtype = np.int32).tofile(archivo)
+        archivo.write(bytes((-4 * len(caminos.vertices)) % 8))
+        for columna in columnas:
+            columna.tofile(archivo)
     
 def cargar_caminos(nombre_archivo:str)->list:
     """
-    Función para cargar los caminos guardados en un archivo csv
+    Función para cargar los caminos guardados con guardar_caminos
 
     Args:
-        nombre_archivo (str): Nombre del archivo csv donde se guardaron los caminos
+        nombre_archivo (str): Nombre del archivo (csv o binario) donde se guardaron los caminos
 
     Returns:
-        list: Lista de caminos guardados
+        list: Lista de caminos guardados (si es csv) o ColeccionCaminos con memory-map (si es binario)
     """
-    caminos = pd.read_csv(nombre_archivo)
-    return [ast.literal_eval(s) for s in np.array(caminos["0"]).tolist()]
+    with open(nombre_archivo, "rb") as archivo:
+        cabecera = archivo.read(struct.calcsize(FORMATO_CABECERA_CAMINOS))
+    if not cabecera.startswith(MAGIA_CAMINOS):
+        caminos = pd.read_csv(nombre_archivo)
+        return [ast.literal_eval(s) for s in np.array(caminos["0"]).tolist()]
+    [_, version, opciones, n_caminos, n_vertices] = struct.unpack(FORMATO_CABECERA_CAMINOS, cabecera)
+    if version != 1: raise ValueError("Versión de archivo de caminos no soportada: " + str(version))
+    posicion = len(cabecera)
+    offsets = np.memmap(nombre_archivo, dtype = np.int64, mode = "r", offset = posicion, shape = (n_caminos + 1,))
+    posicion += 8 * (n_caminos + 1)
+    vertices = np.memmap(nombre_archivo, dtype = np.int32, mode = "r", offset = posicion, shape = (n_vertices,)) if n_vertices > 0 else np.zeros(0, dtype = np.int32)
+    posicion += 4 * n_vertices + (-4 * n_vertices) % 8
+    columnas = []
+    for bit in (1, 2):
+        if opciones & bit and n_caminos > 0:
+            columnas.append(np.memmap(nombre_archivo, dtype = np.float64, mode = "r", offset = posicion, shape = (n_caminos,)))
+            posicion += 8 * n_caminos
+        else: columnas.append(np.zeros(0) if opciones & bit else None)
+    return ColeccionCaminos(vertices, offsets, columnas[0], columnas[1])
     
 def obtener_velocidades_csv(nombre_archivo:str, puntos_detallados:pd.DataFrame, penalizador:float)->list:
     """
@@ -759,7 +2908,7 @@ def obtener_velocidades_csv(nombre_archivo:str, puntos_detallados:pd.DataFrame,
         penalizador (float): Penalizador para las velocidades (Número entre 0 y 1)
 
     Returns:
-        list: Lista de velocidades de los puntos
+        CampoVelocidades: Velocidades de los puntos, se usa como la lista de siempre
             Estructura de las velocidades: [[vector], velocidad (mm/s), penalización]
     """
     DICCIONARIO_MATERIALS = {"1": "RA", "2": "CT", "3": "PVS", "4": "BB", "5": "IST", "6": "SAN", "7": "LFO", "8": "CS", "9":"MV/LAA", "10": "FO"}
@@ -773,13 +2922,11 @@ def obtener_velocidades_csv(nombre_archivo:str, puntos_detallados:pd.DataFrame,
     csv_velocidades = pd.read_csv(nombre_archivo)
     
     df_vels = pd.merge(dataframe_velocidades, csv_velocidades, on=["material", "model"], how='left')
-    df_vels["velocidades"] = df_vels["velocidades"] * 10 * penalizador # Pasar a mm/s y penalizadas para probar corazones menos sanos
+    df_vels["velocidades"] = df_vels["velocidades"] * 10 # Pasar a mm/s, el penalizador lo aplica CampoVelocidades para probar corazones menos sanos
     
     puntos_con_velocidades = pd.merge(puntos_detallados, df_vels, on=["material", "model"], how='left')
     
-    velocidades_formateada = []
-    for indice, fila in puntos_con_velocidades.iterrows():
-        coords = [fila["f_x"], fila["f_y"], fila["f_z"]]
-        dato = [coords, fila["velocidades"], fila["anisotropia"]]
-        velocidades_formateada.append(dato)
-    return velocidades_formateada
\ No newline at end of file
+    fibras = puntos_con_velocidades[["f_x", "f_y", "f_z"]].to_numpy(dtype = np.float64)
+    velocidad = puntos_con_velocidades["velocidades"].to_numpy(dtype = np.float64)
+    anisotropia = puntos_con_velocidades["anisotropia"].to_numpy(dtype = np.float64)
+    return CampoVelocidades(fibras, velocidad, anisotropia, penalizador)
\ No newline at end of file
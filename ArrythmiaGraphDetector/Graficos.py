@@ -0,0 +1,261 @@
+#%%
+"""
+Funciones de pintar de ArrythmiaGraphDetector
+
+Se separan del resto para que la lectura, la búsqueda de rotores y los cálculos no carguen matplotlib ni plotly
+(los procesos de búsqueda y los lotes sin pantalla no los necesitan). Este módulo solo se importa la primera vez
+que se usa una función de pintar desde ArrythmiaGraphDetector o desde Functions.
+"""
+from math import sqrt
+import numpy as np
+
+try:
+    import matplotlib.pyplot as plt
+    import matplotlib.colors as mcolors
+    import plotly.graph_objects as go
+    from matplotlib.collections import LineCollection
+except ImportError as error:
+    raise ImportError("Las funciones de pintar necesitan matplotlib y plotly: pip install ArrythmiaGraphDetector[graficos]") from error
+
+from .Functions import VALOR_REENTRADA, VALOR_MED_REENTRADA, aristas_no_dirigidas, posiciones_aristas_caminos
+
+# Funciones internas
+# ----------------------------------------------------------------------------------
+def retorna_color_relacion(tiempos:list, valor_max:int, valor_med:int)->str:
+    """
+    Función interna para retornar el color de una relación en base a los tiempos
+
+    Args:
+        tiempos (list): Tiempos de los nodos implicados
+        valor_max (int): Tiempo (ms) que se considera rojo en el mapa de calor
+        valor_med (int): Tiempo (ms) en el que se considera amarillo en el mapa de calor
+
+    Returns:
+        str: Color formato HTML
+    """
+    return valor_a_color_html(max(tiempos), valor_max, valor_med)
+
+def retorna_color_poligono(tiempos:list, max_tiempo:int, med_tiempo:int)->str:
+    """
+    Función interna para retornar el color de un polígono en base a los tiempos
+    
+    Args:
+        tiempos (list): Lista de tiempos de los nodos
+        max_tiempo (int): Tiempo (ms) que se considera rojo en el mapa de calor
+        med_tiempo (int): Tiempo (ms) en el que se considera amarillo en el mapa de calor
+    Returns:
+        str: Color en formato HTML
+    """
+    return valor_a_color_html(max(tiempos), max_tiempo, med_tiempo)
+
+def valor_a_color_html(valor:int, valor_max:int = VALOR_REENTRADA, valor_med:int = VALOR_MED_REENTRADA):
+    """
+    Función interna para transformar un valor en un color en formato HTML
+
+    Args:
+        valor (int): Tiempo a transformar
+        valor_max (int, optional): Tiempo (ms) que se considera rojo. Defaults to VALOR_REENTRADA.
+        valor_med (int, optional): Tiempo (ms) que se considera amarillo. Defaults to VALOR_MED_REENTRADA.
+
+    Returns:
+        _type_: _description_
+    """
+    
+    cmap_dict = {
+        (0, valor_med): ('#0000FF', '#FCFF0E'),           # Azul a amarillo
+        (valor_med, valor_max): ('#FCFF0E', '#FF0000'),   # Amarillo a rojo 
+    }
+    if valor >= valor_max: return '#FF0000'
+    for rango, colores in cmap_dict.items():
+        if rango[0] <= valor < rango[1]:
+            inicio, fin = colores
+            inicio_rgb = mcolors.hex2color(inicio)
+            fin_rgb = mcolors.hex2color(fin)
+            fraccion = (valor - rango[0]) / (rango[1] - rango[0])
+            color_interpolado = tuple((1 - fraccion) * inicio_rgb[i] + fraccion * fin_rgb[i] for i in range(3))
+            return mcolors.rgb2hex(color_interpolado)
+
+def decimar_malla(puntos:np.ndarray, triangulos:np.ndarray, valores:np.ndarray, max_caras:int)->list:
+    """
+    Función interna para simplificar una malla juntando los puntos que caen en la misma celda de una rejilla
+
+    Cada celda se queda con la media de sus puntos y el máximo de sus valores (para no perder zonas calientes). Se
+    quitan los triángulos que quedan con dos puntos en la misma celda y los repetidos. Si con el tamaño de celda
+    estimado siguen saliendo más caras de las pedidas se agranda la celda.
+
+    Args:
+        puntos (np.ndarray): Array de puntos (N, 3)
+        triangulos (np.ndarray): Triángulos con índices desde 0 (F, 3)
+        valores (np.ndarray): Valor de cada punto
+        max_caras (int): Número máximo de caras aproximado
+
+    Returns:
+        list: [puntos, triangulos, valores] de la malla simplificada
+    """
+    if len(triangulos) <= max_caras: return [puntos, triangulos, valores]
+    lados = puntos[triangulos[:, [1, 2, 0]]] - puntos[triangulos]
+    longitud_media = float(np.sqrt((lados**2).sum(axis = 2)).mean())
+    tamano_celda = longitud_media * sqrt(len(triangulos) / max(max_caras, 1))
+    minimo = puntos.min(axis = 0)
+    while True:
+        celdas = np.floor((puntos - minimo) / tamano_celda).astype(np.int64)
+        [_, grupo] = np.unique(celdas, axis = 0, return_inverse = True)
+        grupo = grupo.reshape(-1)
+        caras = grupo[triangulos]
+        caras = caras[(caras[:, 0] != caras[:, 1]) & (caras[:, 1] != caras[:, 2]) & (caras[:, 0] != caras[:, 2])]
+        # Dos triángulos con los mismos puntos en otro orden son el mismo
+        [_, primeras] = np.unique(np.sort(caras, axis = 1), axis = 0, return_index = True)
+        caras = caras[np.sort(primeras)]
+        if len(caras) <= max_caras: break
+        tamano_celda *= 1.25
+    n_grupos = int(grupo.max()) + 1
+    cuenta = np.bincount(grupo, minlength = n_grupos)[:, None]
+    centros = np.stack([np.bincount(grupo, weights = puntos[:, eje], minlength = n_grupos) for eje in range(3)], axis = 1) / cuenta
+    maximos = np.full(n_grupos, -np.inf)
+    np.maximum.at(maximos, grupo, valores)
+    return [centros, caras, maximos]
+
+def crear_figura_malla(puntos:list, triangulos:list, intensidades:np.ndarray, colores:list, barra_color:dict, max_caras:int = None, archivo:str = None)->go.Figure:
+    """
+    Función interna que crea la figura de Plotly de una malla coloreada por punto a partir de arrays
+
+    Args:
+        puntos (list): Lista de puntos
+        triangulos (list): Triángulos del obj (índices desde 1)
+        intensidades (np.ndarray): Valor entre 0 y 1 de cada punto
+        colores (list): Escala de colores de Plotly
+        barra_color (dict): Configuración de la barra de color
+        max_caras (int, optional): Simplificar la malla hasta unas max_caras caras para que el navegador vaya fluido. Defaults to None (sin simplificar).
+        archivo (str, optional): Guardar la figura en un .html o .json en vez de mostrarla. Defaults to None.
+
+    Returns:
+        go.Figure: Figura creada
+    """
+    puntos = np.asarray(puntos, dtype = np.float64)
+    triangulos = np.asarray(triangulos, dtype = np.int64).reshape(-1, 3) - 1
+    intensidades = np.asarray(intensidades, dtype = np.float64)
+    [minimos, maximos] = [puntos.min(axis = 0), puntos.max(axis = 0)]
+    if max_caras is not None:
+        [puntos, triangulos, intensidades] = decimar_malla(puntos, triangulos, intensidades, max_caras)
+    puntos = puntos.astype(np.float32)
+    fig = go.Figure()
+    fig.add_trace(go.Mesh3d(x = puntos[:, 0], y = puntos[:, 1], z = puntos[:, 2],
+                            i = triangulos[:, 0].astype(np.int32), j = triangulos[:, 1].astype(np.int32), k = triangulos[:, 2].astype(np.int32),
+                            colorscale = colores, opacity = 1, cmin = 0, cmax = 1,
+                            intensity = intensidades.astype(np.float32), name = "Rotores",
+                            colorbar = barra_color))
+    fig.update_layout(scene = dict(
+        xaxis = dict(range = [minimos[0], maximos[0]], visible = False),
+        yaxis = dict(range = [minimos[1], maximos[1]], visible = False),
+        zaxis = dict(range = [minimos[2], maximos[2]], visible = False),
+    ))
+    if archivo is None: fig.show()
+    elif archivo.lower().endswith(".json"): fig.write_json(archivo)
+    else: fig.write_html(archivo, include_plotlyjs = "cdn", full_html = True)
+    return fig
+
+# Funciones de pintar
+# ----------------------------------------------------------------------------------
+
+def pintar_puntos(puntos:list, matriz_adyacencia:list, caminos:list = None, show_index:bool = False, tiempos:list = []):
+    """
+    Función para pintar los puntos y las relaciones entre ellos y los caminos si se quiere
+    
+    Args:
+        puntos (list): Lista de los puntos
+        matriz_adyacencia (list): Matriz de adyacencia (densa o MatrizDispersa)
+        caminos (list, optional): Lista de caminos. Defaults to None.
+        show_index (bool, optional): Mostrar los indices de los puntos. Defaults to False.
+        tiempos (list, optional): Lista de tiempos de los caminos. Defaults to [].
+        
+    Returns:
+        None
+    """
+    puntos = np.asarray(puntos, dtype = np.float64)
+    n_puntos = len(puntos)
+    [claves, origen, destino] = aristas_no_dirigidas(matriz_adyacencia)
+    
+    colores = np.zeros(len(claves), dtype = np.int8) # 0 negro, 1 rojo, 2 amarillo, 3 verde
+    anchos = np.ones(len(claves))
+    
+    if(caminos is not None and len(caminos) > 0):
+        [posiciones, ids] = posiciones_aristas_caminos(claves, caminos, n_puntos)
+        if len(tiempos) == 0: color_camino = np.ones(len(caminos), dtype = np.int8)
+        else:
+            tiempos = np.asarray(tiempos)
+            color_camino = np.where(tiempos > VALOR_REENTRADA, 1, np.where(tiempos > VALOR_MED_REENTRADA, 2, 3)).astype(np.int8)
+        anchos[posiciones] = 5
+        # Si una relación está en varios caminos se queda el color del último, como al pintarlos uno detrás de otro
+        colores[posiciones] = color_camino[ids]
+    
+    # Las relaciones resaltadas se pintan las últimas para que queden por encima
+    orden = np.argsort(anchos, kind = "stable")
+    segmentos = np.stack([puntos[origen[orden], :2], puntos[destino[orden], :2]], axis = 1)
+    paleta = mcolors.to_rgba_array(["black", "r", "y", "g"])
+    
+    ax = plt.gca()
+    ax.add_collection(LineCollection(segmentos, colors = paleta[colores[orden]], linewidths = anchos[orden]))
+    ax.scatter(puntos[:, 0], puntos[:, 1], s = 5, c = "blue", zorder = 2)
+    if show_index:
+        for i in range(n_puntos):
+            ax.text(puntos[i, 0], puntos[i, 1], str(i), fontsize = 8, ha = "center", va = "center", zorder = 3)
+    ax.autoscale_view()
+    ax.set_axis_off()
+    
+def pintar_puntos_rotores(puntos:list, tiempos:list, triangulos:list, max_tiempo:int = VALOR_REENTRADA, med_tiempo:int = VALOR_MED_REENTRADA, max_caras:int = None, archivo:str = None)->go.Figure:
+    """
+    Función para pintar un mapa de calor del corazón según lo propenso que se sea a los rotores
+
+    Args:
+        puntos (list): Lista de puntos
+        tiempos (list): Lista del máximo tiempo de cada punto
+        triangulos (list): Triangulos del obj (F, 3)
+        max_tiempo (int, optional): Valor (ms) para que sea rojo. Defaults to VALOR_REENTRADA.
+        med_tiempo (int, optional): Valor (ms) para que sea amarillo. Defaults to VALOR_MED_REENTRADA.
+        max_caras (int, optional): Simplificar la malla hasta unas max_caras caras (cada zona se queda con su tiempo máximo). Defaults to None.
+        archivo (str, optional): Guardar en un .html o .json en vez de mostrar (para lotes sin pantalla). Defaults to None.
+
+    Returns:
+        go.Figure: Figura del mapa de calor
+    """
+    triangle_colors = [
+       [0.0, '#0000ff'],  # Azul
+       [med_tiempo/max_tiempo, '#fcff0e'],  # Amarillo
+       [1.0, '#ff0000']   # Rojo
+    ]
+    intensidades = np.minimum(np.asarray(tiempos, dtype = np.float64)/max_tiempo, 1)
+    barra_color = dict(
+        title="Tiempo de rotor",
+        tickmode="array",
+        tickvals=[0.001, med_tiempo/max_tiempo, 1],  
+        ticktext=["0 ms", str(med_tiempo)+" ms", str(max_tiempo)+" ms"] 
+    )
+    return crear_figura_malla(puntos, triangulos, intensidades, triangle_colors, barra_color, max_caras, archivo)
+    
+def pintar_puntos_rotores_binario(puntos:list, puntos_in_rotor:list, triangulos:list, max_caras:int = None, archivo:str = None)->go.Figure:
+    """
+    Función para pintar un mapa de calor del corazón según si hay posibles rotores o no
+    
+    Args:
+        puntos (list): Lista de puntos
+        puntos_in_rotor (list): Lista de puntos que están en un rotor
+        triangulos (list): Triangulos del obj (F, 3)
+        max_caras (int, optional): Simplificar la malla hasta unas max_caras caras (una zona es proarrítmica si lo es alguno de sus puntos). Defaults to None.
+        archivo (str, optional): Guardar en un .html o .json en vez de mostrar (para lotes sin pantalla). Defaults to None.
+
+    Returns:
+        go.Figure: Figura del mapa
+    """
+    triangle_colors = [
+       [0.0, '#22E103'],  # Verde
+       [1.0, '#ff0000']   # Rojo
+    ]
+    intensidades = np.zeros(len(puntos))
+    intensidades[np.asarray(puntos_in_rotor, dtype = np.int64)] = 1
+    barra_color = dict(
+        title="Salud del corazón",
+        tickmode="array",
+        tickvals=[0, 0.001, 1],  
+        ticktext=["", "Sano", "Proarritmico"]  
+    )
+    return crear_figura_malla(puntos, triangulos, intensidades, triangle_colors, barra_color, max_caras, archivo)
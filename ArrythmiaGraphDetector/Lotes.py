@@ -0,0 +1,447 @@
+#%%
+"""
+Ejecución por lotes de varios casos (pacientes) en paralelo, con tiempo máximo por caso y sin repetir los ya hechos
+
+Uso:
+    agd-lotes --directorio casos --velocidades datos_velocidades.csv --salida resultados --procesos 8
+    agd-lotes --manifiesto casos.csv --salida resultados --procesos 4 --procesos-caso 4 --tiempo-maximo 3600 --html
+
+El manifiesto es un csv con las columnas nombre, obj, vtk y velocidades (rutas relativas a la carpeta del manifiesto)
+y opcionalmente penalizador, limite_espacio_inf, limite_espacio_sup, limite_tiempo_inf, limite_tiempo_sup, k_vecinos,
+modo_canonico y tamano_tesela para cambiar los parámetros de ese caso (las celdas vacías usan los de la consola). En
+una carpeta cada caso es un <nombre>.obj con su <nombre>_vtk.csv y <nombre>_velocidades.csv (o el de --velocidades).
+"""
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+import pandas as pd
+
+from .Functions import crear_grafo_vtk, obtener_velocidades_csv, busca_caminos, iterar_rotores, calcular_tiempo_maximo_punto, guardar_caminos, tiempo_ms, IndiceRotores, LIMITE_DIST_SUP, LIMITE_TMP_SUP
+from .Cache import cargar_caso, clave_caso
+
+# Constantes utilizadas
+ARCHIVO_RESUMEN_CASO = "resumen.json" # Se escribe el último, si está el caso está hecho
+ARCHIVO_ERROR_CASO = "error.txt"
+ARCHIVO_RESUMEN = "resumen.csv"
+COLUMNAS_RESUMEN = ["nombre", "estado", "puntos", "reentradas_anatomicas", "rotores", "puntos_con_rotores", "tiempo_maximo", "segundos", "error"]
+ESPERA_TERMINAR = 10 # Segundos que tiene un caso que se pasa de tiempo para acabar (y liberar su memoria compartida) antes de matarlo
+
+# Columnas del manifiesto que cambian los parámetros de un caso y cómo se leen
+PARAMETROS_MANIFIESTO = {"penalizador": float, "limite_espacio_inf": float, "limite_espacio_sup": float, "limite_tiempo_inf": float,
+                         "limite_tiempo_sup": float, "k_vecinos": int, "modo_canonico": lambda valor: str(valor).strip().lower() in ("1", "true", "si", "sí"),
+                         "tamano_tesela": float}
+
+# Funciones internas
+# ----------------------------------------------------------------------------------
+def escribir_atomico(ruta:str, escribir)->None:
+    """
+    Función interna para escribir un archivo en un temporal y renombrarlo, así nunca queda un archivo a medias
+
+    Args:
+        ruta (str): Ruta final del archivo
+        escribir (function): Función escribir(ruta_temporal) que escribe el archivo
+    """
+    [base, extension] = os.path.splitext(ruta)
+    temporal = "%s.%d.tmp%s" % (base, os.getpid(), extension)
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+def valor_json(valor):
+    """
+    Función interna para pasar a None los float que no son finitos (el tiempo máximo es inf si hay velocidades a 0 y
+    un límite puede ser inf), que json escribiría como Infinity o NaN y no sería un JSON válido
+
+    Args:
+        valor: Valor a guardar (dict, list o valor simple)
+
+    Returns:
+        El mismo valor con los float no finitos como None
+    """
+    if isinstance(valor, dict): return {clave: valor_json(dato) for clave, dato in valor.items()}
+    if isinstance(valor, (list, tuple)): return [valor_json(dato) for dato in valor]
+    if isinstance(valor, float) and not np.isfinite(valor): return None
+    return valor
+
+def clave_caso_lote(caso:dict)->str:
+    """
+    Función interna para calcular la clave del contenido de los archivos de un caso (la misma que usa la cache)
+
+    Args:
+        caso (dict): Caso {nombre, obj, vtk, velocidades, parametros}
+
+    Returns:
+        str: Clave del caso (sha256 en hexadecimal)
+    """
+    return clave_caso(caso["obj"], caso["vtk"], caso["velocidades"], caso["parametros"]["k_vecinos"])
+
+def mismo_caso(resumen:dict, caso:dict)->bool:
+    """
+    Función interna para saber si el resumen de un caso ya hecho es de los mismos parámetros y archivos de entrada
+
+    Args:
+        resumen (dict): Resumen guardado del caso
+        caso (dict): Caso del lote
+
+    Returns:
+        bool: True si se hizo con los mismos parámetros y el mismo contenido de los archivos
+    """
+    if resumen.get("parametros") != valor_json(caso["parametros"]): return False
+    try:
+        return resumen.get("clave") == clave_caso_lote(caso)
+    except OSError:
+        # Sin los archivos de entrada no se puede comprobar, el caso se vuelve a hacer y da el error
+        return False
+
+def parametros_caso(argumentos, fila:dict = None)->dict:
+    """
+    Función interna para juntar los parámetros de la consola con los que cambia el manifiesto para un caso
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos de la consola
+        fila (dict, optional): Fila del manifiesto. Defaults to None.
+
+    Returns:
+        dict: Parámetros del caso (penalizador, limites_espacio, limites_tiempo, k_vecinos, modo_canonico, tamano_tesela)
+    """
+    valores = {"penalizador": argumentos.penalizador, "limite_espacio_inf": argumentos.limites_espacio[0], "limite_espacio_sup": argumentos.limites_espacio[1],
+               "limite_tiempo_inf": argumentos.limites_tiempo[0], "limite_tiempo_sup": argumentos.limites_tiempo[1], "k_vecinos": argumentos.k_vecinos,
+               "modo_canonico": argumentos.canonico, "tamano_tesela": argumentos.tamano_tesela}
+    for columna, leer in PARAMETROS_MANIFIESTO.items():
+        if fila is not None and columna in fila and not pd.isna(fila[columna]):
+            valores[columna] = leer(fila[columna])
+    return {"penalizador": valores["penalizador"], "limites_espacio": [valores["limite_espacio_inf"], valores["limite_espacio_sup"]],
+            "limites_tiempo": [valores["limite_tiempo_inf"], valores["limite_tiempo_sup"]], "k_vecinos": valores["k_vecinos"],
+            "modo_canonico": valores["modo_canonico"], "tamano_tesela": valores["tamano_tesela"]}
+
+def leer_manifiesto(nombre_archivo:str, argumentos)->list:
+    """
+    Función interna para leer los casos de un manifiesto csv
+
+    Args:
+        nombre_archivo (str): Nombre del archivo csv del manifiesto
+        argumentos (argparse.Namespace): Argumentos de la consola
+
+    Returns:
+        list: Casos {nombre, obj, vtk, velocidades, parametros}
+    """
+    carpeta = os.path.dirname(os.path.abspath(nombre_archivo))
+    ruta = lambda valor: None if pd.isna(valor) or str(valor) == "" else os.path.join(carpeta, str(valor))
+    casos = []
+    for fila in pd.read_csv(nombre_archivo, dtype = {"nombre": str}).to_dict("records"):
+        velocidades = ruta(fila.get("velocidades"))
+        if velocidades is None: velocidades = argumentos.velocidades
+        casos.append({"nombre": fila["nombre"], "obj": ruta(fila["obj"]), "vtk": ruta(fila["vtk"]), "velocidades": velocidades,
+                      "parametros": parametros_caso(argumentos, fila)})
+    return casos
+
+def leer_directorio(carpeta:str, argumentos)->list:
+    """
+    Función interna para buscar los casos de una carpeta (cada <nombre>.obj con su <nombre>_vtk.csv)
+
+    Args:
+        carpeta (str): Carpeta con los casos
+        argumentos (argparse.Namespace): Argumentos de la consola
+
+    Returns:
+        list: Casos {nombre, obj, vtk, velocidades, parametros}
+    """
+    casos = []
+    for obj in sorted(glob.glob(os.path.join(carpeta, "*.obj"))):
+        base = obj[:-len(".obj")]
+        velocidades = base + "_velocidades.csv"
+        if not os.path.exists(velocidades): velocidades = argumentos.velocidades
+        casos.append({"nombre": os.path.basename(base), "obj": obj, "vtk": base + "_vtk.csv", "velocidades": velocidades,
+                      "parametros": parametros_caso(argumentos)})
+    return casos
+
+def procesar_caso(caso:dict, carpeta:str, opciones:dict)->dict:
+    """
+    Función interna con todo el proceso de un caso: leer el obj y el VTK, velocidades, reentradas anatómicas, rotores,
+    caminos y mapa de calor
+
+    Args:
+        caso (dict): Caso {nombre, obj, vtk, velocidades, parametros}
+        carpeta (str): Carpeta de salida del caso
+        opciones (dict): Opciones del lote (procesos_caso, cache, html, max_caras)
+
+    Returns:
+        dict: Resumen del caso con los valores no finitos como None (también se guarda en ARCHIVO_RESUMEN_CASO)
+    """
+    inicio = time.perf_counter()
+    parametros = caso["parametros"]
+    if caso["velocidades"] is None: raise ValueError("El caso %s no tiene csv de velocidades" % caso["nombre"])
+    clave = clave_caso_lote(caso)
+    if opciones["cache"] is not None:
+        [puntos, conexiones, _, matriz_adyacencia, _, velocidades] = cargar_caso(caso["obj"], caso["vtk"], caso["velocidades"], parametros["penalizador"],
+                                                                                 parametros["k_vecinos"], directorio = opciones["cache"])
+    else:
+        [puntos, conexiones, _, matriz_adyacencia, datos_puntos] = crear_grafo_vtk(caso["obj"], caso["vtk"], True, parametros["k_vecinos"])
+        velocidades = obtener_velocidades_csv(caso["velocidades"], datos_puntos, parametros["penalizador"])
+    # Las conexiones del obj empiezan en 1 y busca_caminos quiere los triangulos desde 0
+    caminos_anatomicos = busca_caminos(matriz_adyacencia, np.asarray(conexiones) - 1)
+    caminos = []
+    distancias = []
+    tiempos = []
+    rotores = iterar_rotores(matriz_adyacencia, puntos, velocidades, parametros["limites_espacio"], parametros["limites_tiempo"], con_pesos = True,
+                             n_procesos = opciones["procesos_caso"], modo_canonico = parametros["modo_canonico"], tamano_tesela = parametros["tamano_tesela"])
+    try:
+        for [camino, distancia, tiempo] in rotores:
+            caminos.append(camino)
+            distancias.append(distancia)
+            tiempos.append(tiempo_ms(tiempo))
+    finally:
+        # Si se corta el caso (tiempo agotado) se cierra ya la búsqueda para que libere su memoria compartida
+        rotores.close()
+    indice = IndiceRotores(caminos, len(puntos))
+    tiempo_puntos = calcular_tiempo_maximo_punto(puntos, tiempos, indice)
+    rotores_punto = np.diff(indice.indptr)
+
+    os.makedirs(carpeta, exist_ok = True)
+    escribir_atomico(os.path.join(carpeta, "caminos_anatomicos.bin"), lambda ruta: guardar_caminos(caminos_anatomicos, ruta))
+    escribir_atomico(os.path.join(carpeta, "caminos.bin"), lambda ruta: guardar_caminos(caminos, ruta, distancias, tiempos))
+    mapa = pd.DataFrame(np.asarray(puntos), columns = ["x", "y", "z"])
+    mapa["tiempo_maximo"] = tiempo_puntos
+    mapa["rotores"] = rotores_punto
+    escribir_atomico(os.path.join(carpeta, "mapa_calor.csv"), lambda ruta: mapa.to_csv(ruta, index = False))
+    if opciones["html"]:
+        from .Graficos import pintar_puntos_rotores
+        escribir_atomico(os.path.join(carpeta, "mapa_calor.html"), lambda ruta: pintar_puntos_rotores(puntos, tiempo_puntos, conexiones, max_caras = opciones["max_caras"], archivo = ruta))
+    resumen = {"nombre": caso["nombre"], "estado": "hecho", "puntos": int(len(puntos)), "reentradas_anatomicas": len(caminos_anatomicos), "rotores": len(caminos),
+               "puntos_con_rotores": int(np.count_nonzero(rotores_punto)), "tiempo_maximo": float(max(tiempo_puntos, default = 0)),
+               "segundos": time.perf_counter() - inicio, "error": "", "parametros": parametros,
+               "archivos": {"obj": caso["obj"], "vtk": caso["vtk"], "velocidades": caso["velocidades"]}, "clave": clave}
+    resumen = valor_json(resumen)
+    def escribir_resumen_caso(ruta:str)->None:
+        with open(ruta, "w") as archivo:
+            json.dump(resumen, archivo, indent = 2, allow_nan = False)
+    escribir_atomico(os.path.join(carpeta, ARCHIVO_RESUMEN_CASO), escribir_resumen_caso)
+    return resumen
+
+def ejecutar_proceso(caso:dict, carpeta:str, opciones:dict)->None:
+    """
+    Función interna que ejecuta un caso en su propio proceso, si falla guarda el error y sale con código 1
+
+    El proceso se pone en su propio grupo para poder matarlo junto con sus procesos de búsqueda si se pasa de tiempo.
+    SIGTERM se convierte en SystemExit para que la búsqueda se cierre y libere su memoria compartida antes de salir.
+
+    Args:
+        caso (dict): Caso {nombre, obj, vtk, velocidades, parametros}
+        carpeta (str): Carpeta de salida del caso
+        opciones (dict): Opciones del lote
+    """
+    if hasattr(os, "setpgrp"): os.setpgrp()
+    signal.signal(signal.SIGTERM, terminar_proceso)
+    try:
+        procesar_caso(caso, carpeta, opciones)
+    except BaseException:
+        os.makedirs(carpeta, exist_ok = True)
+        with open(os.path.join(carpeta, ARCHIVO_ERROR_CASO), "w") as archivo:
+            archivo.write(traceback.format_exc())
+        sys.exit(1)
+
+def terminar_proceso(senal:int, marco)->None:
+    raise SystemExit(128 + senal)
+
+def matar_proceso(proceso:multiprocessing.Process)->None:
+    """
+    Función interna para matar el proceso de un caso y los procesos que haya creado
+
+    Primero se manda SIGTERM al grupo y se esperan ESPERA_TERMINAR segundos para que cierre la búsqueda y borre su
+    memoria compartida (el resource_tracker del caso ignora SIGTERM y borra lo que quede al acabar el caso), y solo
+    si no ha acabado se manda SIGKILL.
+
+    Args:
+        proceso (multiprocessing.Process): Proceso del caso
+    """
+    senal_grupo(proceso, signal.SIGTERM)
+    proceso.join(ESPERA_TERMINAR)
+    if proceso.is_alive():
+        if hasattr(signal, "SIGKILL"): senal_grupo(proceso, signal.SIGKILL)
+        proceso.kill()
+        proceso.join()
+
+def senal_grupo(proceso:multiprocessing.Process, senal:int)->None:
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(proceso.pid, senal)
+            return
+        except OSError:
+            # Todavía no había creado su grupo o ya ha acabado
+            pass
+    if senal == signal.SIGTERM: proceso.terminate()
+
+def resultado_proceso(caso:dict, carpeta:str, proceso:multiprocessing.Process, segundos:float)->dict:
+    """
+    Función interna para obtener la fila del resumen de un caso cuyo proceso ha acabado
+
+    Args:
+        caso (dict): Caso
+        carpeta (str): Carpeta de salida del caso
+        proceso (multiprocessing.Process): Proceso ya acabado
+        segundos (float): Tiempo que ha tardado
+
+    Returns:
+        dict: Fila del resumen
+    """
+    ruta = os.path.join(carpeta, ARCHIVO_RESUMEN_CASO)
+    if proceso.exitcode == 0 and os.path.exists(ruta):
+        with open(ruta) as archivo:
+            return json.load(archivo)
+    error = "código de salida %s" % proceso.exitcode
+    ruta_error = os.path.join(carpeta, ARCHIVO_ERROR_CASO)
+    if os.path.exists(ruta_error):
+        with open(ruta_error) as archivo:
+            lineas = archivo.read().strip().splitlines()
+        if lineas: error = lineas[-1]
+    return {"nombre": caso["nombre"], "estado": "error", "segundos": segundos, "error": error}
+
+def escribir_resumen(filas:dict, casos:list, salida:str)->pd.DataFrame:
+    """
+    Función interna para guardar la tabla resumen con los casos en el orden del lote
+
+    Args:
+        filas (dict): Fila de cada caso ya acabado por nombre
+        casos (list): Casos del lote
+        salida (str): Carpeta de salida
+
+    Returns:
+        pd.DataFrame: Tabla resumen
+    """
+    tabla = pd.DataFrame([filas[caso["nombre"]] for caso in casos if caso["nombre"] in filas], columns = COLUMNAS_RESUMEN)
+    # Los casos sin acabar no tienen cuentas, sin el tipo Int64 el resto saldrían como float
+    tabla = tabla.astype({"puntos": "Int64", "reentradas_anatomicas": "Int64", "rotores": "Int64", "puntos_con_rotores": "Int64"})
+    escribir_atomico(os.path.join(salida, ARCHIVO_RESUMEN), lambda ruta: tabla.to_csv(ruta, index = False))
+    return tabla
+
+# Ejecución del lote
+# ----------------------------------------------------------------------------------
+def ejecutar_lote(casos:list, salida:str, n_procesos:int = 1, tiempo_maximo:float = None, procesos_caso:int = 1, cache:str = None, html:bool = False, max_caras:int = 50000, repetir:bool = False, informar = print)->pd.DataFrame:
+    """
+    Función para ejecutar varios casos a la vez, cada uno en su proceso, y guardar sus resultados y una tabla resumen
+
+    Cada caso guarda en salida/<nombre> sus reentradas anatómicas (caminos_anatomicos.bin), sus caminos (caminos.bin con
+    la distancia y el tiempo en ms de cada uno), el mapa de calor por punto (mapa_calor.csv con el tiempo máximo y el
+    número de rotores de cada punto, y mapa_calor.html si se pide) y su resumen.json, que se escribe el último. Los
+    casos con resumen.json de los mismos parámetros y el mismo contenido de los archivos de entrada no se vuelven a
+    hacer, así que un lote interrumpido sigue donde se quedó; si cambia algo se avisa y se vuelve a hacer. Un caso que
+    se pasa de tiempo se termina con sus procesos de búsqueda.
+
+    Args:
+        casos (list): Casos {nombre, obj, vtk, velocidades, parametros} (como los de leer_manifiesto o leer_directorio)
+        salida (str): Carpeta de salida
+        n_procesos (int, optional): Casos a la vez. Defaults to 1.
+        tiempo_maximo (float, optional): Segundos máximos por caso. Defaults to None (sin límite).
+        procesos_caso (int, optional): Procesos de la búsqueda de rotores de cada caso. Defaults to 1.
+        cache (str, optional): Carpeta de la cache de casos (cargar_caso). Defaults to None (sin cache).
+        html (bool, optional): Guardar también el mapa de calor en html. Defaults to False.
+        max_caras (int, optional): Caras máximas del mapa de calor en html. Defaults to 50000.
+        repetir (bool, optional): Volver a hacer también los casos ya hechos. Defaults to False.
+        informar (function, optional): Función para escribir cada caso acabado. Defaults to print.
+
+    Returns:
+        pd.DataFrame: Tabla resumen (también se guarda en salida/resumen.csv)
+    """
+    nombres = [caso["nombre"] for caso in casos]
+    if len(set(nombres)) != len(nombres): raise ValueError("Hay casos con el mismo nombre")
+    os.makedirs(salida, exist_ok = True)
+    opciones = {"procesos_caso": procesos_caso, "cache": cache, "html": html, "max_caras": max_caras}
+    filas = {}
+    pendientes = []
+    for caso in casos:
+        ruta = os.path.join(salida, caso["nombre"], ARCHIVO_RESUMEN_CASO)
+        resumen = None
+        if not repetir and os.path.exists(ruta):
+            with open(ruta) as archivo:
+                resumen = json.load(archivo)
+            if not mismo_caso(resumen, caso):
+                informar("%s ya estaba hecho con otros parámetros o archivos de entrada, se vuelve a hacer" % caso["nombre"])
+                resumen = None
+        if resumen is None: pendientes.append(caso)
+        else: filas[caso["nombre"]] = resumen
+    if filas: informar("%d casos ya hechos, quedan %d" % (len(filas), len(pendientes)))
+    activos = {} # sentinel -> [caso, carpeta, proceso, inicio]
+    hechos = 0
+    try:
+        while pendientes or activos:
+            while pendientes and len(activos) < n_procesos:
+                caso = pendientes.pop(0)
+                carpeta = os.path.join(salida, caso["nombre"])
+                for nombre in (ARCHIVO_RESUMEN_CASO, ARCHIVO_ERROR_CASO):
+                    if os.path.exists(os.path.join(carpeta, nombre)): os.remove(os.path.join(carpeta, nombre))
+                proceso = multiprocessing.Process(target = ejecutar_proceso, args = (caso, carpeta, opciones))
+                proceso.start()
+                activos[proceso.sentinel] = [caso, carpeta, proceso, time.perf_counter()]
+            espera = None
+            if tiempo_maximo is not None:
+                espera = max(0, min(inicio + tiempo_maximo for [_, _, _, inicio] in activos.values()) - time.perf_counter())
+            acabados = set(wait(list(activos), espera))
+            ahora = time.perf_counter()
+            for sentinel in list(activos):
+                [caso, carpeta, proceso, inicio] = activos[sentinel]
+                if sentinel in acabados:
+                    proceso.join()
+                    fila = resultado_proceso(caso, carpeta, proceso, ahora - inicio)
+                elif tiempo_maximo is not None and ahora - inicio >= tiempo_maximo:
+                    matar_proceso(proceso)
+                    fila = {"nombre": caso["nombre"], "estado": "tiempo agotado", "segundos": ahora - inicio, "error": "más de %g s" % tiempo_maximo}
+                else:
+                    continue
+                del activos[sentinel]
+                filas[caso["nombre"]] = fila
+                hechos += 1
+                escribir_resumen(filas, casos, salida)
+                informar("[%d/%d] %s %s %.1f s%s" % (hechos, hechos + len(pendientes) + len(activos), caso["nombre"], fila["estado"], fila["segundos"],
+                                                     " %d rotores" % fila["rotores"] if fila["estado"] == "hecho" else " (%s)" % fila["error"]))
+    finally:
+        # Si se interrumpe el lote no se deja ningún caso corriendo
+        for [_, _, proceso, _] in activos.values():
+            matar_proceso(proceso)
+    return escribir_resumen(filas, casos, salida)
+
+def leer_limites(texto:str)->list:
+    return [float(valor) for valor in texto.split(",")]
+
+def main(argv:list = None)->int:
+    parser = argparse.ArgumentParser(description = "Detección de rotores por lotes de casos (obj + csv del VTK + csv de velocidades)")
+    entrada = parser.add_mutually_exclusive_group(required = True)
+    entrada.add_argument("--manifiesto", help = "csv con las columnas nombre, obj, vtk, velocidades y parámetros opcionales por caso")
+    entrada.add_argument("--directorio", help = "Carpeta con un <nombre>.obj, <nombre>_vtk.csv y <nombre>_velocidades.csv por caso")
+    parser.add_argument("--velocidades", default = None, help = "csv de velocidades para los casos que no tienen el suyo")
+    parser.add_argument("--salida", default = "resultados_lotes", help = "Carpeta de salida (una carpeta por caso y resumen.csv)")
+    parser.add_argument("--procesos", type = int, default = 1, help = "Casos a la vez")
+    parser.add_argument("--procesos-caso", type = int, default = 1, help = "Procesos de la búsqueda de rotores de cada caso")
+    parser.add_argument("--tiempo-maximo", type = float, default = None, help = "Segundos máximos por caso")
+    parser.add_argument("--penalizador", type = float, default = 1, help = "Penalizador de las velocidades")
+    parser.add_argument("--limites-espacio", type = leer_limites, default = [0, LIMITE_DIST_SUP], help = "Límites de espacio de detectar_rotores (mm)")
+    parser.add_argument("--limites-tiempo", type = leer_limites, default = [0, LIMITE_TMP_SUP], help = "Límites de tiempo de detectar_rotores (ms)")
+    parser.add_argument("--k-vecinos", type = int, default = 1, help = "Puntos del VTK por punto en crear_grafo_vtk")
+    parser.add_argument("--canonico", action = "store_true", help = "Detectar los rotores en modo canónico (más rápido, mismos rotores)")
+    parser.add_argument("--tamano-tesela", type = float, default = None, help = "Lado de las teselas (mm) para buscar por teselas")
+    parser.add_argument("--cache", default = None, help = "Carpeta de la cache de casos preprocesados")
+    parser.add_argument("--html", action = "store_true", help = "Guardar también el mapa de calor en html (necesita plotly)")
+    parser.add_argument("--max-caras", type = int, default = 50000, help = "Caras máximas del mapa de calor en html")
+    parser.add_argument("--repetir", action = "store_true", help = "Volver a hacer también los casos ya hechos")
+    argumentos = parser.parse_args(argv)
+
+    if argumentos.html:
+        # Si falta plotly se avisa antes de empezar y no en cada caso
+        from . import Graficos
+    if argumentos.manifiesto is not None:
+        casos = leer_manifiesto(argumentos.manifiesto, argumentos)
+    else:
+        casos = leer_directorio(argumentos.directorio, argumentos)
+    tabla = ejecutar_lote(casos, argumentos.salida, argumentos.procesos, argumentos.tiempo_maximo, argumentos.procesos_caso, argumentos.cache,
+                          argumentos.html, argumentos.max_caras, argumentos.repetir)
+    print("%d de %d casos hechos, resumen en %s" % (int((tabla["estado"] == "hecho").sum()), len(casos), os.path.join(argumentos.salida, ARCHIVO_RESUMEN)))
+    return 0 if (tabla["estado"] == "hecho").sum() == len(casos) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,11 @@
-from .Functions import pintar_puntos, pintar_puntos_rotores, pintar_puntos_rotores_binario, calcular_tiempo_camino, calcular_distancia_camino, calcular_tiempo_maximo_punto, detectar_rotores, crear_grafo, crear_grafo_vtk, guardar_caminos, cargar_caminos, obtener_velocidades_csv
\ No newline at end of file
+from .Functions import calcular_tiempo_camino, calcular_distancia_camino, calcular_tiempo_maximo_punto, detectar_rotores, iterar_rotores, reducir_rotores, BarridoRotores, RotoresIncrementales, modificar_aristas, progreso_consola, crear_grafo, crear_grafo_vtk, simplificar_malla, guardar_caminos, cargar_caminos, obtener_velocidades_csv, cargar_obj, crear_tabla_pesos, filtrar_rotores, MatrizDispersa, TablaPesos, IndiceRotores, ColeccionCaminos, CampoVelocidades, EstadisticasBusqueda, ReductorTiempoMaximo, ReductorConteo, ReductorHistograma
+from .Cache import CacheCasos, cargar_caso
+
+# Las funciones de pintar cargan matplotlib y plotly, así que se importan la primera vez que se usan
+FUNCIONES_PINTAR = ("pintar_puntos", "pintar_puntos_rotores", "pintar_puntos_rotores_binario")
+
+def __getattr__(nombre:str):
+    if nombre in FUNCIONES_PINTAR:
+        from . import Graficos
+        return getattr(Graficos, nombre)
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(nombre))
\ No newline at end of file
@@ -0,0 +1,178 @@
+#%%
+"""
+Benchmarks de ArrythmiaGraphDetector sobre mallas sintéticas de distintos tamaños
+
+Uso:
+    python benchmarks/ejecutar.py --salida resultados.json
+    python benchmarks/ejecutar.py --mallas esfera --pasos 5,4,3,2,1 --limites-espacio 0,4 --salida resultados.json
+    python benchmarks/ejecutar.py --salida nuevos.json --comparar resultados.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ArrythmiaGraphDetector as agd
+from ArrythmiaGraphDetector import Functions
+from mallas import MALLAS, escribir_obj, escribir_csv_vtk, escribir_csv_velocidades
+
+# Constantes utilizadas
+TOLERANCIA = 1.25 # Una etapa es más lenta si tarda más de 1.25 veces lo que tardaba
+MINIMO = 0.01 # Y además al menos 10 ms más, para que el ruido de las etapas muy rápidas no cuente
+
+# Funciones internas
+# ----------------------------------------------------------------------------------
+def medir(funcion, memoria:bool)->list:
+    """
+    Función interna para medir el tiempo de una función y, si se pide, el pico de memoria en otra ejecución aparte
+
+    El pico se mide en una segunda ejecución porque tracemalloc hace más lento el código y falsearía el tiempo.
+
+    Args:
+        funcion (function): Función sin argumentos a medir
+        memoria (bool): Medir también el pico de memoria
+
+    Returns:
+        list: [resultado, tiempo (s), pico de memoria (bytes) o None]
+    """
+    inicio = time.perf_counter()
+    resultado = funcion()
+    tiempo = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        del resultado
+        tracemalloc.start()
+        resultado = funcion()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return [resultado, tiempo, pico]
+
+def ejecutar_caso(malla:str, paso:float, carpeta:str, argumentos)->dict:
+    """
+    Función interna para generar una malla, escribir sus archivos y medir cada etapa
+
+    Args:
+        malla (str): Nombre del generador de MALLAS
+        paso (float): Distancia aproximada entre puntos (mm)
+        carpeta (str): Carpeta donde escribir los archivos
+        argumentos (argparse.Namespace): Argumentos del benchmark
+
+    Returns:
+        dict: Resultado del caso con el tiempo, el pico de memoria y el número de ciclos de cada etapa
+    """
+    [puntos, triangulos] = MALLAS[malla](paso, semilla = argumentos.semilla)
+    nombre = os.path.join(carpeta, "%s_%s" % (malla, paso))
+    escribir_obj(nombre + ".obj", puntos, triangulos)
+    escribir_csv_vtk(nombre + "_vtk.csv", puntos, argumentos.semilla)
+    escribir_csv_velocidades(nombre + "_velocidades.csv")
+    lados = puntos[triangulos[:, [1, 2, 0]]] - puntos[triangulos]
+    caso = {"malla": malla, "paso": paso, "puntos": int(len(puntos)), "caras": int(len(triangulos)),
+            "arista_media": float(np.sqrt((lados**2).sum(axis = 2)).mean()), "etapas": {}}
+    memoria = not argumentos.sin_memoria
+
+    def anotar(etapa:str, tiempo:float, pico:int, ciclos:int = None)->None:
+        caso["etapas"][etapa] = {"tiempo": tiempo, "memoria_pico": pico, "ciclos": ciclos}
+        print("%-8s %5s %-30s %9.3f s %12s %10s" % (malla, paso, etapa, tiempo, "-" if pico is None else "%.1f MB" % (pico / 1024**2), "" if ciclos is None else ciclos))
+
+    [obj, tiempo, pico] = medir(lambda: Functions.leer_obj(nombre + ".obj", disperso = True), memoria)
+    anotar("leer_obj", tiempo, pico)
+    [_, conexiones, _, matriz_adyacencia, triangulos_obj] = obj
+    [caminos, tiempo, pico] = medir(lambda: Functions.busca_caminos(matriz_adyacencia, triangulos_obj), memoria)
+    anotar("busca_caminos", tiempo, pico, len(caminos))
+    [vtk, tiempo, pico] = medir(lambda: agd.crear_grafo_vtk(nombre + ".obj", nombre + "_vtk.csv", True, argumentos.k_vecinos), memoria)
+    anotar("crear_grafo_vtk", tiempo, pico)
+    datos_puntos = vtk[4]
+    [velocidades, tiempo, pico] = medir(lambda: agd.obtener_velocidades_csv(nombre + "_velocidades.csv", datos_puntos, 1), memoria)
+    anotar("obtener_velocidades_csv", tiempo, pico)
+    if argumentos.sin_rotores: return caso
+    buscar = lambda: list(agd.iterar_rotores(matriz_adyacencia, vtk[0], velocidades, argumentos.limites_espacio, argumentos.limites_tiempo,
+                                             con_pesos = True, n_procesos = argumentos.procesos, modo_canonico = argumentos.canonico))
+    [rotores, tiempo, pico] = medir(buscar, memoria)
+    anotar("detectar_rotores", tiempo, pico, len(rotores))
+    tiempos = [Functions.tiempo_ms(tiempo_rotor) for [_, _, tiempo_rotor] in rotores]
+    caminos = [camino for [camino, _, _] in rotores]
+    [_, tiempo, pico] = medir(lambda: agd.calcular_tiempo_maximo_punto(vtk[0], tiempos, caminos), memoria)
+    anotar("calcular_tiempo_maximo_punto", tiempo, pico, len(caminos))
+    return caso
+
+def comparar(nuevos:dict, anteriores:dict, tolerancia:float, minimo:float = MINIMO)->int:
+    """
+    Función interna para comparar dos ficheros de resultados y avisar de las etapas más lentas o con otros ciclos
+
+    Args:
+        nuevos (dict): Resultados nuevos
+        anteriores (dict): Resultados con los que comparar
+        tolerancia (float): Proporción de tiempo a partir de la que se considera que una etapa va más lenta
+        minimo (float, optional): Segundos que tiene que aumentar además el tiempo. Defaults to MINIMO.
+
+    Returns:
+        int: Número de regresiones encontradas
+    """
+    casos_anteriores = {(caso["malla"], caso["paso"]): caso for caso in anteriores["casos"]}
+    regresiones = 0
+    print("\n%-8s %5s %-30s %10s %10s %8s" % ("malla", "paso", "etapa", "antes (s)", "ahora (s)", "ratio"))
+    for caso in nuevos["casos"]:
+        anterior = casos_anteriores.get((caso["malla"], caso["paso"]))
+        if anterior is None: continue
+        for etapa, medida in caso["etapas"].items():
+            medida_anterior = anterior["etapas"].get(etapa)
+            if medida_anterior is None: continue
+            ratio = medida["tiempo"] / max(medida_anterior["tiempo"], 1e-9)
+            avisos = []
+            if ratio > tolerancia and medida["tiempo"] - medida_anterior["tiempo"] > minimo: avisos.append("MÁS LENTO")
+            if medida["ciclos"] != medida_anterior["ciclos"]: avisos.append("CICLOS %s -> %s" % (medida_anterior["ciclos"], medida["ciclos"]))
+            regresiones += len(avisos) > 0
+            print("%-8s %5s %-30s %10.3f %10.3f %8.2f %s" % (caso["malla"], caso["paso"], etapa, medida_anterior["tiempo"], medida["tiempo"], ratio, " ".join(avisos)))
+    return regresiones
+
+def leer_limites(texto:str)->list:
+    return [float(valor) for valor in texto.split(",")]
+
+def main(argv:list = None)->int:
+    parser = argparse.ArgumentParser(description = "Benchmarks de ArrythmiaGraphDetector sobre mallas sintéticas")
+    parser.add_argument("--mallas", default = ",".join(MALLAS), help = "Mallas separadas por comas (%s)" % ", ".join(MALLAS))
+    parser.add_argument("--pasos", default = "5,4,3,2", help = "Distancias entre puntos (mm) separadas por comas (con 1 mm detectar_rotores tarda minutos)")
+    parser.add_argument("--limites-espacio", type = leer_limites, default = [0, 6], help = "Límites de espacio de detectar_rotores (mm)")
+    parser.add_argument("--limites-tiempo", type = leer_limites, default = [0, 99999], help = "Límites de tiempo de detectar_rotores (ms)")
+    parser.add_argument("--procesos", type = int, default = 1, help = "Procesos para detectar_rotores")
+    parser.add_argument("--canonico", action = "store_true", help = "Detectar los rotores en modo canónico (más rápido, mismos rotores)")
+    parser.add_argument("--k-vecinos", type = int, default = 1, help = "Puntos del VTK por punto en crear_grafo_vtk")
+    parser.add_argument("--semilla", type = int, default = 0, help = "Semilla de las mallas")
+    parser.add_argument("--sin-memoria", action = "store_true", help = "No medir el pico de memoria (evita repetir cada etapa)")
+    parser.add_argument("--sin-rotores", action = "store_true", help = "No ejecutar detectar_rotores ni calcular_tiempo_maximo_punto")
+    parser.add_argument("--salida", default = "resultados_benchmarks.json", help = "Fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", default = None, help = "Fichero JSON de resultados anteriores con el que comparar")
+    parser.add_argument("--tolerancia", type = float, default = TOLERANCIA, help = "Ratio de tiempo a partir del que se avisa de una regresión")
+    parser.add_argument("--minimo", type = float, default = MINIMO, help = "Segundos que tiene que aumentar una etapa para avisar de una regresión")
+    argumentos = parser.parse_args(argv)
+
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(), "numpy": np.__version__, "plataforma": platform.platform(),
+        "parametros": {clave: valor for clave, valor in vars(argumentos).items() if clave not in ("salida", "comparar")},
+        "casos": [],
+    }
+    with tempfile.TemporaryDirectory() as carpeta:
+        for malla in argumentos.mallas.split(","):
+            for paso in leer_limites(argumentos.pasos):
+                resultados["casos"].append(ejecutar_caso(malla, paso, carpeta, argumentos))
+    with open(argumentos.salida, "w") as archivo:
+        json.dump(resultados, archivo, indent = 2)
+    print("Resultados guardados en " + argumentos.salida)
+
+    if argumentos.comparar is not None:
+        with open(argumentos.comparar) as archivo:
+            anteriores = json.load(archivo)
+        regresiones = comparar(resultados, anteriores, argumentos.tolerancia, argumentos.minimo)
+        print("%d regresiones" % regresiones)
+        return 1 if regresiones > 0 else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#%%
+from math import pi, log2
+import numpy as np
+import pandas as pd
+
+# Constantes utilizadas
+MATERIALES = [1, 2, 4]
+MODELOS = [191, 195]
+
+# Giro que se aplica a todas las mallas para que la proyección en xy (la que usan las distancias) no degenere
+ANGULOS_GIRO = [0.35, 0.6, 0.2]
+
+# Funciones internas
+# ----------------------------------------------------------------------------------
+def girar(puntos:np.ndarray, angulos:list = ANGULOS_GIRO)->np.ndarray:
+    """
+    Función interna para girar los puntos sobre los ejes x, y, z
+
+    Args:
+        puntos (np.ndarray): Array de puntos (N, 3)
+        angulos (list, optional): Ángulos en radianes sobre x, y, z. Defaults to ANGULOS_GIRO.
+
+    Returns:
+        np.ndarray: Puntos girados
+    """
+    [a, b, c] = angulos
+    giro_x = np.array([[1, 0, 0], [0, np.cos(a), -np.sin(a)], [0, np.sin(a), np.cos(a)]])
+    giro_y = np.array([[np.cos(b), 0, np.sin(b)], [0, 1, 0], [-np.sin(b), 0, np.cos(b)]])
+    giro_z = np.array([[np.cos(c), -np.sin(c), 0], [np.sin(c), np.cos(c), 0], [0, 0, 1]])
+    return puntos @ (giro_z @ giro_y @ giro_x).T
+
+def rejilla_periodica(n_u:int, n_v:int, cerrar_v:bool)->np.ndarray:
+    """
+    Función interna para triangular una rejilla n_u x n_v cerrada en u (y en v si se pide)
+
+    Args:
+        n_u (int): Puntos en la dirección cerrada
+        n_v (int): Puntos en la otra dirección
+        cerrar_v (bool): Cerrar también la dirección v (toro)
+
+    Returns:
+        np.ndarray: Triángulos con índices desde 0 (F, 3)
+    """
+    filas = n_v if cerrar_v else n_v - 1
+    [v, u] = np.meshgrid(np.arange(filas), np.arange(n_u), indexing = "ij")
+    [v, u] = [v.reshape(-1), u.reshape(-1)]
+    p = v * n_u + u
+    q = v * n_u + (u + 1) % n_u
+    r = ((v + 1) % n_v) * n_u + u
+    s = ((v + 1) % n_v) * n_u + (u + 1) % n_u
+    return np.concatenate([np.stack([p, q, s], axis = 1), np.stack([p, s, r], axis = 1)])
+
+# Generadores de mallas
+# ----------------------------------------------------------------------------------
+def malla_tubo(paso:float, radio:float = 12, largo:float = 40, ruido:float = 0.1, semilla:int = 0)->list:
+    """
+    Función para crear un tubo abierto (como una vena pulmonar), con dos bordes que son reentradas anatómicas
+
+    Args:
+        paso (float): Distancia aproximada entre puntos (mm)
+        radio (float, optional): Radio del tubo (mm). Defaults to 12.
+        largo (float, optional): Largo del tubo (mm). Defaults to 40.
+        ruido (float, optional): Desviación del ruido de los puntos en proporción al paso. Defaults to 0.1.
+        semilla (int, optional): Semilla del ruido. Defaults to 0.
+
+    Returns:
+        list: [puntos (N, 3), triangulos con índices desde 0 (F, 3)]
+    """
+    rng = np.random.default_rng(semilla)
+    n_u = max(6, int(round(2*pi*radio/paso)))
+    n_v = max(2, int(round(largo/paso)) + 1)
+    [z, angulo] = np.meshgrid(np.linspace(0, largo, n_v), np.linspace(0, 2*pi, n_u, endpoint = False), indexing = "ij")
+    puntos = np.stack([radio*np.cos(angulo), radio*np.sin(angulo), z], axis = 2).reshape(-1, 3)
+    puntos += rng.normal(0, ruido*paso, puntos.shape)
+    return [girar(puntos), rejilla_periodica(n_u, n_v, False)]
+
+def malla_toro(paso:float, radio_mayor:float = 25, radio_menor:float = 8, ruido:float = 0.1, semilla:int = 0)->list:
+    """
+    Función para crear un toro (superficie cerrada sin bordes con ciclos que rodean el agujero)
+
+    Args:
+        paso (float): Distancia aproximada entre puntos (mm)
+        radio_mayor (float, optional): Radio del centro del tubo (mm). Defaults to 25.
+        radio_menor (float, optional): Radio del tubo (mm). Defaults to 8.
+        ruido (float, optional): Desviación del ruido de los puntos en proporción al paso. Defaults to 0.1.
+        semilla (int, optional): Semilla del ruido. Defaults to 0.
+
+    Returns:
+        list: [puntos (N, 3), triangulos con índices desde 0 (F, 3)]
+    """
+    rng = np.random.default_rng(semilla)
+    n_u = max(6, int(round(2*pi*radio_menor/paso)))
+    n_v = max(6, int(round(2*pi*radio_mayor/paso)))
+    [v, u] = np.meshgrid(np.linspace(0, 2*pi, n_v, endpoint = False), np.linspace(0, 2*pi, n_u, endpoint = False), indexing = "ij")
+    radio = radio_mayor + radio_menor*np.cos(u)
+    puntos = np.stack([radio*np.cos(v), radio*np.sin(v), radio_menor*np.sin(u)], axis = 2).reshape(-1, 3)
+    puntos += rng.normal(0, ruido*paso, puntos.shape)
+    return [girar(puntos), rejilla_periodica(n_u, n_v, True)]
+
+def malla_esfera_agujeros(paso:float, radio:float = 25, n_agujeros:int = 5, radio_agujero:float = 5, ruido:float = 0.1, semilla:int = 0)->list:
+    """
+    Función para crear una esfera con agujeros (como una aurícula con las venas y la válvula) subdividiendo un icosaedro
+
+    El paso es aproximado porque cada subdivisión divide entre dos la longitud de las aristas.
+
+    Args:
+        paso (float): Distancia aproximada entre puntos (mm)
+        radio (float, optional): Radio de la esfera (mm). Defaults to 25.
+        n_agujeros (int, optional): Número de agujeros. Defaults to 5.
+        radio_agujero (float, optional): Radio de cada agujero (mm). Defaults to 5.
+        ruido (float, optional): Desviación del ruido de los puntos en proporción al paso. Defaults to 0.1.
+        semilla (int, optional): Semilla de los agujeros y el ruido. Defaults to 0.
+
+    Returns:
+        list: [puntos (N, 3), triangulos con índices desde 0 (F, 3)]
+    """
+    rng = np.random.default_rng(semilla)
+    t = (1 + 5**0.5) / 2
+    puntos = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+                       [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]], dtype = np.float64)
+    triangulos = np.array([[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4], [11, 10, 2],
+                           [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9], [4, 9, 5],
+                           [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]])
+    # La arista del icosaedro sobre la esfera mide 1.05 * radio y cada subdivisión la divide entre dos
+    subdivisiones = max(0, int(round(log2(1.05*radio/paso))))
+    for _ in range(subdivisiones):
+        aristas = np.sort(np.concatenate([triangulos[:, [0, 1]], triangulos[:, [1, 2]], triangulos[:, [2, 0]]]), axis = 1)
+        [aristas, medio] = np.unique(aristas, axis = 0, return_inverse = True)
+        medio = medio.reshape(3, -1) + len(puntos)
+        puntos = np.concatenate([puntos, (puntos[aristas[:, 0]] + puntos[aristas[:, 1]]) / 2])
+        [a, b, c] = triangulos.T
+        [ab, bc, ca] = medio
+        triangulos = np.concatenate([np.stack(caras, axis = 1) for caras in ([a, ab, ca], [b, bc, ab], [c, ca, bc], [ab, bc, ca])])
+    puntos = puntos / np.linalg.norm(puntos, axis = 1)[:, None] * radio
+    # Se quitan los triángulos cuyo centro cae cerca de cada agujero y los puntos que se quedan sueltos
+    centros = rng.normal(size = (n_agujeros, 3))
+    centros = centros / np.linalg.norm(centros, axis = 1)[:, None] * radio
+    baricentros = puntos[triangulos].mean(axis = 1)
+    distancia = np.linalg.norm(baricentros[:, None, :] - centros[None, :, :], axis = 2).min(axis = 1) if n_agujeros > 0 else np.full(len(triangulos), np.inf)
+    triangulos = triangulos[distancia > radio_agujero]
+    usados = np.unique(triangulos)
+    nuevo = np.full(len(puntos), -1)
+    nuevo[usados] = np.arange(len(usados))
+    puntos = puntos[usados] + rng.normal(0, ruido*paso, (len(usados), 3))
+    return [girar(puntos), nuevo[triangulos]]
+
+MALLAS = {"tubo": malla_tubo, "esfera": malla_esfera_agujeros, "toro": malla_toro}
+
+# Funciones de escritura
+# ----------------------------------------------------------------------------------
+def escribir_obj(nombre_archivo:str, puntos:np.ndarray, triangulos:np.ndarray)->None:
+    """
+    Función para escribir una malla en un obj con vértices, normales (hacia fuera del centro) y caras v//vn
+
+    Args:
+        nombre_archivo (str): Nombre del archivo obj
+        puntos (np.ndarray): Array de puntos (N, 3)
+        triangulos (np.ndarray): Triángulos con índices desde 0 (F, 3)
+    """
+    normales = puntos - puntos.mean(axis = 0)
+    normales = normales / np.maximum(np.linalg.norm(normales, axis = 1), 1e-12)[:, None]
+    caras = np.repeat(np.asarray(triangulos) + 1, 2, axis = 1)
+    with open(nombre_archivo, "w") as archivo:
+        archivo.write("# Malla sintética de ArrythmiaGraphDetector\n")
+        np.savetxt(archivo, puntos, fmt = "v %.6f %.6f %.6f")
+        np.savetxt(archivo, normales, fmt = "vn %.6f %.6f %.6f")
+        np.savetxt(archivo, caras, fmt = "f %d//%d %d//%d %d//%d")
+
+def escribir_csv_vtk(nombre_archivo:str, puntos:np.ndarray, semilla:int = 0)->None:
+    """
+    Función para escribir un csv del VTK con el doble de puntos que la malla alrededor de ella, material, modelo y fibras
+
+    Args:
+        nombre_archivo (str): Nombre del archivo csv
+        puntos (np.ndarray): Array de puntos de la malla (N, 3)
+        semilla (int, optional): Semilla de los datos. Defaults to 0.
+    """
+    rng = np.random.default_rng(semilla)
+    puntos_vtk = np.concatenate([puntos + rng.normal(0, 0.3, puntos.shape), puntos + rng.normal(0, 0.6, puntos.shape)])
+    fibras = rng.normal(size = puntos_vtk.shape)
+    fibras = fibras / np.linalg.norm(fibras, axis = 1)[:, None]
+    pd.DataFrame({
+        "Points:0": puntos_vtk[:, 0], "Points:1": puntos_vtk[:, 1], "Points:2": puntos_vtk[:, 2],
+        "material": rng.choice(MATERIALES, len(puntos_vtk)), "model": rng.choice(MODELOS, len(puntos_vtk)),
+        "fibers:0": fibras[:, 0], "fibers:1": fibras[:, 1], "fibers:2": fibras[:, 2],
+    }).to_csv(nombre_archivo, index = False)
+
+def escribir_csv_velocidades(nombre_archivo:str)->None:
+    """
+    Función para escribir un csv de velocidades (cm/s) y anisotropía para todos los materiales y modelos de escribir_csv_vtk
+
+    Args:
+        nombre_archivo (str): Nombre del archivo csv
+    """
+    filas = [[material, modelo, 60 + 10*material + (modelo - 191), 0.3 + 0.1*material] for material in MATERIALES for modelo in MODELOS]
+    pd.DataFrame(filas, columns = ["material", "model", "velocidades", "anisotropia"]).to_csv(nombre_archivo, index = False)
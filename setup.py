@@ -16,12 +16,19 @@ LONG_DESC_TYPE = "text/markdown"
 
 INSTALL_REQUIRES = [
         'numpy',
-        'pandas',
-        'matplotlib',
-        'plotly',
-        'networkx'
+        'pandas'
       ]
 
+# Las funciones de pintar solo se cargan al usarlas, así que matplotlib y plotly son opcionales
+EXTRAS_REQUIRE = {
+        'graficos': ['matplotlib', 'plotly']
+      }
+
+# Comando para ejecutar lotes de casos desde la consola
+ENTRY_POINTS = {
+        'console_scripts': ['agd-lotes=ArrythmiaGraphDetector.Lotes:main']
+      }
+
 setup(
     name=PACKAGE_NAME,
     version=VERSION,
@@ -32,6 +39,8 @@ setup(
     author_email=AUTHOR_EMAIL,
     url=URL,
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
+    entry_points=ENTRY_POINTS,
     license=LICENSE,
     packages=find_packages(),
     include_package_data=True